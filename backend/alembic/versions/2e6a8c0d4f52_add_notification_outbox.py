@@ -0,0 +1,40 @@
+"""add notification outbox table
+
+Revision ID: 2e6a8c0d4f52
+Revises: 8d2f4b6a0c31
+Create Date: 2026-10-17 12:00:00
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "2e6a8c0d4f52"
+down_revision: Union[str, Sequence[str], None] = "8d2f4b6a0c31"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "notification_outbox",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("alert_id", sa.Integer(), sa.ForeignKey("alerts.id", ondelete="CASCADE"), nullable=False),
+        sa.Column("status", sa.Enum("PENDING", "SENT", "ERROR", name="outboxstatus"), nullable=False),
+        sa.Column("attempts", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("last_error", sa.String(length=255), nullable=True),
+        sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=False),
+        sa.Column("sent_at", sa.DateTime(timezone=True), nullable=True),
+    )
+    op.create_index("ix_outbox_status_id", "notification_outbox", ["status", "id"])
+    op.create_index("ix_outbox_alert", "notification_outbox", ["alert_id"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_outbox_alert", table_name="notification_outbox")
+    op.drop_index("ix_outbox_status_id", table_name="notification_outbox")
+    op.drop_table("notification_outbox")
+    sa.Enum(name="outboxstatus").drop(op.get_bind(), checkfirst=True)
@@ -0,0 +1,60 @@
+"""merge duplicate stocks and add unique (product_id, location_id)
+
+Revision ID: 4b7d9f1a2c63
+Revises: 2e6a8c0d4f52
+Create Date: 2026-10-17 14:00:00
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = "4b7d9f1a2c63"
+down_revision: Union[str, Sequence[str], None] = "2e6a8c0d4f52"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Cada duplicado recibio sus propios deltas: la fila que se conserva (id minimo) suma todas las cantidades
+    op.execute(
+        """
+        UPDATE stocks
+        SET quantity = (
+            SELECT SUM(dup.quantity) FROM stocks dup
+            WHERE dup.product_id = stocks.product_id AND dup.location_id = stocks.location_id
+        )
+        WHERE id IN (
+            SELECT MIN(id) FROM stocks GROUP BY product_id, location_id HAVING COUNT(*) > 1
+        )
+        """
+    )
+    # Las alertas de filas duplicadas pasan a apuntar a la fila conservada
+    op.execute(
+        """
+        UPDATE alerts
+        SET stock_id = (
+            SELECT MIN(keep.id) FROM stocks old
+            JOIN stocks keep ON keep.product_id = old.product_id AND keep.location_id = old.location_id
+            WHERE old.id = alerts.stock_id
+        )
+        WHERE stock_id IN (
+            SELECT id FROM stocks
+            WHERE id NOT IN (SELECT MIN(id) FROM stocks GROUP BY product_id, location_id)
+        )
+        """
+    )
+    op.execute(
+        """
+        DELETE FROM stocks
+        WHERE id NOT IN (SELECT MIN(id) FROM stocks GROUP BY product_id, location_id)
+        """
+    )
+    op.create_index("ux_stocks_product_location", "stocks", ["product_id", "location_id"], unique=True)
+
+
+def downgrade() -> None:
+    # Los duplicados fusionados no se restauran
+    op.drop_index("ux_stocks_product_location", table_name="stocks")
@@ -0,0 +1,30 @@
+"""add lease columns to events
+
+Revision ID: 5c7e9a1b3d20
+Revises: 7a4c9d2e1f10
+Create Date: 2026-10-17 09:00:00
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "5c7e9a1b3d20"
+down_revision: Union[str, Sequence[str], None] = "7a4c9d2e1f10"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column("events", sa.Column("lease_owner", sa.String(length=100), nullable=True))
+    op.add_column("events", sa.Column("lease_expires_at", sa.DateTime(timezone=True), nullable=True))
+    op.create_index("ix_events_status_lease", "events", ["event_status", "lease_expires_at"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_events_status_lease", table_name="events")
+    op.drop_column("events", "lease_expires_at")
+    op.drop_column("events", "lease_owner")
@@ -0,0 +1,39 @@
+"""composite (created_at, id) indexes for keyset pagination
+
+Revision ID: 6f1a3c5e7b94
+Revises: 4b7d9f1a2c63
+Create Date: 2026-10-17 16:00:00
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = "6f1a3c5e7b94"
+down_revision: Union[str, Sequence[str], None] = "4b7d9f1a2c63"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# (tabla, indice antiguo solo por created_at, indice compuesto nuevo)
+INDEXES = [
+    ("movements", "ix_movements_created", "ix_movements_created_id"),
+    ("events", "ix_events_created", "ix_events_created_id"),
+    ("alerts", "ix_alerts_created", "ix_alerts_created_id"),
+    ("audit_log", "ix_audit_created", "ix_audit_created_id"),
+]
+
+
+def upgrade() -> None:
+    # El compuesto cubre tambien las consultas solo por created_at, asi que sustituye al antiguo
+    for table, old_name, new_name in INDEXES:
+        op.create_index(new_name, table, ["created_at", "id"], unique=False)
+        op.drop_index(old_name, table_name=table)
+
+
+def downgrade() -> None:
+    for table, old_name, new_name in INDEXES:
+        op.create_index(old_name, table, ["created_at"], unique=False)
+        op.drop_index(new_name, table_name=table)
@@ -0,0 +1,52 @@
+"""add movement_daily_agg rollup table
+
+Revision ID: 7c2e4a6b8d05
+Revises: 6f1a3c5e7b94
+Create Date: 2026-10-17 17:00:00
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = "7c2e4a6b8d05"
+down_revision: Union[str, Sequence[str], None] = "6f1a3c5e7b94"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "movement_daily_agg",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("day", sa.Date(), nullable=False),
+        sa.Column("product_id", sa.Integer(), sa.ForeignKey("products.id", ondelete="CASCADE"), nullable=False),
+        sa.Column("location_id", sa.Integer(), sa.ForeignKey("locations.id"), nullable=True),
+        sa.Column(
+            "movement_type",
+            postgresql.ENUM("IN", "OUT", "ADJUST", name="movementtype", create_type=False),
+            nullable=False,
+        ),
+        sa.Column("quantity", sa.BigInteger(), nullable=False, server_default="0"),
+        sa.Column("delta", sa.BigInteger(), nullable=False, server_default="0"),
+        sa.Column("movement_count", sa.Integer(), nullable=False, server_default="0"),
+    )
+    op.create_index(
+        "ux_movement_daily_agg",
+        "movement_daily_agg",
+        ["day", "product_id", "location_id", "movement_type"],
+        unique=True,
+    )
+    op.create_index("ix_movement_daily_agg_product_day", "movement_daily_agg", ["product_id", "day"])
+    # La tabla se rellena con scripts/backfill_movement_rollup.py o con la tarea rollup_movements
+
+
+def downgrade() -> None:
+    op.drop_index("ix_movement_daily_agg_product_day", table_name="movement_daily_agg")
+    op.drop_index("ux_movement_daily_agg", table_name="movement_daily_agg")
+    op.drop_table("movement_daily_agg")
+    op.execute("DELETE FROM task_watermarks WHERE name = 'movement_daily_agg'")
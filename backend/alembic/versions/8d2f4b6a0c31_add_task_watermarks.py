@@ -0,0 +1,38 @@
+"""add task watermarks table
+
+Revision ID: 8d2f4b6a0c31
+Revises: 5c7e9a1b3d20
+Create Date: 2026-10-17 10:00:00
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "8d2f4b6a0c31"
+down_revision: Union[str, Sequence[str], None] = "5c7e9a1b3d20"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "task_watermarks",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("name", sa.String(length=100), nullable=False, unique=True),
+        sa.Column("watermark_at", sa.DateTime(timezone=True), nullable=True),
+        sa.Column("watermark_id", sa.Integer(), nullable=True),
+        sa.Column("updated_at", sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+    )
+    # Los escaneos incrementales filtran por updated_at
+    op.create_index("ix_stocks_updated", "stocks", ["updated_at"])
+    op.create_index("ix_thresholds_updated", "stock_thresholds", ["updated_at"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_thresholds_updated", table_name="stock_thresholds")
+    op.drop_index("ix_stocks_updated", table_name="stocks")
+    op.drop_table("task_watermarks")
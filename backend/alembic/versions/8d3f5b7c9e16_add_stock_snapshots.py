@@ -0,0 +1,39 @@
+"""add stock_snapshots table
+
+Revision ID: 8d3f5b7c9e16
+Revises: 7c2e4a6b8d05
+Create Date: 2026-10-17 19:00:00
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "8d3f5b7c9e16"
+down_revision: Union[str, Sequence[str], None] = "7c2e4a6b8d05"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "stock_snapshots",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("day", sa.Date(), nullable=False),
+        sa.Column("product_id", sa.Integer(), sa.ForeignKey("products.id", ondelete="CASCADE"), nullable=False),
+        sa.Column("location_id", sa.Integer(), sa.ForeignKey("locations.id"), nullable=False),
+        sa.Column("quantity", sa.BigInteger(), nullable=False, server_default="0"),
+    )
+    op.create_index("ux_stock_snapshots", "stock_snapshots", ["day", "product_id", "location_id"], unique=True)
+    op.create_index("ix_stock_snapshots_product_day", "stock_snapshots", ["product_id", "day"])
+    # La tabla se rellena con scripts/backfill_stock_snapshots.py o con la tarea snapshot_stocks
+
+
+def downgrade() -> None:
+    op.drop_index("ix_stock_snapshots_product_day", table_name="stock_snapshots")
+    op.drop_index("ux_stock_snapshots", table_name="stock_snapshots")
+    op.drop_table("stock_snapshots")
+    op.execute("DELETE FROM task_watermarks WHERE name IN ('stock_snapshots', 'stock_snapshots_from')")
@@ -0,0 +1,45 @@
+"""add status and progress columns to import_batches
+
+Revision ID: 9a4c6e8f0b27
+Revises: 8d3f5b7c9e16
+Create Date: 2026-10-17 21:00:00
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "9a4c6e8f0b27"
+down_revision: Union[str, Sequence[str], None] = "8d3f5b7c9e16"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    import_status = sa.Enum("PENDING", "PROCESSING", "COMPLETED", "FAILED", name="importstatus")
+    import_status.create(op.get_bind(), checkfirst=True)
+    # Los lotes existentes se procesaron de forma sincrona: quedan como COMPLETED
+    op.add_column("import_batches", sa.Column("status", import_status, nullable=False, server_default="COMPLETED"))
+    op.add_column("import_batches", sa.Column("processed_rows", sa.Integer(), nullable=False, server_default="0"))
+    op.add_column("import_batches", sa.Column("fuzzy_threshold", sa.Float(), nullable=False, server_default="0.9"))
+    op.add_column("import_batches", sa.Column("file_path", sa.String(length=500), nullable=True))
+    op.add_column("import_batches", sa.Column("error_message", sa.String(length=255), nullable=True))
+    op.add_column("import_batches", sa.Column("started_at", sa.DateTime(timezone=True), nullable=True))
+    op.add_column("import_batches", sa.Column("finished_at", sa.DateTime(timezone=True), nullable=True))
+    op.execute("UPDATE import_batches SET processed_rows = total_rows")
+    op.create_index("ix_import_batches_status", "import_batches", ["status"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_import_batches_status", table_name="import_batches")
+    op.drop_column("import_batches", "finished_at")
+    op.drop_column("import_batches", "started_at")
+    op.drop_column("import_batches", "error_message")
+    op.drop_column("import_batches", "file_path")
+    op.drop_column("import_batches", "fuzzy_threshold")
+    op.drop_column("import_batches", "processed_rows")
+    op.drop_column("import_batches", "status")
+    sa.Enum(name="importstatus").drop(op.get_bind(), checkfirst=True)
@@ -0,0 +1,32 @@
+"""add pg_trgm GIN index on products name
+
+Revision ID: ab5d7f9a1c38
+Revises: 9a4c6e8f0b27
+Create Date: 2026-10-18 09:00:00
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = "ab5d7f9a1c38"
+down_revision: Union[str, Sequence[str], None] = "9a4c6e8f0b27"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Solo PostgreSQL: el resto de motores usan el indice de trigramas en memoria de la importacion
+    if op.get_bind().dialect.name != "postgresql":
+        return
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    op.execute("CREATE INDEX IF NOT EXISTS ix_products_name_trgm ON products USING gin (lower(name) gin_trgm_ops)")
+
+
+def downgrade() -> None:
+    # La extension se deja instalada: otras bases o esquemas pueden usarla
+    if op.get_bind().dialect.name != "postgresql":
+        return
+    op.execute("DROP INDEX IF EXISTS ix_products_name_trgm")
@@ -0,0 +1,43 @@
+"""add content hash, heartbeat and partition checkpoints to imports
+
+Revision ID: bc6e8a0b2d49
+Revises: ab5d7f9a1c38
+Create Date: 2026-10-18 12:00:00
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "bc6e8a0b2d49"
+down_revision: Union[str, Sequence[str], None] = "ab5d7f9a1c38"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column("import_batches", sa.Column("content_hash", sa.String(length=64), nullable=True))
+    op.add_column("import_batches", sa.Column("heartbeat_at", sa.DateTime(timezone=True), nullable=True))
+    op.create_index("ix_import_batches_content_hash", "import_batches", ["kind", "content_hash"])
+    op.create_table(
+        "import_partitions",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("batch_id", sa.Integer(), sa.ForeignKey("import_batches.id", ondelete="CASCADE"), nullable=False),
+        sa.Column("partition", sa.Integer(), nullable=False),
+        sa.Column("processed_rows", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("done", sa.Boolean(), nullable=False, server_default=sa.false()),
+    )
+    op.create_index(
+        "ux_import_partitions_batch_partition", "import_partitions", ["batch_id", "partition"], unique=True
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ux_import_partitions_batch_partition", table_name="import_partitions")
+    op.drop_table("import_partitions")
+    op.drop_index("ix_import_batches_content_hash", table_name="import_batches")
+    op.drop_column("import_batches", "heartbeat_at")
+    op.drop_column("import_batches", "content_hash")
@@ -0,0 +1,46 @@
+"""unique content hash per import kind for real batches
+
+Revision ID: c4e7a2d9f1b3
+Revises: bc6e8a0b2d49
+Create Date: 2026-10-18 18:00:00
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "c4e7a2d9f1b3"
+down_revision: Union[str, Sequence[str], None] = "bc6e8a0b2d49"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Reimportaciones forzadas anteriores: solo el ultimo lote conserva el hash
+    op.execute(
+        """
+        UPDATE import_batches SET content_hash = NULL
+        WHERE dry_run = false AND content_hash IS NOT NULL AND id NOT IN (
+            SELECT MAX(id) FROM import_batches
+            WHERE dry_run = false AND content_hash IS NOT NULL
+            GROUP BY kind, content_hash
+        )
+        """
+    )
+    op.drop_index("ix_import_batches_content_hash", table_name="import_batches")
+    op.create_index(
+        "ux_import_batches_kind_content_hash",
+        "import_batches",
+        ["kind", "content_hash"],
+        unique=True,
+        postgresql_where=sa.text("dry_run = false AND content_hash IS NOT NULL"),
+        sqlite_where=sa.text("dry_run = 0 AND content_hash IS NOT NULL"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ux_import_batches_kind_content_hash", table_name="import_batches")
+    op.create_index("ix_import_batches_content_hash", "import_batches", ["kind", "content_hash"])
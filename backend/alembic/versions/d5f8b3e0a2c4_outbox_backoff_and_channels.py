@@ -0,0 +1,30 @@
+"""outbox retry backoff and per-channel delivery marks
+
+Revision ID: d5f8b3e0a2c4
+Revises: c4e7a2d9f1b3
+Create Date: 2026-10-18 20:00:00
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "d5f8b3e0a2c4"
+down_revision: Union[str, Sequence[str], None] = "c4e7a2d9f1b3"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column("notification_outbox", sa.Column("next_attempt_at", sa.DateTime(timezone=True), nullable=True))
+    op.add_column("notification_outbox", sa.Column("published_at", sa.DateTime(timezone=True), nullable=True))
+    op.add_column("notification_outbox", sa.Column("pushed_at", sa.DateTime(timezone=True), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column("notification_outbox", "pushed_at")
+    op.drop_column("notification_outbox", "published_at")
+    op.drop_column("notification_outbox", "next_attempt_at")
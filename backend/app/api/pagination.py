@@ -0,0 +1,59 @@
+import base64
+from datetime import datetime
+from typing import Any, Sequence
+
+from fastapi import HTTPException, status
+
+from app.db.pagination import TotalMode
+
+
+CURSOR_DESCRIPTION = "Cursor opaco devuelto en next_cursor; no se combina con offset"
+WITH_TOTAL_DESCRIPTION = "exact: COUNT exacto; estimated: estimacion del planificador (o tope LIST_COUNT_CAP); none: sin total"
+
+
+def encode_cursor(created_at: datetime, item_id: int, order_dir: str = "desc") -> str:
+    # La direccion va en el cursor: con la contraria la condicion > / < saltaria o repetiria filas
+    raw = f"{order_dir}|{created_at.isoformat()}|{item_id}".encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str | None, offset: int = 0, order_dir: str = "desc") -> tuple[datetime, int] | None:
+    if cursor is None:
+        return None
+    if offset:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="cursor y offset no se pueden combinar")
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode("utf-8")
+        cursor_dir, created_at, item_id = raw.split("|")
+        after = datetime.fromisoformat(created_at), int(item_id)
+    except (ValueError, UnicodeDecodeError):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="cursor invalido")
+    if cursor_dir != order_dir:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="cursor generado con otro order_dir")
+    return after
+
+
+def page_fields(
+    items: Sequence,
+    *,
+    limit: int,
+    offset: int,
+    total: int | None,
+    with_total: TotalMode,
+    after: tuple | None = None,
+    cursor: bool = True,
+    order_dir: str = "desc",
+) -> dict[str, Any]:
+    # Solo un total exacto en modo offset dice si hay mas; si no, una pagina llena indica que puede haberlas
+    exact_total = total if with_total == TotalMode.EXACT and after is None else None
+    more = bool(items) and len(items) >= limit and (exact_total is None or offset + len(items) < exact_total)
+    fields = {
+        "total": total,
+        "total_estimated": with_total == TotalMode.ESTIMATED,
+        "has_more": more,
+        "limit": limit,
+        "offset": offset,
+    }
+    if cursor:
+        fields["next_cursor"] = encode_cursor(items[-1].created_at, items[-1].id, order_dir) if more else None
+    return fields
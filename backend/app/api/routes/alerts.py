@@ -5,6 +5,8 @@ from pydantic import BaseModel
 from sqlalchemy.orm import Session
 
 from app.api.deps import get_current_user, require_roles
+from app.api.pagination import CURSOR_DESCRIPTION, WITH_TOTAL_DESCRIPTION, decode_cursor, page_fields
+from app.db.pagination import TotalMode
 from app.db.deps import get_db
 from app.models.enums import AlertStatus, UserRole, AlertType
 from app.models.user import User
@@ -14,15 +16,28 @@ from app.schemas.alert import AlertResponse
 
 class AlertListResponse(BaseModel):
     items: list[AlertResponse]
-    total: int
+    total: int | None
+    total_estimated: bool = False
+    has_more: bool = False
     limit: int
     offset: int
+    next_cursor: str | None = None
 
 
 router = APIRouter(prefix="/alerts", tags=["alerts"])
 
 
-@router.get("/", response_model=AlertListResponse, dependencies=[Depends(get_current_user)])
+@router.get(
+    "/",
+    response_model=AlertListResponse,
+    dependencies=[Depends(get_current_user)],
+    responses={
+        400: {
+            "description": "Rango de fechas o cursor invalido",
+            "content": {"application/json": {"example": {"detail": "cursor invalido"}}},
+        }
+    },
+)
 def list_alerts(
     db: Session = Depends(get_db),
     alert_status: AlertStatus | None = Query(None, alias="status"),
@@ -32,10 +47,13 @@ def list_alerts(
     date_to: datetime | None = Query(None),
     limit: int = Query(50, ge=1, le=100),
     offset: int = Query(0, ge=0),
+    cursor: str | None = Query(None, description=CURSOR_DESCRIPTION),
+    with_total: TotalMode = Query(TotalMode.EXACT, description=WITH_TOTAL_DESCRIPTION),
     user: User = Depends(get_current_user),
 ):
     if date_from and date_to and date_from > date_to:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="date_from no puede ser mayor que date_to")
+    after = decode_cursor(cursor, offset)
 
     allowed_types = None
     if user.role == UserRole.USER:
@@ -51,8 +69,13 @@ def list_alerts(
         alert_types=allowed_types,
         limit=limit,
         offset=offset,
+        after=after,
+        with_total=with_total,
+    )
+    return AlertListResponse(
+        items=items,
+        **page_fields(items, limit=limit, offset=offset, total=total, with_total=with_total, after=after),
     )
-    return AlertListResponse(items=items, total=total, limit=limit, offset=offset)
 
 
 @router.post(
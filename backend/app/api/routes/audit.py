@@ -4,6 +4,8 @@ from fastapi import APIRouter, Depends, HTTPException, Query, status
 from sqlalchemy.orm import Session
 
 from app.api.deps import require_roles
+from app.api.pagination import CURSOR_DESCRIPTION, WITH_TOTAL_DESCRIPTION, decode_cursor, page_fields
+from app.db.pagination import TotalMode
 from app.db.deps import get_db
 from app.models.enums import ActionType, Entity, UserRole
 from app.repositories import audit_log_repo
@@ -17,6 +19,12 @@ router = APIRouter(prefix="/audit", tags=["audit"])
     "/",
     response_model=AuditLogListResponse,
     dependencies=[Depends(require_roles(UserRole.ADMIN.value))],
+    responses={
+        400: {
+            "description": "Rango de fechas, ordenacion o cursor invalido",
+            "content": {"application/json": {"example": {"detail": "cursor invalido"}}},
+        }
+    },
 )
 def list_audit_logs(
     db: Session = Depends(get_db),
@@ -28,6 +36,8 @@ def list_audit_logs(
     order_dir: str | None = Query("desc"),
     limit: int = Query(50, ge=1, le=200),
     offset: int = Query(0, ge=0),
+    cursor: str | None = Query(None, description=CURSOR_DESCRIPTION),
+    with_total: TotalMode = Query(TotalMode.EXACT, description=WITH_TOTAL_DESCRIPTION),
 ):
     if date_from and date_to and date_from > date_to:
         raise HTTPException(
@@ -39,6 +49,7 @@ def list_audit_logs(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="order_dir debe ser 'asc' o 'desc'",
         )
+    after = decode_cursor(cursor, offset, order_dir)
 
     items, total = audit_log_repo.list_logs(
         db,
@@ -50,5 +61,18 @@ def list_audit_logs(
         order_dir=order_dir,
         limit=limit,
         offset=offset,
+        after=after,
+        with_total=with_total,
+    )
+    return AuditLogListResponse(
+        items=items,
+        **page_fields(
+            items,
+            limit=limit,
+            offset=offset,
+            total=total,
+            with_total=with_total,
+            after=after,
+            order_dir=order_dir,
+        ),
     )
-    return AuditLogListResponse(items=items, total=total, limit=limit, offset=offset)
@@ -3,7 +3,7 @@ from pydantic import BaseModel
 from sqlalchemy.orm import Session
 
 from app.api.deps import get_current_user, require_roles
-from app.cache.redis_cache import cache_get, cache_set, cache_invalidate_prefix, make_key
+from app.cache.redis_cache import cache_get, cache_set, cache_invalidate_prefix, scoped_key
 from app.db.deps import get_db
 from app.models.enums import UserRole
 from app.repositories import category_repo
@@ -41,9 +41,9 @@ def list_categories(
         raise HTTPException(status_code=400, detail="order_by debe ser 'id'")
     if order_dir not in {"asc", "desc"}:
         raise HTTPException(status_code=400, detail="order_dir debe ser 'asc' o 'desc'")
-    cache_key = make_key(
+    cache_key = scoped_key(
         "categories:list",
-        user.id if user else None,
+        user,
         {"name": name, "order_by": order_by, "order_dir": order_dir, "limit": limit, "offset": offset},
     )
     cached = cache_get(cache_key)
@@ -73,15 +73,16 @@ def list_categories(
     },
 )
 def get_category(category_id: int, db: Session = Depends(get_db), user=Depends(get_current_user)):
-    cache_key = make_key("categories:detail", user.id if user else None, {"id": category_id})
+    cache_key = scoped_key("categories:detail", user, {"id": category_id})
     cached = cache_get(cache_key)
     if cached is not None:
         return cached
     category = category_repo.get(db, category_id)
     if not category:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Categoría no encontrada")
-    cache_set(cache_key, category, ttl_seconds=3600)
-    return category
+    payload = CategoryResponse.model_validate(category)
+    cache_set(cache_key, payload, ttl_seconds=3600)
+    return payload
 
 @router.post(
     "/",
@@ -99,8 +100,7 @@ def create_category(payload: CategoryCreate, db: Session = Depends(get_db)):
     if category_repo.get_by_name(db, payload.name):
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="La categoría ya existe")
     category = category_repo.create_category(db, name=payload.name)
-    cache_invalidate_prefix("categories:list")
-    cache_invalidate_prefix("categories:detail")
+    cache_invalidate_prefix("categories:list", "categories:detail")
     return category
 
 @router.patch(
@@ -127,8 +127,7 @@ def update_category(category_id: int, payload: CategoryUpdate, db: Session = Dep
         if existing and existing.id != category_id:
             raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="La categoría ya existe")
         category = category_repo.update_category(db, category, name=payload.name)
-    cache_invalidate_prefix("categories:list")
-    cache_invalidate_prefix("categories:detail")
+    cache_invalidate_prefix("categories:list", "categories:detail")
     return category
 
 @router.delete(
@@ -147,6 +146,5 @@ def delete_category(category_id: int, db: Session = Depends(get_db)):
     if not category:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Categoría no encontrada")
     category_repo.delete_category(db, category)
-    cache_invalidate_prefix("categories:list")
-    cache_invalidate_prefix("categories:detail")
+    cache_invalidate_prefix("categories:list", "categories:detail")
     return None
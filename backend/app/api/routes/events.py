@@ -1,22 +1,35 @@
 from fastapi import APIRouter, Depends, HTTPException, Query, status, Response
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 from sqlalchemy.orm import Session
-from app.tasks import process_event
+from app.tasks import process_event, enqueue_events
 from app.api.deps import get_current_user
-from app.cache.redis_cache import cache_get, cache_set, cache_invalidate_prefix, make_key
+from app.api.export import EXPORT_FORMAT_DESCRIPTION, EXPORT_RESPONSES, ExportFormat, stream_export
+from app.api.pagination import CURSOR_DESCRIPTION, WITH_TOTAL_DESCRIPTION, decode_cursor, page_fields
+from app.db.pagination import TotalMode
+from app.cache.redis_cache import cached_response, cache_invalidate_prefix, scoped_key
 from app.db.deps import get_db
 from app.models.enums import EventType
 from app.models.user import User
 from app.repositories import event_repo, product_repo, location_repo
-from app.schemas.event import EventCreate, EventResponse
+from app.schemas.event import (
+    EventCreate,
+    EventResponse,
+    EventBatchCreate,
+    EventBatchItemResult,
+    EventBatchResponse,
+)
 from sqlalchemy.exc import IntegrityError
 
 
 class EventListResponse(BaseModel):
     items: list[EventResponse]
-    total: int
+    total: int | None
+    total_estimated: bool = False
+    has_more: bool = False
     limit: int
     offset: int
+    next_cursor: str | None = None
 
 
 router = APIRouter(prefix="/events", tags=["events"])
@@ -27,7 +40,7 @@ router = APIRouter(prefix="/events", tags=["events"])
     response_model=EventListResponse,
     responses={
         400: {
-            "description": "Ordenacion invalida",
+            "description": "Ordenacion o cursor invalido",
             "content": {"application/json": {"example": {"detail": "order_by debe ser 'created_at'"}}},
         }
     },
@@ -42,14 +55,17 @@ def list_events(
     order_dir: str | None = Query("desc"),
     limit: int = Query(50, ge=1, le=100),
     offset: int = Query(0, ge=0),
+    cursor: str | None = Query(None, description=CURSOR_DESCRIPTION),
+    with_total: TotalMode = Query(TotalMode.EXACT, description=WITH_TOTAL_DESCRIPTION),
 ):
     if order_by != "created_at":
         raise HTTPException(status_code=400, detail="order_by debe ser 'created_at'")
     if order_dir not in {"asc", "desc"}:
         raise HTTPException(status_code=400, detail="order_dir debe ser 'asc' o 'desc'")
-    cache_key = make_key(
+    after = decode_cursor(cursor, offset, order_dir)
+    cache_key = scoped_key(
         "events:list",
-        user.id,
+        user,
         {
             "event_type": event_type,
             "product_id": product_id,
@@ -58,23 +74,67 @@ def list_events(
             "order_dir": order_dir,
             "limit": limit,
             "offset": offset,
+            "cursor": cursor,
+            "with_total": with_total.value,
         },
     )
-    cached = cache_get(cache_key)
-    if cached is not None:
-        return cached
-    items, total = event_repo.list_events(
-        db,
+
+    def _load() -> EventListResponse:
+        items, total = event_repo.list_events(
+            db,
+            event_type=event_type,
+            product_id=product_id,
+            processed=processed,
+            order_dir=order_dir,
+            limit=limit,
+            offset=offset,
+            after=after,
+            with_total=with_total,
+        )
+        return EventListResponse(
+            items=items,
+            **page_fields(
+                items,
+                limit=limit,
+                offset=offset,
+                total=total,
+                with_total=with_total,
+                after=after,
+                order_dir=order_dir,
+            ),
+        )
+
+    return cached_response(cache_key, _load, ttl_seconds=300)
+
+
+@router.get(
+    "/export",
+    response_class=StreamingResponse,
+    responses={
+        **EXPORT_RESPONSES,
+        400: {
+            "description": "Ordenacion invalida",
+            "content": {"application/json": {"example": {"detail": "order_dir debe ser 'asc' o 'desc'"}}},
+        },
+    },
+)
+def export_events(
+    user: User = Depends(get_current_user),
+    event_type: EventType | None = Query(None),
+    product_id: int | None = Query(None),
+    processed: bool | None = Query(None),
+    order_dir: str | None = Query("desc"),
+    format: ExportFormat = Query(ExportFormat.CSV, description=EXPORT_FORMAT_DESCRIPTION),
+):
+    if order_dir not in {"asc", "desc"}:
+        raise HTTPException(status_code=400, detail="order_dir debe ser 'asc' o 'desc'")
+    stmt = event_repo.select_for_export(
         event_type=event_type,
         product_id=product_id,
         processed=processed,
         order_dir=order_dir,
-        limit=limit,
-        offset=offset,
     )
-    payload = EventListResponse(items=items, total=total, limit=limit, offset=offset)
-    cache_set(cache_key, payload, ttl_seconds=300)
-    return payload
+    return stream_export(stmt, filename="events", fmt=format)
 
 
 @router.post(
@@ -174,3 +234,99 @@ def create_event(
 
     cache_invalidate_prefix("events:list")
     return event
+
+
+@router.post(
+    "/batch",
+    response_model=EventBatchResponse,
+    status_code=status.HTTP_200_OK,
+    responses={
+        503: {
+            "description": "Eventos guardados pero no se pudieron encolar",
+            "content": {
+                "application/json": {"example": {"detail": "No se pudo encolar el lote: broker no disponible"}}
+            },
+        },
+    },
+)
+def create_events_batch(
+    payload: EventBatchCreate,
+    db: Session = Depends(get_db),
+    user: User = Depends(get_current_user),
+):
+    items = payload.items
+    results: list[EventBatchItemResult | None] = [None] * len(items)
+
+    # 1) Validaciones en bloque: productos existentes y claves ya registradas
+    valid_products = product_repo.existing_ids(db, {item.product_id for item in items})
+    existing = event_repo.get_by_idempotency_keys(db, {item.idempotency_key for item in items})
+
+    pending: list[int] = []
+    seen_keys: set[str] = set()
+    for idx, item in enumerate(items):
+        key = item.idempotency_key
+        if key in existing:
+            results[idx] = EventBatchItemResult(
+                index=idx, idempotency_key=key, status="DUPLICATE", event=existing[key]
+            )
+        elif key in seen_keys:
+            results[idx] = EventBatchItemResult(
+                index=idx, idempotency_key=key, status="DUPLICATE", detail="idempotency_key repetida en el lote"
+            )
+        elif item.product_id not in valid_products:
+            results[idx] = EventBatchItemResult(
+                index=idx, idempotency_key=key, status="ERROR", detail="Producto no encontrado"
+            )
+        else:
+            pending.append(idx)
+        seen_keys.add(key)
+
+    # 2) Ubicaciones en bloque + insercion multi-fila resolviendo conflictos de idempotencia
+    created_keys: set[str] = set()
+    if pending:
+        # Sin commit intermedio: ubicaciones y eventos se confirman juntos
+        locations = location_repo.get_or_create_many(
+            db, {items[idx].location for idx in pending}, commit=False
+        )
+        rows = [
+            {
+                "event_type": items[idx].event_type,
+                "product_id": items[idx].product_id,
+                "delta": items[idx].delta,
+                "source": items[idx].source,
+                "location_id": locations[items[idx].location.strip().lower()].id,
+                "idempotency_key": items[idx].idempotency_key,
+            }
+            for idx in pending
+        ]
+        created_keys = event_repo.create_events_bulk(db, rows)
+        db.commit()
+
+        stored = event_repo.get_by_idempotency_keys(db, {items[idx].idempotency_key for idx in pending})
+        for idx in pending:
+            key = items[idx].idempotency_key
+            results[idx] = EventBatchItemResult(
+                index=idx,
+                idempotency_key=key,
+                status="CREATED" if key in created_keys else "DUPLICATE",
+                event=stored.get(key),
+            )
+
+    # 3) Encolar los eventos nuevos en chunks (quedan PENDING si el broker falla)
+    created_ids = sorted(result.event.id for result in results if result.status == "CREATED")
+    if created_ids:
+        cache_invalidate_prefix("events:list")
+        try:
+            enqueue_events(created_ids)
+        except Exception as exc:
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail=f"No se pudo encolar el lote: {exc}",
+            )
+
+    return EventBatchResponse(
+        items=results,
+        created=sum(1 for result in results if result.status == "CREATED"),
+        duplicates=sum(1 for result in results if result.status == "DUPLICATE"),
+        errors=sum(1 for result in results if result.status == "ERROR"),
+    )
@@ -1,26 +1,21 @@
-import csv
-import io
-from difflib import SequenceMatcher
-from typing import Any
+from datetime import datetime
 
 from fastapi import APIRouter, Depends, File, HTTPException, Query, UploadFile, status
+from fastapi.responses import JSONResponse
 from pydantic import BaseModel, Field
-from sqlalchemy.exc import IntegrityError
 from sqlalchemy import select, func
 from sqlalchemy.orm import Session
 
-from app.api.deps import get_current_user, require_roles
+from app.api.deps import require_roles
 from app.cache.redis_cache import cache_invalidate_prefix
 from app.db.deps import get_db
 from app.models import ImportBatch, ImportError, ImportReview
-from app.models.category import Category
-from app.models.location import Location
-from app.models.product import Product
-from app.models.enums import Source, UserRole, AlertType, AlertStatus, Entity, ActionType
-from app.repositories import category_repo, product_repo, alert_repo, audit_log_repo
-from app.services import fcm_service
+from app.models.enums import ImportStatus, UserRole, Entity, ActionType
+from app.repositories import audit_log_repo
+from app.services import import_service
 from app.services import inventory_service
 from app.models.user import User
+from app.tasks import import_csv_batch
 
 
 router = APIRouter(prefix="/imports", tags=["imports"])
@@ -45,10 +40,41 @@ class ImportSummaryResponse(BaseModel):
     ok_rows: int
     error_rows: int
     review_rows: int
+    # Muestra de hasta IMPORT_RESPONSE_SAMPLE filas; el detalle completo en /imports/batches/{batch_id}/errors y /imports/reviews
     errors: list[ImportErrorResponse] = Field(default_factory=list)
     reviews: list[ImportReviewResponse] = Field(default_factory=list)
 
 
+class ImportBatchStatusResponse(BaseModel):
+    batch_id: int
+    kind: str
+    status: ImportStatus
+    dry_run: bool
+    total_rows: int
+    processed_rows: int
+    ok_rows: int
+    error_rows: int
+    review_rows: int
+    progress: float
+    error_message: str | None = None
+    created_at: datetime
+    started_at: datetime | None = None
+    finished_at: datetime | None = None
+
+
+class ImportErrorItem(ImportErrorResponse):
+    id: int
+    batch_id: int
+    payload: dict
+
+
+class ImportErrorListResponse(BaseModel):
+    items: list[ImportErrorItem]
+    total: int
+    limit: int
+    offset: int
+
+
 class ImportReviewItem(BaseModel):
     id: int
     batch_id: int
@@ -65,267 +91,125 @@ class ImportReviewListResponse(BaseModel):
     offset: int
 
 
-def _decode_csv(upload: UploadFile) -> csv.DictReader:
-    raw = upload.file.read()
-    if not raw:
-        raise HTTPException(status_code=400, detail="CSV vacio")
-    try:
-        text = raw.decode("utf-8-sig")
-    except UnicodeDecodeError:
-        raise HTTPException(status_code=400, detail="CSV debe estar en UTF-8")
-    return csv.DictReader(io.StringIO(text))
-
-
-def _parse_int(value: str, *, field_name: str) -> int:
-    try:
-        return int(value)
-    except (TypeError, ValueError):
-        raise ValueError(f"{field_name} debe ser un entero")
-
-
-def _normalize_row(row: dict[str, Any]) -> dict[str, Any]:
-    return {k.strip(): (v.strip() if isinstance(v, str) else v) for k, v in row.items()}
-
+_ASYNC_RESPONSE = {
+    202: {
+        "model": ImportBatchStatusResponse,
+        "description": "Fichero grande (>= IMPORT_ASYNC_MIN_BYTES): lote en cola, seguir en /imports/batches/{batch_id}",
+    },
+    400: {
+        "description": "CSV vacio, sin cabecera, sin columnas obligatorias o no UTF-8",
+        "content": {"application/json": {"example": {"detail": "Faltan columnas: location_id"}}},
+    },
+    409: {
+        "description": "El mismo fichero ya se importo (o se esta importando); force=true lo vuelve a aplicar",
+        "content": {"application/json": {"example": {"detail": "Fichero ya importado en el lote 12"}}},
+    },
+}
 
-def _find_similar_products(db: Session, name: str, *, threshold: float, limit: int = 3) -> list[dict]:
-    candidates = db.execute(select(Product.id, Product.name, Product.sku, Product.barcode)).all()
-    if not candidates:
-        return []
-
-    scored = []
-    target = name.strip().lower()
-    for pid, pname, sku, barcode in candidates:
-        ratio = SequenceMatcher(a=target, b=pname.strip().lower()).ratio()
-        if ratio >= threshold:
-            scored.append((ratio, pid, pname, sku, barcode))
-
-    scored.sort(key=lambda x: x[0], reverse=True)
-    return [
-        {"product_id": pid, "name": pname, "sku": sku, "barcode": barcode, "similarity": round(ratio, 3)}
-        for ratio, pid, pname, sku, barcode in scored[:limit]
-    ]
+FORCE_DESCRIPTION = "Aplica el fichero aunque su contenido coincida con un lote anterior"
 
 
-def _get_category_or_error(db: Session, category_id: int) -> Category | None:
-    return category_repo.get(db, category_id)
+def _batch_status(batch: ImportBatch) -> ImportBatchStatusResponse:
+    if batch.total_rows:
+        progress = min(batch.processed_rows / batch.total_rows, 1.0)
+    else:
+        progress = 1.0 if batch.status == ImportStatus.COMPLETED else 0.0
+    return ImportBatchStatusResponse(
+        batch_id=batch.id,
+        kind=batch.kind,
+        status=batch.status,
+        dry_run=batch.dry_run,
+        total_rows=batch.total_rows,
+        processed_rows=batch.processed_rows,
+        ok_rows=batch.ok_rows,
+        error_rows=batch.error_rows,
+        review_rows=batch.review_rows,
+        progress=round(progress, 4),
+        error_message=batch.error_message,
+        created_at=batch.created_at,
+        started_at=batch.started_at,
+        finished_at=batch.finished_at,
+    )
 
 
-def _get_location_or_error(db: Session, location_id: int) -> Location | None:
-    return db.get(Location, location_id)
+def _create_batch(db: Session, *, kind: str, user: User, **fields) -> ImportBatch:
+    try:
+        return import_service.create_batch(db, kind=kind, user_id=user.id, **fields)
+    except import_service.DuplicateImportError as exc:
+        raise HTTPException(status_code=409, detail=f"Fichero ya en proceso en el lote {exc.batch.id}")
 
 
-def _resolve_product(
+def _start_import(
     db: Session,
     *,
-    sku: str,
-    barcode: str,
-    name: str | None,
-    category_id: int,
+    kind: str,
+    upload: UploadFile,
+    dry_run: bool,
     fuzzy_threshold: float,
-) -> tuple[Product | None, str | None, dict | None, bool]:
-    by_sku = product_repo.get_by_sku(db, sku)
-    by_barcode = product_repo.get_by_barcode(db, barcode)
-
-    if by_sku and by_barcode and by_sku.id != by_barcode.id:
-        return None, "sku_barcode_conflict", None, False
-
-    product = by_sku or by_barcode
-    if product:
-        if product.sku != sku or (product.barcode or "") != barcode:
-            return None, "sku_barcode_mismatch", None, False
-        if product.category_id != category_id:
-            return None, "category_mismatch", None, False
-        return product, None, None, False
-
-    if not name:
-        return None, "missing_product_name", None, False
-
-    suggestions = _find_similar_products(db, name, threshold=fuzzy_threshold)
-    if suggestions:
-        return None, "possible_duplicate", {"matches": suggestions}, False
-
-    return None, None, None, True
-
-
-def _record_error(db: Session, batch_id: int, row_number: int, code: str, message: str, payload: dict) -> ImportError:
-    entry = ImportError(
-        batch_id=batch_id,
-        row_number=row_number,
-        error_code=code,
-        message=message,
-        payload=payload,
-    )
-    db.add(entry)
-    return entry
-
+    force: bool,
+    user: User,
+):
+    # El upload ya esta en un fichero temporal: se valida y se parsea por bloques, sin cargarlo entero
+    try:
+        size, content_hash = import_service.inspect_upload(upload.file)
+        reader = import_service.open_csv(upload.file, kind)
+    except import_service.ImportFileError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
 
-def _record_review(
-    db: Session,
-    batch_id: int,
-    row_number: int,
-    reason: str,
-    payload: dict,
-    suggestions: dict | None = None,
-) -> ImportReview:
-    entry = ImportReview(
-        batch_id=batch_id,
-        row_number=row_number,
-        reason=reason,
-        payload=payload,
-        suggestions=suggestions,
-    )
-    db.add(entry)
-    return entry
+    previous = None if dry_run or force else import_service.find_by_hash(db, kind, content_hash)
+    if previous is not None:
+        if not import_service.is_resumable(previous):
+            verb = "importado" if previous.status == ImportStatus.COMPLETED else "en proceso"
+            raise HTTPException(status_code=409, detail=f"Fichero ya {verb} en el lote {previous.id}")
+        # Re-subida de un lote fallido o abandonado: se reanuda desde su checkpoint, sin repetir filas
+        import_service.store_file(db, previous, upload.file)
+        import_service.requeue(db, previous)
+        import_csv_batch.delay(previous.id)
+        return JSONResponse(
+            status_code=status.HTTP_202_ACCEPTED,
+            content=_batch_status(previous).model_dump(mode="json"),
+        )
 
+    if force and not dry_run:
+        import_service.release_hash(db, kind, content_hash)
 
-def _apply_event_row(
-    db: Session,
-    *,
-    row: dict[str, Any],
-    user_id: int,
-):
-    movement_type = row.get("type", "").upper()
-    if movement_type not in {"IN", "OUT", "ADJUST"}:
-        raise ValueError("type invalido (IN/OUT/ADJUST)")
-
-    sku = row.get("sku", "")
-    barcode = row.get("barcode", "")
-    name = row.get("name", "") or None
-    if not sku or not barcode:
-        raise ValueError("sku y barcode son obligatorios")
-
-    category_id = _parse_int(row.get("category_id"), field_name="category_id")
-    location_id = _parse_int(row.get("location_id"), field_name="location_id")
-    quantity = _parse_int(row.get("quantity"), field_name="quantity")
-
-    if movement_type in {"IN", "OUT"} and quantity <= 0:
-        raise ValueError("quantity debe ser > 0 para IN/OUT")
-    if movement_type == "ADJUST" and quantity == 0:
-        raise ValueError("quantity no puede ser 0 para ADJUST")
-
-    if not _get_category_or_error(db, category_id):
-        raise ValueError("category_id no existe")
-    if not _get_location_or_error(db, location_id):
-        raise ValueError("location_id no existe")
-
-    by_sku = product_repo.get_by_sku(db, sku)
-    by_barcode = product_repo.get_by_barcode(db, barcode)
-    if by_sku and by_barcode and by_sku.id != by_barcode.id:
-        raise ValueError("sku_barcode_conflict")
-
-    product = by_sku or by_barcode
-    if product:
-        if product.sku != sku or (product.barcode or "") != barcode:
-            raise ValueError("sku_barcode_mismatch")
-        if product.category_id != category_id:
-            raise ValueError("category_mismatch")
-    else:
-        if not name:
-            raise ValueError("missing_product_name")
-        try:
-            product = product_repo.create_product(
-                db,
-                sku=sku,
-                name=name,
-                barcode=barcode,
-                category_id=category_id,
-            )
-        except IntegrityError:
-            db.rollback()
-            raise ValueError("product_unique_conflict")
-
-    if movement_type == "IN":
-        inventory_service.increase_stock_by_location_id(
+    if size >= import_service.async_min_bytes():
+        # Ficheros grandes: se guarda el fichero y un worker lo procesa por bloques
+        batch = _create_batch(
             db,
-            product_id=product.id,
-            quantity=quantity,
-            user_id=user_id,
-            location_id=location_id,
-            source=Source.MANUAL,
+            kind=kind,
+            user=user,
+            dry_run=dry_run,
+            fuzzy_threshold=fuzzy_threshold,
+            status=ImportStatus.PENDING,
+            content_hash=content_hash,
         )
-    elif movement_type == "OUT":
-        inventory_service.decrease_stock_by_location_id(
-            db,
-            product_id=product.id,
-            quantity=quantity,
-            user_id=user_id,
-            location_id=location_id,
-            source=Source.MANUAL,
-        )
-    else:
-        inventory_service.adjust_stock_by_location_id(
-            db,
-            product_id=product.id,
-            quantity=quantity,
-            user_id=user_id,
-            location_id=location_id,
-            source=Source.MANUAL,
+        import_service.store_file(db, batch, upload.file)
+        import_csv_batch.delay(batch.id)
+        return JSONResponse(
+            status_code=status.HTTP_202_ACCEPTED,
+            content=_batch_status(batch).model_dump(mode="json"),
         )
 
-
-def _apply_transfer_row(
-    db: Session,
-    *,
-    row: dict[str, Any],
-    user_id: int,
-):
-    sku = row.get("sku", "")
-    barcode = row.get("barcode", "")
-    name = row.get("name", "") or None
-    if not sku or not barcode:
-        raise ValueError("sku y barcode son obligatorios")
-
-    category_id = _parse_int(row.get("category_id"), field_name="category_id")
-    from_location_id = _parse_int(row.get("from_location_id"), field_name="from_location_id")
-    to_location_id = _parse_int(row.get("to_location_id"), field_name="to_location_id")
-    quantity = _parse_int(row.get("quantity"), field_name="quantity")
-
-    if quantity <= 0:
-        raise ValueError("quantity debe ser > 0")
-    if from_location_id == to_location_id:
-        raise ValueError("from_location_id y to_location_id no pueden ser iguales")
-
-    if not _get_category_or_error(db, category_id):
-        raise ValueError("category_id no existe")
-    if not _get_location_or_error(db, from_location_id):
-        raise ValueError("from_location_id no existe")
-    if not _get_location_or_error(db, to_location_id):
-        raise ValueError("to_location_id no existe")
-
-    by_sku = product_repo.get_by_sku(db, sku)
-    by_barcode = product_repo.get_by_barcode(db, barcode)
-    if by_sku and by_barcode and by_sku.id != by_barcode.id:
-        raise ValueError("sku_barcode_conflict")
-
-    product = by_sku or by_barcode
-    if product:
-        if product.sku != sku or (product.barcode or "") != barcode:
-            raise ValueError("sku_barcode_mismatch")
-        if product.category_id != category_id:
-            raise ValueError("category_mismatch")
-    else:
-        if not name:
-            raise ValueError("missing_product_name")
-        try:
-            product = product_repo.create_product(
-                db,
-                sku=sku,
-                name=name,
-                barcode=barcode,
-                category_id=category_id,
-            )
-        except IntegrityError:
-            db.rollback()
-            raise ValueError("product_unique_conflict")
-
-    inventory_service.transfer_stock_by_location_id(
+    batch = _create_batch(
         db,
-        product_id=product.id,
-        quantity=quantity,
-        user_id=user_id,
-        from_location_id=from_location_id,
-        to_location_id=to_location_id,
-        source=Source.MANUAL,
+        kind=kind,
+        user=user,
+        dry_run=dry_run,
+        fuzzy_threshold=fuzzy_threshold,
+        status=ImportStatus.PROCESSING,
+        content_hash=content_hash,
+    )
+    outcome = import_service.run_sync(db, batch, reader)
+    return ImportSummaryResponse(
+        batch_id=batch.id,
+        dry_run=dry_run,
+        total_rows=batch.total_rows,
+        ok_rows=outcome.ok_rows,
+        error_rows=outcome.error_rows,
+        review_rows=outcome.review_rows,
+        errors=[ImportErrorResponse(**error) for error in outcome.errors],
+        reviews=[ImportReviewResponse(**review) for review in outcome.reviews],
     )
 
 
@@ -333,215 +217,18 @@ def _apply_transfer_row(
     "/events/csv",
     response_model=ImportSummaryResponse,
     status_code=status.HTTP_201_CREATED,
+    responses=_ASYNC_RESPONSE,
 )
 def import_events_csv(
     file: UploadFile = File(...),
     dry_run: bool = Query(False),
     fuzzy_threshold: float = Query(0.9, ge=0.0, le=1.0),
+    force: bool = Query(False, description=FORCE_DESCRIPTION),
     db: Session = Depends(get_db),
     user: User = Depends(require_roles(UserRole.MANAGER.value, UserRole.ADMIN.value)),
 ):
-    reader = _decode_csv(file)
-    required = {"type", "sku", "barcode", "name", "category_id", "location_id", "quantity"}
-    if not reader.fieldnames:
-        raise HTTPException(status_code=400, detail="CSV sin cabecera")
-    missing = required - {name.strip() for name in reader.fieldnames}
-    if missing:
-        raise HTTPException(status_code=400, detail=f"Faltan columnas: {', '.join(sorted(missing))}")
-
-    batch = ImportBatch(kind="EVENTS", user_id=user.id, dry_run=dry_run)
-    db.add(batch)
-    db.flush()
-    audit_log_repo.create_log(
-        db,
-        entity=Entity.IMPORT,
-        action=ActionType.CREATE,
-        user_id=user.id,
-        details=f"batch_id={batch.id} kind={batch.kind} dry_run={batch.dry_run}",
-        commit=False,
-    )
-
-    errors: list[ImportErrorResponse] = []
-    reviews: list[ImportReviewResponse] = []
-
-    total_rows = 0
-    ok_rows = 0
-    error_rows = 0
-    review_rows = 0
-
-    for idx, raw_row in enumerate(reader, start=2):
-        total_rows += 1
-        row = _normalize_row(raw_row)
-        payload = dict(row)
-
-        try:
-            movement_type = row.get("type", "").upper()
-            if movement_type not in {"IN", "OUT", "ADJUST"}:
-                raise ValueError("type invalido (IN/OUT/ADJUST)")
-
-            sku = row.get("sku", "")
-            barcode = row.get("barcode", "")
-            name = row.get("name", "") or None
-            if not sku or not barcode:
-                raise ValueError("sku y barcode son obligatorios")
-
-            category_id = _parse_int(row.get("category_id"), field_name="category_id")
-            location_id = _parse_int(row.get("location_id"), field_name="location_id")
-            quantity = _parse_int(row.get("quantity"), field_name="quantity")
-
-            if movement_type in {"IN", "OUT"} and quantity <= 0:
-                raise ValueError("quantity debe ser > 0 para IN/OUT")
-            if movement_type == "ADJUST" and quantity == 0:
-                raise ValueError("quantity no puede ser 0 para ADJUST")
-
-            if not _get_category_or_error(db, category_id):
-                raise ValueError("category_id no existe")
-            if not _get_location_or_error(db, location_id):
-                raise ValueError("location_id no existe")
-
-            product, product_issue, suggestions, would_create = _resolve_product(
-                db,
-                sku=sku,
-                barcode=barcode,
-                name=name,
-                category_id=category_id,
-                fuzzy_threshold=fuzzy_threshold,
-            )
-            if product_issue:
-                review = _record_review(
-                    db,
-                    batch.id,
-                    idx,
-                    product_issue,
-                    payload,
-                    suggestions,
-                )
-                review_rows += 1
-                reviews.append(
-                    ImportReviewResponse(
-                        row_number=review.row_number,
-                        reason=review.reason,
-                        suggestions=review.suggestions,
-                    )
-                )
-                continue
-            if product is None and would_create:
-                if dry_run:
-                    ok_rows += 1
-                    continue
-                try:
-                    product = product_repo.create_product(
-                        db,
-                        sku=sku,
-                        name=name or sku,
-                        barcode=barcode,
-                        category_id=category_id,
-                    )
-                except IntegrityError:
-                    db.rollback()
-                    error = _record_error(db, batch.id, idx, "product_unique_conflict", "Producto duplicado", payload)
-                    error_rows += 1
-                    errors.append(
-                        ImportErrorResponse(
-                            row_number=error.row_number,
-                            error_code=error.error_code,
-                            message=error.message,
-                        )
-                    )
-                    continue
-
-            if not dry_run and product is not None:
-                if movement_type == "IN":
-                    inventory_service.increase_stock_by_location_id(
-                        db,
-                        product_id=product.id,
-                        quantity=quantity,
-                        user_id=user.id,
-                        location_id=location_id,
-                        source=Source.MANUAL,
-                    )
-                elif movement_type == "OUT":
-                    inventory_service.decrease_stock_by_location_id(
-                        db,
-                        product_id=product.id,
-                        quantity=quantity,
-                        user_id=user.id,
-                        location_id=location_id,
-                        source=Source.MANUAL,
-                    )
-                else:
-                    inventory_service.adjust_stock_by_location_id(
-                        db,
-                        product_id=product.id,
-                        quantity=quantity,
-                        user_id=user.id,
-                        location_id=location_id,
-                        source=Source.MANUAL,
-                    )
-
-            ok_rows += 1
-        except inventory_service.InventoryError as exc:
-            error = _record_error(db, batch.id, idx, "inventory_error", str(exc), payload)
-            error_rows += 1
-            errors.append(
-                ImportErrorResponse(
-                    row_number=error.row_number,
-                    error_code=error.error_code,
-                    message=error.message,
-                )
-            )
-        except ValueError as exc:
-            error = _record_error(db, batch.id, idx, "validation_error", str(exc), payload)
-            error_rows += 1
-            errors.append(
-                ImportErrorResponse(
-                    row_number=error.row_number,
-                    error_code=error.error_code,
-                    message=error.message,
-                )
-            )
-
-    batch.total_rows = total_rows
-    batch.ok_rows = ok_rows
-    batch.error_rows = error_rows
-    batch.review_rows = review_rows
-    db.add(batch)
-    db.commit()
-
-    if ok_rows and not dry_run:
-        cache_invalidate_prefix("movements:list")
-        cache_invalidate_prefix("stocks:list")
-        cache_invalidate_prefix("stocks:detail")
-        cache_invalidate_prefix("products:list")
-        cache_invalidate_prefix("reports:top-consumed")
-        cache_invalidate_prefix("reports:turnover")
-
-    if not dry_run and (error_rows > 0 or review_rows > 0):
-        alert_repo.create_alert(
-            db,
-            stock_id=None,
-            quantity=error_rows + review_rows,
-            min_quantity=0,
-            alert_type=AlertType.IMPORT_ISSUES,
-            status=AlertStatus.PENDING,
-        )
-    if not dry_run:
-        fcm_service.send_import_completed_push(
-            db,
-            total_rows=total_rows,
-            error_rows=error_rows,
-            review_rows=review_rows,
-        )
-
-    return ImportSummaryResponse(
-        batch_id=batch.id,
-        dry_run=dry_run,
-        total_rows=total_rows,
-        ok_rows=ok_rows,
-        error_rows=error_rows,
-        review_rows=review_rows,
-        errors=errors,
-        reviews=reviews,
+    return _start_import(
+        db, kind="EVENTS", upload=file, dry_run=dry_run, fuzzy_threshold=fuzzy_threshold, force=force, user=user
     )
 
 
@@ -549,197 +236,68 @@ def import_events_csv(
     "/transfers/csv",
     response_model=ImportSummaryResponse,
     status_code=status.HTTP_201_CREATED,
+    responses=_ASYNC_RESPONSE,
 )
 def import_transfers_csv(
     file: UploadFile = File(...),
     dry_run: bool = Query(False),
     fuzzy_threshold: float = Query(0.9, ge=0.0, le=1.0),
+    force: bool = Query(False, description=FORCE_DESCRIPTION),
     db: Session = Depends(get_db),
     user: User = Depends(require_roles(UserRole.MANAGER.value, UserRole.ADMIN.value)),
 ):
-    reader = _decode_csv(file)
-    required = {"sku", "barcode", "name", "category_id", "from_location_id", "to_location_id", "quantity"}
-    if not reader.fieldnames:
-        raise HTTPException(status_code=400, detail="CSV sin cabecera")
-    missing = required - {name.strip() for name in reader.fieldnames}
-    if missing:
-        raise HTTPException(status_code=400, detail=f"Faltan columnas: {', '.join(sorted(missing))}")
-
-    batch = ImportBatch(kind="TRANSFERS", user_id=user.id, dry_run=dry_run)
-    db.add(batch)
-    db.flush()
-    audit_log_repo.create_log(
-        db,
-        entity=Entity.IMPORT,
-        action=ActionType.CREATE,
-        user_id=user.id,
-        details=f"batch_id={batch.id} kind={batch.kind} dry_run={batch.dry_run}",
-        commit=False,
+    return _start_import(
+        db, kind="TRANSFERS", upload=file, dry_run=dry_run, fuzzy_threshold=fuzzy_threshold, force=force, user=user
     )
 
-    errors: list[ImportErrorResponse] = []
-    reviews: list[ImportReviewResponse] = []
-
-    total_rows = 0
-    ok_rows = 0
-    error_rows = 0
-    review_rows = 0
-
-    for idx, raw_row in enumerate(reader, start=2):
-        total_rows += 1
-        row = _normalize_row(raw_row)
-        payload = dict(row)
-
-        try:
-            sku = row.get("sku", "")
-            barcode = row.get("barcode", "")
-            name = row.get("name", "") or None
-            if not sku or not barcode:
-                raise ValueError("sku y barcode son obligatorios")
-
-            category_id = _parse_int(row.get("category_id"), field_name="category_id")
-            from_location_id = _parse_int(row.get("from_location_id"), field_name="from_location_id")
-            to_location_id = _parse_int(row.get("to_location_id"), field_name="to_location_id")
-            quantity = _parse_int(row.get("quantity"), field_name="quantity")
-
-            if quantity <= 0:
-                raise ValueError("quantity debe ser > 0")
-            if from_location_id == to_location_id:
-                raise ValueError("from_location_id y to_location_id no pueden ser iguales")
-
-            if not _get_category_or_error(db, category_id):
-                raise ValueError("category_id no existe")
-            if not _get_location_or_error(db, from_location_id):
-                raise ValueError("from_location_id no existe")
-            if not _get_location_or_error(db, to_location_id):
-                raise ValueError("to_location_id no existe")
-
-            product, product_issue, suggestions, would_create = _resolve_product(
-                db,
-                sku=sku,
-                barcode=barcode,
-                name=name,
-                category_id=category_id,
-                fuzzy_threshold=fuzzy_threshold,
-            )
-            if product_issue:
-                review = _record_review(
-                    db,
-                    batch.id,
-                    idx,
-                    product_issue,
-                    payload,
-                    suggestions,
-                )
-                review_rows += 1
-                reviews.append(
-                    ImportReviewResponse(
-                        row_number=review.row_number,
-                        reason=review.reason,
-                        suggestions=review.suggestions,
-                    )
-                )
-                continue
-            if product is None and would_create:
-                if dry_run:
-                    ok_rows += 1
-                    continue
-                try:
-                    product = product_repo.create_product(
-                        db,
-                        sku=sku,
-                        name=name or sku,
-                        barcode=barcode,
-                        category_id=category_id,
-                    )
-                except IntegrityError:
-                    db.rollback()
-                    error = _record_error(db, batch.id, idx, "product_unique_conflict", "Producto duplicado", payload)
-                    error_rows += 1
-                    errors.append(
-                        ImportErrorResponse(
-                            row_number=error.row_number,
-                            error_code=error.error_code,
-                            message=error.message,
-                        )
-                    )
-                    continue
-
-            if not dry_run and product is not None:
-                inventory_service.transfer_stock_by_location_id(
-                    db,
-                    product_id=product.id,
-                    quantity=quantity,
-                    user_id=user.id,
-                    from_location_id=from_location_id,
-                    to_location_id=to_location_id,
-                    source=Source.MANUAL,
-                )
-
-            ok_rows += 1
-        except inventory_service.InventoryError as exc:
-            error = _record_error(db, batch.id, idx, "inventory_error", str(exc), payload)
-            error_rows += 1
-            errors.append(
-                ImportErrorResponse(
-                    row_number=error.row_number,
-                    error_code=error.error_code,
-                    message=error.message,
-                )
-            )
-        except ValueError as exc:
-            error = _record_error(db, batch.id, idx, "validation_error", str(exc), payload)
-            error_rows += 1
-            errors.append(
-                ImportErrorResponse(
-                    row_number=error.row_number,
-                    error_code=error.error_code,
-                    message=error.message,
-                )
-            )
-
-    batch.total_rows = total_rows
-    batch.ok_rows = ok_rows
-    batch.error_rows = error_rows
-    batch.review_rows = review_rows
-    db.add(batch)
-    db.commit()
 
-    if ok_rows and not dry_run:
-        cache_invalidate_prefix("movements:list")
-        cache_invalidate_prefix("stocks:list")
-        cache_invalidate_prefix("stocks:detail")
-        cache_invalidate_prefix("products:list")
-        cache_invalidate_prefix("reports:top-consumed")
-        cache_invalidate_prefix("reports:turnover")
+@router.get(
+    "/batches/{batch_id}",
+    response_model=ImportBatchStatusResponse,
+    responses={
+        404: {
+            "description": "Batch no encontrado",
+            "content": {"application/json": {"example": {"detail": "Batch no encontrado"}}},
+        }
+    },
+)
+def get_import_batch(
+    batch_id: int,
+    db: Session = Depends(get_db),
+    user: User = Depends(require_roles(UserRole.MANAGER.value, UserRole.ADMIN.value)),
+):
+    batch = db.get(ImportBatch, batch_id)
+    if not batch:
+        raise HTTPException(status_code=404, detail="Batch no encontrado")
+    return _batch_status(batch)
 
-    if not dry_run and (error_rows > 0 or review_rows > 0):
-        alert_repo.create_alert(
-            db,
-            stock_id=None,
-            quantity=error_rows + review_rows,
-            min_quantity=0,
-            alert_type=AlertType.IMPORT_ISSUES,
-            status=AlertStatus.PENDING,
-        )
-    if not dry_run:
-        fcm_service.send_import_completed_push(
-            db,
-            total_rows=total_rows,
-            error_rows=error_rows,
-            review_rows=review_rows,
-        )
 
-    return ImportSummaryResponse(
-        batch_id=batch.id,
-        dry_run=dry_run,
-        total_rows=total_rows,
-        ok_rows=ok_rows,
-        error_rows=error_rows,
-        review_rows=review_rows,
-        errors=errors,
-        reviews=reviews,
-    )
+@router.get(
+    "/batches/{batch_id}/errors",
+    response_model=ImportErrorListResponse,
+)
+def list_import_errors(
+    batch_id: int,
+    db: Session = Depends(get_db),
+    user: User = Depends(require_roles(UserRole.MANAGER.value, UserRole.ADMIN.value)),
+    limit: int = Query(50, ge=1, le=100),
+    offset: int = Query(0, ge=0),
+):
+    stmt = select(ImportError).where(ImportError.batch_id == batch_id)
+    total = db.execute(select(func.count()).select_from(stmt.subquery())).scalar() or 0
+    rows = db.scalars(stmt.order_by(ImportError.id.asc()).offset(offset).limit(limit)).all()
+    items = [
+        ImportErrorItem(
+            id=error.id,
+            batch_id=error.batch_id,
+            row_number=error.row_number,
+            error_code=error.error_code,
+            message=error.message,
+            payload=error.payload,
+        )
+        for error in rows
+    ]
+    return ImportErrorListResponse(items=items, total=total, limit=limit, offset=offset)
 
 
 @router.get(
@@ -799,13 +357,10 @@ def approve_import_review(
         raise HTTPException(status_code=404, detail="Batch no encontrado")
 
     try:
-        row = _normalize_row(review.payload)
-        if batch.kind == "EVENTS":
-            _apply_event_row(db, row=row, user_id=user.id)
-        elif batch.kind == "TRANSFERS":
-            _apply_transfer_row(db, row=row, user_id=user.id)
-        else:
+        if batch.kind not in import_service.REQUIRED_COLUMNS:
             raise HTTPException(status_code=400, detail="Tipo de batch no soportado")
+        row = import_service.normalize_row(review.payload)
+        import_service.apply_review_row(db, batch.kind, row, user_id=user.id)
     except inventory_service.InventoryError as exc:
         raise HTTPException(status_code=400, detail=str(exc))
     except ValueError as exc:
@@ -824,12 +379,7 @@ def approve_import_review(
         details=f"batch_id={batch.id} review_id={review.id} action=approve",
     )
 
-    cache_invalidate_prefix("movements:list")
-    cache_invalidate_prefix("stocks:list")
-    cache_invalidate_prefix("stocks:detail")
-    cache_invalidate_prefix("products:list")
-    cache_invalidate_prefix("reports:top-consumed")
-    cache_invalidate_prefix("reports:turnover")
+    cache_invalidate_prefix(*import_service.CACHE_PREFIXES)
 
     return {"ok": True}
 
@@ -850,7 +400,7 @@ def reject_import_review(
     if not batch:
         raise HTTPException(status_code=404, detail="Batch no encontrado")
 
-    _record_error(
+    import_service.record_error(
         db,
         batch.id,
         review.row_number,
@@ -3,7 +3,7 @@ from pydantic import BaseModel
 from sqlalchemy.orm import Session
 
 from app.api.deps import get_current_user
-from app.cache.redis_cache import cache_get, cache_set, make_key
+from app.cache.redis_cache import cache_get, cache_set, scoped_key
 from app.db.deps import get_db
 from app.repositories import location_repo
 from app.schemas.location import LocationResponse
@@ -26,9 +26,9 @@ def list_locations(
     limit: int = Query(50, ge=1, le=200),
     offset: int = Query(0, ge=0),
 ):
-    cache_key = make_key(
+    cache_key = scoped_key(
         "locations:list",
-        user.id if user else None,
+        user,
         {"limit": limit, "offset": offset},
     )
     cached = cache_get(cache_key)
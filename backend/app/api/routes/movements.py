@@ -1,11 +1,15 @@
 from datetime import datetime
 
 from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel, ConfigDict, Field
 from sqlalchemy.orm import Session
 
 from app.api.deps import get_current_user, require_roles
-from app.cache.redis_cache import cache_get, cache_set, cache_invalidate_prefix, make_key
+from app.api.export import EXPORT_FORMAT_DESCRIPTION, EXPORT_RESPONSES, ExportFormat, stream_export
+from app.api.pagination import CURSOR_DESCRIPTION, WITH_TOTAL_DESCRIPTION, decode_cursor, page_fields
+from app.db.pagination import TotalMode
+from app.cache.redis_cache import cached_response, cache_invalidate_prefix, scoped_key
 from app.db.deps import get_db
 from app.models.enums import Source, MovementType, UserRole
 from app.schemas.movement import MovementResponse
@@ -17,9 +21,12 @@ from app.models.user import User
 
 class MovementListResponse(BaseModel):
     items: list[MovementResponse]
-    total: int
+    total: int | None
+    total_estimated: bool = False
+    has_more: bool = False
     limit: int
     offset: int
+    next_cursor: str | None = None
 
 
 class MovementOperation(BaseModel):
@@ -95,7 +102,7 @@ router = APIRouter(prefix="/movements", tags=["movements"])
     response_model=MovementListResponse,
     responses={
         400: {
-            "description": "Rango de fechas u ordenacion invalida",
+            "description": "Rango de fechas, ordenacion o cursor invalido",
             "content": {"application/json": {"example": {"detail": "order_by debe ser 'created_at'"}}},
         }
     },
@@ -113,17 +120,20 @@ def list_movements(
     order_dir: str | None = Query("desc"),
     limit: int = Query(50, ge=1, le=100),
     offset: int = Query(0, ge=0),
+    cursor: str | None = Query(None, description=CURSOR_DESCRIPTION),
+    with_total: TotalMode = Query(TotalMode.EXACT, description=WITH_TOTAL_DESCRIPTION),
 ):
     if date_from and date_to and date_from > date_to:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="date_from no puede ser mayor que date_to")
+    after = decode_cursor(cursor, offset, order_dir)
     if order_by != "created_at":
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="order_by debe ser 'created_at'")
     if order_dir not in {"asc", "desc"}:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="order_dir debe ser 'asc' o 'desc'")
 
-    cache_key = make_key(
+    cache_key = scoped_key(
         "movements:list",
-        user.id,
+        user,
         {
             "product_id": product_id,
             "movement_type": movement_type,
@@ -135,14 +145,69 @@ def list_movements(
             "order_dir": order_dir,
             "limit": limit,
             "offset": offset,
+            "cursor": cursor,
+            "with_total": with_total.value,
         },
     )
-    cached = cache_get(cache_key)
-    if cached is not None:
-        return cached
 
-    items, total = movement_repo.list_movements(
-        db,
+    def _load() -> MovementListResponse:
+        items, total = movement_repo.list_movements(
+            db,
+            product_id=product_id,
+            movement_type=movement_type,
+            movement_source=movement_source,
+            user_id=user_id,
+            date_from=date_from,
+            date_to=date_to,
+            order_dir=order_dir,
+            limit=limit,
+            offset=offset,
+            after=after,
+            with_total=with_total,
+        )
+        return MovementListResponse(
+            items=items,
+            **page_fields(
+                items,
+                limit=limit,
+                offset=offset,
+                total=total,
+                with_total=with_total,
+                after=after,
+                order_dir=order_dir,
+            ),
+        )
+
+    return cached_response(cache_key, _load, ttl_seconds=300)
+
+
+@router.get(
+    "/export",
+    response_class=StreamingResponse,
+    responses={
+        **EXPORT_RESPONSES,
+        400: {
+            "description": "Rango de fechas u ordenacion invalida",
+            "content": {"application/json": {"example": {"detail": "order_dir debe ser 'asc' o 'desc'"}}},
+        },
+    },
+)
+def export_movements(
+    user: User = Depends(get_current_user),
+    product_id: int | None = Query(None),
+    movement_type: MovementType | None = Query(None),
+    movement_source: Source | None = Query(None),
+    user_id: int | None = Query(None),
+    date_from: datetime | None = Query(None),
+    date_to: datetime | None = Query(None),
+    order_dir: str | None = Query("desc"),
+    format: ExportFormat = Query(ExportFormat.CSV, description=EXPORT_FORMAT_DESCRIPTION),
+):
+    if date_from and date_to and date_from > date_to:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="date_from no puede ser mayor que date_to")
+    if order_dir not in {"asc", "desc"}:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="order_dir debe ser 'asc' o 'desc'")
+    stmt = movement_repo.select_for_export(
         product_id=product_id,
         movement_type=movement_type,
         movement_source=movement_source,
@@ -150,12 +215,8 @@ def list_movements(
         date_from=date_from,
         date_to=date_to,
         order_dir=order_dir,
-        limit=limit,
-        offset=offset,
     )
-    payload = MovementListResponse(items=items, total=total, limit=limit, offset=offset)
-    cache_set(cache_key, payload, ttl_seconds=300)
-    return payload
+    return stream_export(stmt, filename="movements", fmt=format)
 
 
 @router.post(
@@ -183,11 +244,15 @@ def movement_in(
             location=payload.location,
             source=payload.movement_source,
         )
-        cache_invalidate_prefix("movements:list")
-        cache_invalidate_prefix("stocks:list")
-        cache_invalidate_prefix("stocks:detail")
-        cache_invalidate_prefix("reports:top-consumed")
-        cache_invalidate_prefix("reports:turnover")
+        cache_invalidate_prefix(
+            "movements:list",
+            "stocks:list",
+            "stocks:detail",
+            "reports:top-consumed",
+            "reports:turnover",
+            "reports:stock-on-date",
+            "reports:stock-trend",
+        )
         return MovementWithStockResponse(stock=stock, movement=movement)
     except inventory_service.InventoryError as e:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
@@ -218,11 +283,15 @@ def movement_out(
             location=payload.location,
             source=payload.movement_source,
         )
-        cache_invalidate_prefix("movements:list")
-        cache_invalidate_prefix("stocks:list")
-        cache_invalidate_prefix("stocks:detail")
-        cache_invalidate_prefix("reports:top-consumed")
-        cache_invalidate_prefix("reports:turnover")
+        cache_invalidate_prefix(
+            "movements:list",
+            "stocks:list",
+            "stocks:detail",
+            "reports:top-consumed",
+            "reports:turnover",
+            "reports:stock-on-date",
+            "reports:stock-trend",
+        )
         return MovementWithStockResponse(stock=stock, movement=movement)
     except inventory_service.InventoryError as e:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
@@ -253,11 +322,15 @@ def movement_adjust(
             location=payload.location,
             source=payload.movement_source,
         )
-        cache_invalidate_prefix("movements:list")
-        cache_invalidate_prefix("stocks:list")
-        cache_invalidate_prefix("stocks:detail")
-        cache_invalidate_prefix("reports:top-consumed")
-        cache_invalidate_prefix("reports:turnover")
+        cache_invalidate_prefix(
+            "movements:list",
+            "stocks:list",
+            "stocks:detail",
+            "reports:top-consumed",
+            "reports:turnover",
+            "reports:stock-on-date",
+            "reports:stock-trend",
+        )
         return MovementWithStockResponse(stock=stock, movement=movement)
     except inventory_service.InventoryError as e:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
@@ -291,11 +364,15 @@ def movement_transfer(
             to_location=payload.to_location,
             source=payload.movement_source,
         )
-        cache_invalidate_prefix("movements:list")
-        cache_invalidate_prefix("stocks:list")
-        cache_invalidate_prefix("stocks:detail")
-        cache_invalidate_prefix("reports:top-consumed")
-        cache_invalidate_prefix("reports:turnover")
+        cache_invalidate_prefix(
+            "movements:list",
+            "stocks:list",
+            "stocks:detail",
+            "reports:top-consumed",
+            "reports:turnover",
+            "reports:stock-on-date",
+            "reports:stock-trend",
+        )
         return MovementTransferResponse(
             from_stock=from_stock,
             to_stock=to_stock,
@@ -6,8 +6,10 @@ from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 
 from app.api.deps import get_current_user, require_roles
-from app.cache.redis_cache import cache_get, cache_set, cache_invalidate_prefix, make_key
+from app.api.pagination import WITH_TOTAL_DESCRIPTION, page_fields
+from app.cache.redis_cache import cache_get, cache_set, cached_response, cache_invalidate_prefix, scoped_key
 from app.db.deps import get_db
+from app.db.pagination import TotalMode
 from app.models.enums import UserRole, Entity, ActionType
 from app.repositories import product_repo, audit_log_repo
 from app.schemas.product import ProductCreate, ProductUpdate, ProductResponse
@@ -18,7 +20,9 @@ from app.services import label_service
 
 class ProductListResponse(BaseModel):
     items: list[ProductResponse]
-    total: int
+    total: int | None
+    total_estimated: bool = False
+    has_more: bool = False
     limit: int
     offset: int
 
@@ -50,15 +54,16 @@ def list_products(
     order_dir: str | None = Query("asc"),
     limit: int = Query(50, ge=1, le=100),
     offset: int = Query(0, ge=0),
+    with_total: TotalMode = Query(TotalMode.EXACT, description=WITH_TOTAL_DESCRIPTION),
 ):
     allowed_order = {"id", "created_at"}
     if order_by not in allowed_order:
         raise HTTPException(status_code=400, detail=f"order_by debe ser uno de {sorted(allowed_order)}")
     if order_dir not in {"asc", "desc"}:
         raise HTTPException(status_code=400, detail="order_dir debe ser 'asc' o 'desc'")
-    cache_key = make_key(
+    cache_key = scoped_key(
         "products:list",
-        user.id if user else None,
+        user,
         {
             "sku": sku,
             "name": name,
@@ -69,27 +74,30 @@ def list_products(
             "order_dir": order_dir,
             "limit": limit,
             "offset": offset,
+            "with_total": with_total.value,
         },
     )
-    cached = cache_get(cache_key)
-    if cached is not None:
-        return cached
 
-    items, total = product_repo.list_products(
-        db,
-        sku=sku,
-        name=name,
-        barcode=barcode,
-        category_id=category_id,
-        active=active,
-        order_by=order_by,
-        order_dir=order_dir,
-        limit=limit,
-        offset=offset,
-    )
-    payload = ProductListResponse(items=items, total=total, limit=limit, offset=offset)
-    cache_set(cache_key, payload, ttl_seconds=300)
-    return payload
+    def _load() -> ProductListResponse:
+        items, total = product_repo.list_products(
+            db,
+            sku=sku,
+            name=name,
+            barcode=barcode,
+            category_id=category_id,
+            active=active,
+            order_by=order_by,
+            order_dir=order_dir,
+            limit=limit,
+            offset=offset,
+            with_total=with_total,
+        )
+        return ProductListResponse(
+            items=items,
+            **page_fields(items, limit=limit, offset=offset, total=total, with_total=with_total, cursor=False),
+        )
+
+    return cached_response(cache_key, _load, ttl_seconds=300)
 
 
 @router.get(
@@ -104,15 +112,16 @@ def list_products(
     },
 )
 def get_product(product_id: int, db: Session = Depends(get_db), user=Depends(get_current_user)):
-    cache_key = make_key("products:detail", user.id if user else None, {"id": product_id})
+    cache_key = scoped_key("products:detail", user, {"id": product_id})
     cached = cache_get(cache_key)
     if cached is not None:
         return cached
     product = product_repo.get(db, product_id)
     if not product:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Producto no encontrado")
-    cache_set(cache_key, product, ttl_seconds=300)
-    return product
+    payload = ProductResponse.model_validate(product)
+    cache_set(cache_key, payload, ttl_seconds=300)
+    return payload
 
 
 @router.post(
@@ -163,8 +172,7 @@ def create_product(
         user_id=user.id,
         details=f"product_id={product.id} sku={product.sku}",
     )
-    cache_invalidate_prefix("products:list")
-    cache_invalidate_prefix("products:detail")
+    cache_invalidate_prefix("products:list", "products:detail")
     return product
 
 
@@ -220,8 +228,7 @@ def update_product(
                 )
             except Exception:
                 logger.exception("No se pudo regenerar la etiqueta para producto %s", product.id)
-    cache_invalidate_prefix("products:list")
-    cache_invalidate_prefix("products:detail")
+    cache_invalidate_prefix("products:list", "products:detail")
     audit_log_repo.create_log(
         db,
         entity=Entity.PRODUCT,
@@ -281,8 +288,7 @@ def delete_product(
         label_path.unlink()
     except OSError:
         pass
-    cache_invalidate_prefix("products:list")
-    cache_invalidate_prefix("products:detail")
+    cache_invalidate_prefix("products:list", "products:detail")
     audit_log_repo.create_log(
         db,
         entity=Entity.PRODUCT,
@@ -1,14 +1,18 @@
-from datetime import datetime, date, time
+from datetime import datetime, date, time, timedelta
 from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 from app.api.deps import require_roles
-from app.cache.redis_cache import cache_get, cache_set, make_key
+from app.api.export import EXPORT_FORMAT_DESCRIPTION, EXPORT_RESPONSES, ExportFormat, stream_export
+from app.cache.redis_cache import cached_response, scoped_key
 from app.db.deps import get_db
 from app.models.enums import UserRole
 from app.repositories import report_repo
 from app.schemas.report import (
     TopConsumedResponse, TopConsumedItem,
     TurnoverResponse, TurnoverItem,
+    StockOnDateResponse, StockOnDateItem,
+    StockTrendResponse, StockTrendPoint,
 )
 
 router = APIRouter(prefix="/reports", tags=["reports"])
@@ -38,9 +42,9 @@ def top_consumed(
             detail="order_dir debe ser 'asc' o 'desc'",
         )
 
-    cache_key = make_key(
+    cache_key = scoped_key(
         "reports:top-consumed",
-        user.id if user else None,
+        user,
         {
             "date_from": date_from.isoformat() if date_from else None,
             "date_to": date_to.isoformat() if date_to else None,
@@ -50,29 +54,27 @@ def top_consumed(
             "offset": offset,
         },
     )
-    cached = cache_get(cache_key)
-    if cached is not None:
-        return cached
 
-    dt_from = datetime.combine(date_from, time.min) if date_from else None
-    dt_to = datetime.combine(date_to, time.max) if date_to else None
+    def _load() -> TopConsumedResponse:
+        dt_from = datetime.combine(date_from, time.min) if date_from else None
+        dt_to = datetime.combine(date_to, time.max) if date_to else None
 
-    rows, total = report_repo.list_top_consumed(
-        db,
-        date_from=dt_from,
-        date_to=dt_to,
-        location=location,
-        order_dir=order_dir,
-        limit=limit,
-        offset=offset,
-    )
-    items = [
-        TopConsumedItem(product_id=r.product_id, sku=r.sku, name=r.name, total_out=r.total_out)
-        for r in rows
-    ]
-    payload = TopConsumedResponse(items=items, total=total, limit=limit, offset=offset)
-    cache_set(cache_key, payload, ttl_seconds=300)
-    return payload
+        rows, total = report_repo.list_top_consumed(
+            db,
+            date_from=dt_from,
+            date_to=dt_to,
+            location=location,
+            order_dir=order_dir,
+            limit=limit,
+            offset=offset,
+        )
+        items = [
+            TopConsumedItem(product_id=r.product_id, sku=r.sku, name=r.name, total_out=r.total_out)
+            for r in rows
+        ]
+        return TopConsumedResponse(items=items, total=total, limit=limit, offset=offset)
+
+    return cached_response(cache_key, _load, ttl_seconds=300)
 
 
 
@@ -103,9 +105,9 @@ def turnover_report(
             detail="order_dir debe ser 'asc' o 'desc'",
         )
 
-    cache_key = make_key(
+    cache_key = scoped_key(
         "reports:turnover",
-        user.id if user else None,
+        user,
         {
             "date_from": date_from.isoformat() if date_from else None,
             "date_to": date_to.isoformat() if date_to else None,
@@ -115,37 +117,208 @@ def turnover_report(
             "offset": offset,
         },
     )
-    cached = cache_get(cache_key)
-    if cached is not None:
-        return cached
 
+    def _load() -> TurnoverResponse:
+        dt_from = datetime.combine(date_from, time.min) if date_from else None
+        dt_to = datetime.combine(date_to, time.max) if date_to else None
+
+        rows, total, loc_code = report_repo.list_turnover(
+            db,
+            date_from=dt_from,
+            date_to=dt_to,
+            location=location,
+            order_dir=order_dir,
+            limit=limit,
+            offset=offset,
+        )
+
+        items = [
+            TurnoverItem(
+                product_id=r.product_id,
+                sku=r.sku,
+                name=r.name,
+                turnover=r.turnover,
+                outs=r.outs,
+                stock_initial=r.stock_initial,
+                stock_final=r.stock_final,
+                stock_average=r.stock_average,
+                location=loc_code,
+            )
+            for r in rows
+        ]
+        return TurnoverResponse(items=items, total=total, limit=limit, offset=offset)
+
+    return cached_response(cache_key, _load, ttl_seconds=300)
+
+
+def _export_range(date_from: date | None, date_to: date | None, order_dir: str | None):
+    if date_from and date_to and date_from > date_to:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="date_from no puede ser mayor que date_to",
+        )
+    if order_dir not in {"asc", "desc"}:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="order_dir debe ser 'asc' o 'desc'",
+        )
     dt_from = datetime.combine(date_from, time.min) if date_from else None
     dt_to = datetime.combine(date_to, time.max) if date_to else None
+    return dt_from, dt_to
 
-    rows, total, loc_code = report_repo.list_turnover(
-        db,
-        date_from=dt_from,
-        date_to=dt_to,
-        location=location,
-        order_dir=order_dir,
-        limit=limit,
-        offset=offset,
+
+@router.get(
+    "/top-consumed/export",
+    response_class=StreamingResponse,
+    responses={
+        **EXPORT_RESPONSES,
+        400: {
+            "description": "Rango de fechas u ordenacion invalida",
+            "content": {"application/json": {"example": {"detail": "date_from no puede ser mayor que date_to"}}},
+        },
+        404: {
+            "description": "Ubicacion no encontrada",
+            "content": {"application/json": {"example": {"detail": "Ubicacion no encontrada"}}},
+        },
+    },
+)
+def export_top_consumed(
+    db: Session = Depends(get_db),
+    user = Depends(require_roles(UserRole.MANAGER.value, UserRole.ADMIN.value)),
+    date_from: date | None = Query(None, description="YYYY-MM-DD"),
+    date_to: date | None = Query(None, description="YYYY-MM-DD"),
+    location: str | None = Query(None),
+    order_dir: str | None = Query("desc"),
+    format: ExportFormat = Query(ExportFormat.CSV, description=EXPORT_FORMAT_DESCRIPTION),
+):
+    dt_from, dt_to = _export_range(date_from, date_to, order_dir)
+    stmt = report_repo.select_top_consumed(
+        db, date_from=dt_from, date_to=dt_to, location=location, order_dir=order_dir
     )
+    if stmt is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Ubicacion no encontrada")
+    return stream_export(stmt, filename="top-consumed", fmt=format)
+
 
-    items = [
-        TurnoverItem(
-            product_id=r.product_id,
-            sku=r.sku,
-            name=r.name,
-            turnover=r.turnover,
-            outs=r.outs,
-            stock_initial=r.stock_initial,
-            stock_final=r.stock_final,
-            stock_average=r.stock_average,
-            location=loc_code,
+@router.get(
+    "/turnover/export",
+    response_class=StreamingResponse,
+    responses={
+        **EXPORT_RESPONSES,
+        400: {
+            "description": "Rango de fechas u ordenacion invalida",
+            "content": {"application/json": {"example": {"detail": "date_from no puede ser mayor que date_to"}}},
+        },
+        404: {
+            "description": "Ubicacion no encontrada",
+            "content": {"application/json": {"example": {"detail": "Ubicacion no encontrada"}}},
+        },
+    },
+)
+def export_turnover(
+    db: Session = Depends(get_db),
+    user = Depends(require_roles(UserRole.MANAGER.value, UserRole.ADMIN.value)),
+    date_from: date | None = Query(None, description="YYYY-MM-DD"),
+    date_to: date | None = Query(None, description="YYYY-MM-DD"),
+    location: str | None = Query(None),
+    order_dir: str | None = Query("desc"),
+    format: ExportFormat = Query(ExportFormat.CSV, description=EXPORT_FORMAT_DESCRIPTION),
+):
+    dt_from, dt_to = _export_range(date_from, date_to, order_dir)
+    stmt, _ = report_repo.select_turnover(
+        db, date_from=dt_from, date_to=dt_to, location=location, order_dir=order_dir
+    )
+    if stmt is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Ubicacion no encontrada")
+    return stream_export(stmt, filename="turnover", fmt=format)
+
+
+@router.get(
+    "/stock-on-date",
+    response_model=StockOnDateResponse,
+)
+def stock_on_date(
+    db: Session = Depends(get_db),
+    user = Depends(require_roles(UserRole.MANAGER.value, UserRole.ADMIN.value)),
+    day: date = Query(..., description="YYYY-MM-DD (stock al cierre del dia, UTC)"),
+    location: str | None = Query(None),
+    order_dir: str | None = Query("desc"),
+    limit: int = Query(10, ge=1, le=100),
+    offset: int = Query(0, ge=0),
+):
+    if order_dir not in {"asc", "desc"}:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="order_dir debe ser 'asc' o 'desc'",
+        )
+
+    cache_key = scoped_key(
+        "reports:stock-on-date",
+        user,
+        {"day": day.isoformat(), "location": location, "order_dir": order_dir, "limit": limit, "offset": offset},
+    )
+
+    def _load() -> StockOnDateResponse:
+        rows, total, loc_code = report_repo.list_stock_on_date(
+            db,
+            day=day,
+            location=location,
+            order_dir=order_dir,
+            limit=limit,
+            offset=offset,
+        )
+        items = [
+            StockOnDateItem(product_id=r.product_id, sku=r.sku, name=r.name, quantity=r.quantity)
+            for r in rows
+        ]
+        return StockOnDateResponse(items=items, total=total, limit=limit, offset=offset, day=day, location=loc_code)
+
+    return cached_response(cache_key, _load, ttl_seconds=300)
+
+
+@router.get(
+    "/stock-trend",
+    response_model=StockTrendResponse,
+)
+def stock_trend(
+    db: Session = Depends(get_db),
+    user = Depends(require_roles(UserRole.MANAGER.value, UserRole.ADMIN.value)),
+    date_from: date = Query(..., description="YYYY-MM-DD"),
+    date_to: date = Query(..., description="YYYY-MM-DD"),
+    product_id: int | None = Query(None),
+    location: str | None = Query(None),
+):
+    if date_from > date_to:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="date_from no puede ser mayor que date_to",
         )
-        for r in rows
-    ]
-    payload = TurnoverResponse(items=items, total=total, limit=limit, offset=offset)
-    cache_set(cache_key, payload, ttl_seconds=300)
-    return payload
+    if date_to - date_from > timedelta(days=366):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="el rango no puede superar 366 dias",
+        )
+
+    cache_key = scoped_key(
+        "reports:stock-trend",
+        user,
+        {
+            "date_from": date_from.isoformat(),
+            "date_to": date_to.isoformat(),
+            "product_id": product_id,
+            "location": location,
+        },
+    )
+
+    def _load() -> StockTrendResponse:
+        points, loc_code = report_repo.list_stock_trend(
+            db,
+            date_from=date_from,
+            date_to=date_to,
+            product_id=product_id,
+            location=location,
+        )
+        items = [StockTrendPoint(day=day, quantity=quantity) for day, quantity in points]
+        return StockTrendResponse(items=items, product_id=product_id, location=loc_code)
+
+    return cached_response(cache_key, _load, ttl_seconds=300)
@@ -1,10 +1,15 @@
 from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 
 from app.api.deps import get_current_user, require_roles
-from app.cache.redis_cache import cache_get, cache_set, cache_invalidate_prefix, make_key
+from app.api.export import EXPORT_FORMAT_DESCRIPTION, EXPORT_RESPONSES, ExportFormat, stream_export
+from app.api.pagination import WITH_TOTAL_DESCRIPTION, page_fields
+from app.cache.redis_cache import cache_get, cache_set, cached_response, cache_invalidate_prefix, scoped_key
 from app.db.deps import get_db
+from app.db.pagination import TotalMode
 from app.models.enums import UserRole, Entity, ActionType
 from app.repositories import stock_repo, product_repo, audit_log_repo
 from app.schemas.stock import StockResponse, StockUpdate, StockCreate
@@ -14,7 +19,9 @@ from app.models.user import User
 
 class StockListResponse(BaseModel):
     items: list[StockResponse]
-    total: int
+    total: int | None
+    total_estimated: bool = False
+    has_more: bool = False
     limit: int
     offset: int
 
@@ -42,14 +49,15 @@ def list_stocks(
     order_dir: str | None = Query("asc"),
     limit: int = Query(50, ge=1, le=100),
     offset: int = Query(0, ge=0),
+    with_total: TotalMode = Query(TotalMode.EXACT, description=WITH_TOTAL_DESCRIPTION),
 ):
     if order_by != "id":
         raise HTTPException(status_code=400, detail="order_by debe ser 'id'")
     if order_dir not in {"asc", "desc"}:
         raise HTTPException(status_code=400, detail="order_dir debe ser 'asc' o 'desc'")
-    cache_key = make_key(
+    cache_key = scoped_key(
         "stocks:list",
-        user.id if user else None,
+        user,
         {
             "product_id": product_id,
             "location": location,
@@ -57,23 +65,50 @@ def list_stocks(
             "order_dir": order_dir,
             "limit": limit,
             "offset": offset,
+            "with_total": with_total.value,
         },
     )
-    cached = cache_get(cache_key)
-    if cached is not None:
-        return cached
 
-    items, total = stock_repo.list_stocks(
-        db,
-        product_id=product_id,
-        location=location,
-        order_dir=order_dir,
-        limit=limit,
-        offset=offset,
-    )
-    payload = StockListResponse(items=items, total=total, limit=limit, offset=offset)
-    cache_set(cache_key, payload, ttl_seconds=300)
-    return payload
+    def _load() -> StockListResponse:
+        items, total = stock_repo.list_stocks(
+            db,
+            product_id=product_id,
+            location=location,
+            order_dir=order_dir,
+            limit=limit,
+            offset=offset,
+            with_total=with_total,
+        )
+        return StockListResponse(
+            items=items,
+            **page_fields(items, limit=limit, offset=offset, total=total, with_total=with_total, cursor=False),
+        )
+
+    return cached_response(cache_key, _load, ttl_seconds=300)
+
+
+@router.get(
+    "/export",
+    response_class=StreamingResponse,
+    dependencies=[Depends(get_current_user)],
+    responses={
+        **EXPORT_RESPONSES,
+        400: {
+            "description": "Ordenacion invalida",
+            "content": {"application/json": {"example": {"detail": "order_dir debe ser 'asc' o 'desc'"}}},
+        },
+    },
+)
+def export_stocks(
+    product_id: int | None = Query(None),
+    location: str | None = Query(None),
+    order_dir: str | None = Query("asc"),
+    format: ExportFormat = Query(ExportFormat.CSV, description=EXPORT_FORMAT_DESCRIPTION),
+):
+    if order_dir not in {"asc", "desc"}:
+        raise HTTPException(status_code=400, detail="order_dir debe ser 'asc' o 'desc'")
+    stmt = stock_repo.select_for_export(product_id=product_id, location=location, order_dir=order_dir)
+    return stream_export(stmt, filename="stocks", fmt=format)
 
 
 @router.get(
@@ -88,7 +123,7 @@ def list_stocks(
     },
 )
 def get_stock(stock_id: int, db: Session = Depends(get_db), user=Depends(get_current_user)):
-    cache_key = make_key("stocks:detail", user.id if user else None, {"id": stock_id})
+    cache_key = scoped_key("stocks:detail", user, {"id": stock_id})
     cached = cache_get(cache_key)
     if cached is not None:
         return cached
@@ -130,14 +165,18 @@ def create_stock(
     existing = stock_repo.get_by_product_and_location(db, payload.product_id, payload.location)
     if existing:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Ya existe stock para esta ubicación")
-    stock = stock_repo.create_stock(
-        db,
-        product_id=payload.product_id,
-        location=payload.location,
-        quantity=payload.quantity,
-    )
-    cache_invalidate_prefix("stocks:list")
-    cache_invalidate_prefix("stocks:detail")
+    try:
+        stock = stock_repo.create_stock(
+            db,
+            product_id=payload.product_id,
+            location=payload.location,
+            quantity=payload.quantity,
+        )
+    except IntegrityError:
+        # Otra peticion creo el mismo (producto, ubicacion) entre la comprobacion y el insert
+        db.rollback()
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Ya existe stock para esta ubicación")
+    cache_invalidate_prefix("stocks:list", "stocks:detail")
     audit_log_repo.create_log(
         db,
         entity=Entity.STOCK,
@@ -182,12 +221,15 @@ def update_stock(
             raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Ya existe stock para esta ubicación")
 
     if payload.location and new_location != stock.location:
-        stock = stock_repo.update_stock_location(db, stock, new_location)
+        try:
+            stock = stock_repo.update_stock_location(db, stock, new_location)
+        except IntegrityError:
+            db.rollback()
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Ya existe stock para esta ubicación")
     if payload.quantity is not None:
         stock = stock_repo.update_stock_quantity(db, stock, new_quantity)
         inventory_service.maybe_create_alerts_for_stock_update(db, stock=stock, old_quantity=old_quantity)
-    cache_invalidate_prefix("stocks:list")
-    cache_invalidate_prefix("stocks:detail")
+    cache_invalidate_prefix("stocks:list", "stocks:detail")
     audit_log_repo.create_log(
         db,
         entity=Entity.STOCK,
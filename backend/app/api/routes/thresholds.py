@@ -3,7 +3,7 @@ from pydantic import BaseModel
 from sqlalchemy.orm import Session
 
 from app.api.deps import require_roles
-from app.cache.redis_cache import cache_get, cache_set, cache_invalidate_prefix, make_key
+from app.cache.redis_cache import cache_get, cache_set, cache_invalidate_prefix, scoped_key
 from app.db.deps import get_db
 from app.models.enums import UserRole
 from app.repositories import threshold_repo, product_repo
@@ -35,9 +35,9 @@ def list_thresholds(
     limit: int = Query(50, ge=1, le=100),
     offset: int = Query(0, ge=0),
 ):
-    cache_key = make_key(
+    cache_key = scoped_key(
         "thresholds:list",
-        user.id if user else None,
+        user,
         {"product_id": product_id, "location": location, "limit": limit, "offset": offset},
     )
     cached = cache_get(cache_key)
@@ -63,15 +63,16 @@ def get_threshold(
     db: Session = Depends(get_db),
     user = Depends(require_roles(UserRole.MANAGER.value, UserRole.ADMIN.value)),
 ):
-    cache_key = make_key("thresholds:detail", user.id if user else None, {"id": threshold_id})
+    cache_key = scoped_key("thresholds:detail", user, {"id": threshold_id})
     cached = cache_get(cache_key)
     if cached is not None:
         return cached
     threshold = threshold_repo.get(db, threshold_id)
     if not threshold:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Threshold no encontrado")
-    cache_set(cache_key, threshold, ttl_seconds=300)
-    return threshold
+    payload = ThresholdResponse.model_validate(threshold)
+    cache_set(cache_key, payload, ttl_seconds=300)
+    return payload
 
 @router.post(
     "/",
@@ -95,8 +96,7 @@ def create_threshold(
     if dup:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Ya existe un threshold para esa ubicación")
     threshold = threshold_repo.create_threshold(db, product_id=payload.product_id, location=payload.location, min_quantity=payload.min_quantity)
-    cache_invalidate_prefix("thresholds:list")
-    cache_invalidate_prefix("thresholds:detail")
+    cache_invalidate_prefix("thresholds:list", "thresholds:detail")
     return threshold
 
 @router.patch(
@@ -127,8 +127,7 @@ def update_threshold(
         if dup and dup.id != threshold.id:
             raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Ya existe un threshold para esa ubicación")
     updated = threshold_repo.update_threshold(db, threshold, location=payload.location, min_quantity=payload.min_quantity)
-    cache_invalidate_prefix("thresholds:list")
-    cache_invalidate_prefix("thresholds:detail")
+    cache_invalidate_prefix("thresholds:list", "thresholds:detail")
     return updated
 
 @router.delete(
@@ -150,6 +149,5 @@ def delete_threshold(
     if not threshold:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Threshold no encontrado")
     threshold_repo.delete_threshold(db, threshold)
-    cache_invalidate_prefix("thresholds:list")
-    cache_invalidate_prefix("thresholds:detail")
+    cache_invalidate_prefix("thresholds:list", "thresholds:detail")
     return None
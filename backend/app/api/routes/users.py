@@ -5,6 +5,7 @@ from app.models.user import User
 from app.schemas.user import UserMeResponse
 from app.schemas.fcm import FcmTokenUpsert
 from app.repositories import fcm_token_repo
+from app.services import fcm_service
 from app.db.deps import get_db
 from sqlalchemy.orm import Session
 
@@ -52,4 +53,6 @@ def register_fcm_token(
         device_id=payload.device_id,
         platform=payload.platform,
     )
+    # Los push siguientes ya deben ver el token nuevo, sin esperar a FCM_TOKEN_CACHE_SECONDS
+    fcm_service.invalidate_token_cache()
     return {"ok": True}
@@ -1,13 +1,43 @@
-import json
+import math
 import os
-from typing import Any
+import random
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from enum import Enum
+from typing import Any, Callable
 
 import redis
-from fastapi.encoders import jsonable_encoder
+from fastapi import Response
+
+from app.cache import serializer
 
 
 _client: redis.Redis | None = None
 
+# Canal por el que se difunden las invalidaciones a la cache local (L1) de cada replica
+INVALIDATION_CHANNEL = "cache:invalidate"
+
+# Generacion actual de cada namespace; invalidar es un INCR y las claves viejas caducan por TTL
+GENERATION_PREFIX = "cache:gen:"
+
+# Lee la generacion del namespace y la clave versionada en un solo viaje a Redis
+_GET_SCRIPT = """
+local gen = redis.call('GET', KEYS[1]) or '0'
+return {gen, redis.call('GET', ARGV[1] .. '|g=' .. gen)}
+"""
+_get_script = None
+
+# Generacion vista en el ultimo fallo de cada hilo, para que cache_set no guarde datos viejos
+# bajo una generacion nueva si hubo una invalidacion mientras se calculaba la respuesta
+_observed = threading.local()
+
+# Single-flight: un calculo por clave dentro del proceso (future) y entre procesos (lock en Redis)
+LOCK_PREFIX = "cache:lock:"
+_inflight: dict[str, Future] = {}
+_inflight_lock = threading.Lock()
+
 
 def get_redis() -> redis.Redis | None:
     global _client
@@ -23,6 +53,173 @@ def get_redis() -> redis.Redis | None:
         return None
 
 
+class LocalCache:
+    """
+    Cache en proceso (L1) delante de Redis: LRU acotado por numero de entradas y por bytes,
+    con TTL por entrada. Guarda el JSON serializado de cada respuesta.
+    """
+
+    def __init__(self, max_entries: int, max_bytes: int, ttl_seconds: float) -> None:
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._entries: OrderedDict[str, tuple[float, int, Any]] = OrderedDict()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: str) -> Any | None:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, size, value = entry
+            if expires_at <= now:
+                self._remove(key)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: str, value: Any, size: int, ttl_seconds: float) -> None:
+        if size > self.max_bytes:
+            return
+        expires_at = time.monotonic() + min(ttl_seconds, self.ttl_seconds)
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (expires_at, size, value)
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def invalidate_prefix(self, prefix: str) -> None:
+        with self._lock:
+            for key in [key for key in self._entries if key.startswith(prefix)]:
+                self._remove(key)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> dict[str, float]:
+        with self._lock:
+            return {
+                "cache_l1_hits_total": self.hits,
+                "cache_l1_misses_total": self.misses,
+                "cache_l1_evictions_total": self.evictions,
+            }
+
+    def _remove(self, key: str) -> None:
+        _, size, _ = self._entries.pop(key)
+        self._bytes -= size
+
+
+_local: LocalCache | None = None
+_local_lock = threading.Lock()
+_listener_started = False
+
+
+def get_local_cache() -> LocalCache | None:
+    global _local
+    if os.getenv("CACHE_L1_ENABLED", "0").lower() not in ("1", "true", "yes"):
+        return None
+    if _local is None:
+        with _local_lock:
+            if _local is None:
+                _local = LocalCache(
+                    max_entries=int(os.getenv("CACHE_L1_MAX_ENTRIES", "1000")),
+                    max_bytes=int(os.getenv("CACHE_L1_MAX_BYTES", str(16 * 1024 * 1024))),
+                    ttl_seconds=float(os.getenv("CACHE_L1_TTL_SECONDS", "5")),
+                )
+    _start_invalidation_listener()
+    return _local
+
+
+def local_cache_stats() -> dict[str, float]:
+    if _local is None:
+        return {"cache_l1_hits_total": 0, "cache_l1_misses_total": 0, "cache_l1_evictions_total": 0}
+    return _local.stats()
+
+
+def _handle_invalidation(message: dict) -> None:
+    if _local is None:
+        return
+    data = message.get("data")
+    if isinstance(data, bytes):
+        data = data.decode("utf-8")
+    if data:
+        _local.invalidate_prefix(data)
+
+
+def _start_invalidation_listener() -> None:
+    # Un hilo por proceso escucha las invalidaciones del resto de replicas
+    global _listener_started
+    if _listener_started:
+        return
+    client = get_redis()
+    if client is None:
+        return
+    with _local_lock:
+        if _listener_started:
+            return
+        try:
+            pubsub = client.pubsub(ignore_subscribe_messages=True)
+            pubsub.subscribe(**{INVALIDATION_CHANNEL: _handle_invalidation})
+            pubsub.run_in_thread(sleep_time=1.0, daemon=True, exception_handler=_on_listener_error)
+            _listener_started = True
+        except Exception:
+            pass
+
+
+def _on_listener_error(exc: BaseException, pubsub, thread) -> None:
+    # Si se corta la suscripcion pudimos perder invalidaciones: se vacia L1 y se resuscribe en el siguiente uso
+    global _listener_started
+    thread.stop()
+    try:
+        pubsub.close()
+    except Exception:
+        pass
+    _listener_started = False
+    if _local is not None:
+        _local.clear()
+
+
+class CacheScope(str, Enum):
+    GLOBAL = "global"
+    USER = "user"
+
+
+# Alcance de la cache por namespace. Estos endpoints devuelven lo mismo a cualquier usuario que pase
+# el control de acceso de la ruta (que se hace antes de mirar la cache), asi que se comparten.
+# Un namespace sin entrada aqui se cachea por usuario.
+CACHE_SCOPES: dict[str, CacheScope] = {
+    "products:list": CacheScope.GLOBAL,
+    "products:detail": CacheScope.GLOBAL,
+    "categories:list": CacheScope.GLOBAL,
+    "categories:detail": CacheScope.GLOBAL,
+    "stocks:list": CacheScope.GLOBAL,
+    "stocks:detail": CacheScope.GLOBAL,
+    "thresholds:list": CacheScope.GLOBAL,
+    "thresholds:detail": CacheScope.GLOBAL,
+    "locations:list": CacheScope.GLOBAL,
+    "movements:list": CacheScope.GLOBAL,
+    "events:list": CacheScope.GLOBAL,
+    "reports:top-consumed": CacheScope.GLOBAL,
+    "reports:turnover": CacheScope.GLOBAL,
+    "reports:stock-on-date": CacheScope.GLOBAL,
+    "reports:stock-trend": CacheScope.GLOBAL,
+}
+
+
 def make_key(prefix: str, user_id: int | None, params: dict[str, Any]) -> str:
     parts = [prefix]
     if user_id is not None:
@@ -33,31 +230,238 @@ def make_key(prefix: str, user_id: int | None, params: dict[str, Any]) -> str:
     return "|".join(parts)
 
 
-def cache_get(key: str) -> Any | None:
+def scoped_key(prefix: str, user: Any, params: dict[str, Any]) -> str:
+    scope = CACHE_SCOPES.get(prefix, CacheScope.USER)
+    if scope is CacheScope.GLOBAL or user is None:
+        return make_key(prefix, None, params)
+    return make_key(prefix, user.id, params)
+
+
+def _namespace(key: str) -> str:
+    return key.split("|", 1)[0]
+
+
+def _generation_key(namespace: str) -> str:
+    return f"{GENERATION_PREFIX}{namespace}"
+
+
+def _versioned_key(key: str, generation: str) -> str:
+    return f"{key}|g={generation}"
+
+
+def _decode(value: Any) -> str:
+    return value.decode("utf-8") if isinstance(value, bytes) else str(value)
+
+
+def _read_versioned(client: redis.Redis, key: str) -> tuple[str, Any]:
+    global _get_script
+    if _get_script is None or _get_script.registered_client is not client:
+        _get_script = client.register_script(_GET_SCRIPT)
+    generation, raw = _get_script(keys=[_generation_key(_namespace(key))], args=[key])
+    return _decode(generation), raw
+
+
+def _stale_seconds() -> int:
+    # Tiempo extra que una entrada caducada sigue en Redis para servirla mientras otro la recalcula
+    return int(os.getenv("CACHE_STALE_SECONDS", "60"))
+
+
+def _read_entry(client: redis.Redis, key: str) -> tuple[str, tuple[bytes, float, float] | None]:
+    generation, raw = _read_versioned(client, key)
+    if not raw:
+        return generation, None
+    return generation, serializer.decode_entry(raw)
+
+
+def _write(
+    client: redis.Redis | None,
+    local: LocalCache | None,
+    key: str,
+    body: bytes,
+    ttl_seconds: int,
+    generation: str | None,
+    delta: float = 0.0,
+) -> None:
+    if client is not None:
+        if generation is None:
+            generation = _decode(client.get(_generation_key(_namespace(key))) or b"0")
+        payload = serializer.encode_entry(body, time.time() + ttl_seconds, delta)
+        client.setex(_versioned_key(key, generation), ttl_seconds + _stale_seconds(), payload)
+    if local is not None:
+        local.set(key, body, len(body), ttl_seconds)
+
+
+def _cached_body(key: str) -> bytes | None:
+    local = get_local_cache()
+    if local is not None:
+        body = local.get(key)
+        if body is not None:
+            return body
     client = get_redis()
     if client is None:
         return None
-    raw = client.get(key)
-    if not raw:
+    generation, entry = _read_entry(client, key)
+    if entry is None or entry[1] <= time.time():
+        _observed.last = (key, generation)
+        return None
+    if local is not None:
+        local.set(key, entry[0], len(entry[0]), local.ttl_seconds)
+    return entry[0]
+
+
+def cache_get(key: str) -> Any | None:
+    body = _cached_body(key)
+    if body is None:
         return None
     try:
-        return json.loads(raw)
-    except Exception:
+        return serializer.loads(body)
+    except ValueError:
         return None
 
 
 def cache_set(key: str, value: Any, ttl_seconds: int) -> None:
+    local = get_local_cache()
     client = get_redis()
-    if client is None:
+    if client is None and local is None:
         return
-    payload = json.dumps(jsonable_encoder(value))
-    client.setex(key, ttl_seconds, payload)
+    generation = None
+    observed = getattr(_observed, "last", None)
+    if observed is not None and observed[0] == key:
+        generation = observed[1]
+        _observed.last = None
+    _write(client, local, key, serializer.dumps(value), ttl_seconds, generation)
+
+
+def _should_refresh(entry: tuple[bytes, float, float], now: float) -> bool:
+    # XFetch: cuanto mas caro es recalcular (delta) y mas cerca esta la caducidad, mas probable refrescar antes
+    _, expires_at, delta = entry
+    beta = float(os.getenv("CACHE_XFETCH_BETA", "1.0"))
+    return now - delta * beta * math.log(1.0 - random.random()) >= expires_at
+
+
+def cache_get_or_compute(key: str, compute: Callable[[], Any], ttl_seconds: int, raw: bool = False) -> Any:
+    """
+    Como cache_get + cache_set, pero ante un fallo solo un llamante recalcula la clave;
+    el resto espera su resultado o recibe el valor caducado si lo hay.
+    Con raw=True devuelve el JSON serializado tal cual, sin parsearlo.
+    """
+    body = _get_or_compute_body(key, compute, ttl_seconds)
+    return body if raw else serializer.loads(body)
 
 
-def cache_invalidate_prefix(prefix: str) -> None:
+def cached_response(key: str, compute: Callable[[], Any], ttl_seconds: int) -> Response:
+    # Los aciertos se sirven con los bytes guardados, sin pasar otra vez por response_model
+    return Response(content=cache_get_or_compute(key, compute, ttl_seconds, raw=True), media_type="application/json")
+
+
+def _get_or_compute_body(key: str, compute: Callable[[], Any], ttl_seconds: int) -> bytes:
+    local = get_local_cache()
+    if local is not None:
+        body = local.get(key)
+        if body is not None:
+            return body
+    client = get_redis()
+    generation, entry = None, None
+    if client is not None:
+        generation, entry = _read_entry(client, key)
+    if entry is not None and not _should_refresh(entry, time.time()):
+        if local is not None:
+            local.set(key, entry[0], len(entry[0]), local.ttl_seconds)
+        return entry[0]
+
+    with _inflight_lock:
+        future = _inflight.get(key)
+        leader = future is None
+        if leader:
+            future = Future()
+            _inflight[key] = future
+    if not leader:
+        if entry is not None:
+            return entry[0]
+        try:
+            return future.result(timeout=float(os.getenv("CACHE_WAIT_SECONDS", "5")))
+        except Exception:
+            return serializer.dumps(compute())
+
+    try:
+        body = _compute_once(client, local, key, compute, ttl_seconds, generation, entry)
+        future.set_result(body)
+        return body
+    except BaseException as exc:
+        future.set_exception(exc)
+        raise
+    finally:
+        with _inflight_lock:
+            _inflight.pop(key, None)
+
+
+def _compute_once(
+    client: redis.Redis | None,
+    local: LocalCache | None,
+    key: str,
+    compute: Callable[[], Any],
+    ttl_seconds: int,
+    generation: str | None,
+    entry: tuple[bytes, float, float] | None,
+) -> bytes:
+    lock = None
+    if client is not None:
+        try:
+            lock = client.lock(
+                f"{LOCK_PREFIX}{key}",
+                timeout=int(os.getenv("CACHE_LOCK_SECONDS", "30")),
+                blocking=False,
+            )
+            if not lock.acquire():
+                lock = None
+                # Otro proceso esta recalculando: valor caducado si lo hay, si no esperar a que lo publique
+                if entry is not None:
+                    return entry[0]
+                body = _wait_for_fill(key)
+                if body is not None:
+                    return body
+        except redis.RedisError:
+            lock = None
+    try:
+        started = time.perf_counter()
+        body = serializer.dumps(compute())
+        _write(client, local, key, body, ttl_seconds, generation, time.perf_counter() - started)
+        return body
+    finally:
+        if lock is not None:
+            try:
+                lock.release()
+            except redis.RedisError:
+                pass
+
+
+def _wait_for_fill(key: str) -> bytes | None:
+    deadline = time.monotonic() + float(os.getenv("CACHE_WAIT_SECONDS", "5"))
+    while time.monotonic() < deadline:
+        time.sleep(0.05)
+        body = _cached_body(key)
+        if body is not None:
+            return body
+    return None
+
+
+def cache_invalidate_prefix(*prefixes: str) -> None:
+    """
+    Invalida uno o varios namespaces (el primer segmento de make_key, p.ej. "products:list").
+    Coste O(1) por namespace: INCR de su generacion, sin recorrer claves.
+    """
+    local = get_local_cache()
+    if local is not None:
+        for prefix in prefixes:
+            local.invalidate_prefix(prefix)
     client = get_redis()
     if client is None:
         return
-    pattern = f"{prefix}*"
-    for key in client.scan_iter(match=pattern, count=200):
-        client.delete(key)
+    try:
+        pipe = client.pipeline(transaction=False)
+        for prefix in prefixes:
+            pipe.incr(_generation_key(prefix))
+            pipe.publish(INVALIDATION_CHANNEL, prefix)
+        pipe.execute()
+    except Exception:
+        pass
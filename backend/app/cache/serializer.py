@@ -0,0 +1,45 @@
+import os
+import struct
+import zlib
+from typing import Any
+
+import pydantic_core
+
+# Cabecera de cada entrada: version del formato, flags, caducidad logica y coste de recalculo.
+# Una entrada con otra version se trata como fallo, asi el formato puede cambiar sin limpiar Redis.
+FORMAT_VERSION = 1
+FLAG_ZLIB = 0x01
+_HEADER = struct.Struct("!BBdd")
+
+
+def dumps(value: Any) -> bytes:
+    # Serializa modelos Pydantic, dicts, enums y fechas directamente a JSON (nucleo en Rust)
+    return pydantic_core.to_json(value, by_alias=True)
+
+
+def loads(body: bytes) -> Any:
+    return pydantic_core.from_json(body)
+
+
+def encode_entry(body: bytes, expires_at: float, delta: float) -> bytes:
+    flags = 0
+    if len(body) >= int(os.getenv("CACHE_COMPRESS_MIN_BYTES", "4096")):
+        compressed = zlib.compress(body, int(os.getenv("CACHE_COMPRESS_LEVEL", "1")))
+        if len(compressed) < len(body):
+            body, flags = compressed, FLAG_ZLIB
+    return _HEADER.pack(FORMAT_VERSION, flags, expires_at, delta) + body
+
+
+def decode_entry(data: bytes) -> tuple[bytes, float, float] | None:
+    if len(data) < _HEADER.size:
+        return None
+    version, flags, expires_at, delta = _HEADER.unpack_from(data)
+    if version != FORMAT_VERSION:
+        return None
+    body = data[_HEADER.size:]
+    if flags & FLAG_ZLIB:
+        try:
+            body = zlib.decompress(body)
+        except zlib.error:
+            return None
+    return body, expires_at, delta
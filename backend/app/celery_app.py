@@ -16,6 +16,11 @@ broker_url = _get_env(
 result_backend = _get_env("CELERY_RESULT_BACKEND", broker_url)
 
 celery_app = Celery("app", broker=broker_url, backend=result_backend)
+celery_app.conf.update(
+    # Micro-batching de eventos: tamano maximo de lote y espera maxima de un evento antes de drenarse
+    event_batch_size=int(_get_env("EVENT_BATCH_SIZE", "200")),
+    event_batch_linger_seconds=float(_get_env("EVENT_BATCH_LINGER_SECONDS", "2")),
+)
 celery_app.conf.update(
     timezone=_get_env("CELERY_TIMEZONE", "UTC"),
     task_serializer="json",
@@ -28,10 +33,36 @@ celery_app.conf.update(
             "task": "app.tasks.scan_low_stock",
             "schedule": timedelta(minutes=int(_get_env("LOW_STOCK_SCAN_MINUTES", "5"))),
         },
+        "reconcile-low-stock": {
+            "task": "app.tasks.scan_low_stock",
+            "schedule": timedelta(hours=int(_get_env("LOW_STOCK_RECONCILE_HOURS", "24"))),
+            "kwargs": {"mode": "full"},
+        },
+        "process-pending-events": {
+            "task": "app.tasks.process_events_batch",
+            # El drenaje periodico es la espera maxima de un evento en la cola
+            "schedule": timedelta(seconds=celery_app.conf.event_batch_linger_seconds),
+        },
+        "dispatch-notifications": {
+            "task": "app.tasks.dispatch_notifications",
+            "schedule": timedelta(seconds=float(_get_env("NOTIFICATION_DISPATCH_SECONDS", "2"))),
+        },
         "requeue-pending-events": {
             "task": "app.tasks.requeue_pending_events",
             "schedule": timedelta(minutes=int(_get_env("PENDING_EVENTS_REQUEUE_MINUTES", "2"))),
         },
+        "rollup-movements": {
+            "task": "app.tasks.rollup_movements",
+            "schedule": timedelta(minutes=int(_get_env("MOVEMENT_ROLLUP_MINUTES", "30"))),
+        },
+        "snapshot-stocks": {
+            "task": "app.tasks.snapshot_stocks",
+            "schedule": timedelta(minutes=int(_get_env("STOCK_SNAPSHOT_MINUTES", "60"))),
+        },
+        "resume-import-batches": {
+            "task": "app.tasks.resume_import_batches",
+            "schedule": timedelta(minutes=int(_get_env("IMPORT_RESUME_MINUTES", "5"))),
+        },
     },
 )
 
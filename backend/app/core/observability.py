@@ -4,7 +4,7 @@ import threading
 import time
 import uuid
 from collections import defaultdict
-from typing import DefaultDict
+from typing import Callable, DefaultDict
 
 from fastapi import Request
 from jose import jwt
@@ -29,6 +29,11 @@ class MetricsRegistry:
         self.requests_by_route_method_status: DefaultDict[tuple[str, str, int], int] = defaultdict(int)
         self.duration_sum_by_route_method: DefaultDict[tuple[str, str], float] = defaultdict(float)
         self.duration_count_by_route_method: DefaultDict[tuple[str, str], int] = defaultdict(int)
+        # Contadores externos (p.ej. cache L1) que se leen al renderizar
+        self._counter_sources: list[Callable[[], dict[str, float]]] = []
+
+    def register_counters(self, source: Callable[[], dict[str, float]]) -> None:
+        self._counter_sources.append(source)
 
     def observe(
         self,
@@ -90,6 +95,15 @@ class MetricsRegistry:
                     f'http_request_duration_ms_by_route_method_count{{path="{_escape_label(path)}",method="{method}"}} {count}'
                 )
 
+        for source in self._counter_sources:
+            try:
+                counters = source()
+            except Exception:
+                continue
+            for name, value in sorted(counters.items()):
+                lines.append(f"# TYPE {name} counter")
+                lines.append(f"{name} {value}")
+
         return "\n".join(lines) + "\n"
 
 
@@ -0,0 +1,68 @@
+import enum
+import os
+from datetime import datetime
+
+from sqlalchemy import func, select, tuple_
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.orm import Session
+from sqlalchemy.sql.expression import ClauseElement, Executable
+
+
+class TotalMode(str, enum.Enum):
+    EXACT = "exact"
+    ESTIMATED = "estimated"
+    NONE = "none"
+
+
+class _Explain(Executable, ClauseElement):
+    inherit_cache = False
+
+    def __init__(self, statement) -> None:
+        self.statement = statement
+
+
+@compiles(_Explain, "postgresql")
+def _compile_explain(element, compiler, **kw):
+    return "EXPLAIN (FORMAT JSON) " + compiler.process(element.statement, **kw)
+
+
+def count_total(db: Session, stmt, mode: TotalMode = TotalMode.EXACT) -> int | None:
+    """
+    Total de filas de stmt segun el modo: exacto (COUNT), estimado o ninguno.
+    El estimado sale del plan de PostgreSQL (pg_class.reltuples + selectividad de los filtros);
+    si no hay plan disponible se cuenta con tope LIST_COUNT_CAP y se devuelve el tope.
+    """
+    if mode == TotalMode.NONE:
+        return None
+    if mode == TotalMode.EXACT:
+        return db.scalar(select(func.count()).select_from(stmt.order_by(None).subquery())) or 0
+    if db.get_bind().dialect.name == "postgresql":
+        try:
+            # SAVEPOINT: un EXPLAIN fallido no debe abortar la transaccion de la peticion
+            with db.begin_nested():
+                plan = db.execute(_Explain(stmt)).scalar()
+            return int(plan[0]["Plan"]["Plan Rows"])
+        except (SQLAlchemyError, LookupError, TypeError, ValueError):
+            pass
+    cap = int(os.getenv("LIST_COUNT_CAP", "1000"))
+    return db.scalar(select(func.count()).select_from(stmt.order_by(None).limit(cap).subquery())) or 0
+
+
+def order_by_created(stmt, model, order_dir: str | None):
+    # created_at + id como desempate: orden total y estable, el mismo que usa el cursor
+    if order_dir == "asc":
+        return stmt.order_by(model.created_at.asc(), model.id.asc())
+    return stmt.order_by(model.created_at.desc(), model.id.desc())
+
+
+def after_cursor(db: Session, model, after: tuple[datetime, int], order_dir: str | None):
+    # Condicion keyset (created_at, id) > / < cursor; usa el indice compuesto (created_at, id)
+    created_at, item_id = after
+    column, value = model.created_at, created_at
+    if db.get_bind().dialect.name == "sqlite":
+        # SQLite guarda las fechas como texto con distinta precision segun quien las escribe
+        column, value = func.julianday(column), func.julianday(value)
+    key = tuple_(column, model.id)
+    bound = tuple_(value, item_id)
+    return key > bound if order_dir == "asc" else key < bound
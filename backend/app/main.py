@@ -9,6 +9,7 @@ import redis
 
 from app.db.session import SessionLocal
 from app.core.observability import MetricsRegistry, ObservabilityMiddleware
+from app.cache.redis_cache import local_cache_stats
 
 from app.api.routes import auth, users, products, stocks, movements, events, alerts, categories, thresholds, reports, locations, imports, audit
 from app.api.routes import ws_alerts
@@ -17,6 +18,7 @@ import asyncio
 
 app = FastAPI(title="Sistema Inventariado Sensores")
 metrics_registry = MetricsRegistry()
+metrics_registry.register_counters(local_cache_stats)
 ws_listener_task: asyncio.Task | None = None
 COMMON_ERROR_RESPONSES = {
     "400": "Bad Request",
@@ -11,4 +11,9 @@ from .location import Location
 from .import_batch import ImportBatch
 from .import_error import ImportError
 from .import_review import ImportReview
+from .import_partition import ImportPartition
 from .fcm_token import FcmToken
+from .task_watermark import TaskWatermark
+from .notification_outbox import NotificationOutbox
+from .movement_daily_agg import MovementDailyAgg
+from .stock_snapshot import StockSnapshot
@@ -29,3 +29,9 @@ class Alert(Base):
     notification_channel: Mapped[str] = mapped_column(String(50), nullable=True)
     last_error: Mapped[str] = mapped_column(String(255), nullable=True)
     
+
+    __table_args__ = (
+        Index("ix_alerts_status", "alert_status"),
+        Index("ix_alerts_stock", "stock_id"),
+        Index("ix_alerts_created_id", "created_at", "id"),
+    )
@@ -22,5 +22,5 @@ class AuditLog(Base):
         Index("ix_audit_entity", "entity"),
         Index("ix_audit_action", "action"),
         Index("ix_audit_user", "user_id"),
-        Index("ix_audit_created", "created_at"),
+        Index("ix_audit_created_id", "created_at", "id"),
     )
\ No newline at end of file
@@ -50,3 +50,14 @@ class AlertType(enum.Enum):
     LARGE_MOVEMENT = "LARGE_MOVEMENT"
     TRANSFER_COMPLETE = "TRANSFER_COMPLETE"
     IMPORT_ISSUES = "IMPORT_ISSUES"
+
+class OutboxStatus(enum.Enum):
+    PENDING = "PENDING"
+    SENT = "SENT"
+    ERROR = "ERROR"
+
+class ImportStatus(enum.Enum):
+    PENDING = "PENDING"
+    PROCESSING = "PROCESSING"
+    COMPLETED = "COMPLETED"
+    FAILED = "FAILED"
@@ -27,14 +27,18 @@ class Event(Base):
     retry_count: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
     last_error: Mapped[str] = mapped_column(String(255), nullable=True)
     idempotency_key: Mapped[str] = mapped_column(String(100), unique=True, nullable=False)
+    # Lease del dispatcher: quien reclamo el evento y hasta cuando
+    lease_owner: Mapped[str | None] = mapped_column(String(100), nullable=True)
+    lease_expires_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True), nullable=True)
     
     __table_args__ = (
         Index("ix_events_product", "product_id"),
         Index("ix_events_type", "event_type"),
         Index("ix_events_location", "location_id"),
         Index("ix_events_status", "event_status"),
-        Index("ix_events_created", "created_at"),
+        Index("ix_events_created_id", "created_at", "id"),
         Index("ix_events_idempotency", "idempotency_key"),
+        Index("ix_events_status_lease", "event_status", "lease_expires_at"),
     )
 
     @property
@@ -1,7 +1,8 @@
-from sqlalchemy import Integer, String, DateTime, ForeignKey, func, Boolean, Index
+from sqlalchemy import Integer, String, DateTime, ForeignKey, func, Boolean, Index, Enum, Float, text
 from sqlalchemy.orm import Mapped, mapped_column
 from app.db.base import Base
 from datetime import datetime
+from app.models.enums import ImportStatus
 
 
 class ImportBatch(Base):
@@ -15,6 +16,18 @@ class ImportBatch(Base):
     ok_rows: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
     error_rows: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
     review_rows: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    # Estado y progreso del job (los ficheros grandes se procesan en segundo plano por import_csv_batch)
+    status: Mapped[ImportStatus] = mapped_column(Enum(ImportStatus), nullable=False, default=ImportStatus.PENDING)
+    processed_rows: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    fuzzy_threshold: Mapped[float] = mapped_column(Float, nullable=False, default=0.9)
+    file_path: Mapped[str | None] = mapped_column(String(500), nullable=True)
+    error_message: Mapped[str | None] = mapped_column(String(255), nullable=True)
+    started_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True), nullable=True)
+    finished_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True), nullable=True)
+    # SHA-256 del fichero subido: detecta re-subidas de un fichero ya aplicado
+    content_hash: Mapped[str | None] = mapped_column(String(64), nullable=True)
+    # Ultimo checkpoint confirmado; un lote PROCESSING sin latido reciente se reanuda
+    heartbeat_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True), nullable=True)
     created_at: Mapped[datetime] = mapped_column(
         DateTime(timezone=True),
         server_default=func.now(),
@@ -25,4 +38,14 @@ class ImportBatch(Base):
         Index("ix_import_batches_user", "user_id"),
         Index("ix_import_batches_kind", "kind"),
         Index("ix_import_batches_created", "created_at"),
+        Index("ix_import_batches_status", "status"),
+        # Un solo lote real por contenido: dos subidas simultaneas del mismo fichero no pueden aplicarse ambas
+        Index(
+            "ux_import_batches_kind_content_hash",
+            "kind",
+            "content_hash",
+            unique=True,
+            postgresql_where=text("dry_run = false AND content_hash IS NOT NULL"),
+            sqlite_where=text("dry_run = 0 AND content_hash IS NOT NULL"),
+        ),
     )
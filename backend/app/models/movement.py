@@ -29,7 +29,7 @@ class Movement(Base):
         Index("ix_movements_type", "movement_type"),
         Index("ix_movements_location", "location_id"),
         Index("ix_movements_transfer", "transfer_id"),
-        Index("ix_movements_created", "created_at"),
+        Index("ix_movements_created_id", "created_at", "id"),
     )
     
     @property
@@ -0,0 +1,24 @@
+from sqlalchemy import BigInteger, Date, Enum, ForeignKey, Index, Integer
+from sqlalchemy.orm import Mapped, mapped_column
+from app.db.base import Base
+from datetime import date
+from app.models.enums import MovementType
+
+
+# Suma diaria de movimientos por producto, ubicacion y tipo (dias UTC completos); la mantiene rollup_movements
+class MovementDailyAgg(Base):
+    __tablename__ = "movement_daily_agg"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    day: Mapped[date] = mapped_column(Date, nullable=False)
+    product_id: Mapped[int] = mapped_column(ForeignKey("products.id", ondelete="CASCADE"), nullable=False)
+    location_id: Mapped[int | None] = mapped_column(ForeignKey("locations.id"), nullable=True)
+    movement_type: Mapped[MovementType] = mapped_column(Enum(MovementType), nullable=False)
+    quantity: Mapped[int] = mapped_column(BigInteger, nullable=False, default=0)
+    delta: Mapped[int] = mapped_column(BigInteger, nullable=False, default=0)
+    movement_count: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        Index("ux_movement_daily_agg", "day", "product_id", "location_id", "movement_type", unique=True),
+        Index("ix_movement_daily_agg_product_day", "product_id", "day"),
+    )
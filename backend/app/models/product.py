@@ -29,4 +29,5 @@ class Product(Base):
         Index("ix_products_barcode", "barcode"),
         Index("ix_products_category", "category_id"),
         Index("ix_products_active", "active"),
+        # ix_products_name_trgm (GIN pg_trgm sobre lower(name)) solo existe en PostgreSQL: ver migracion ab5d7f9a1c38
     )
\ No newline at end of file
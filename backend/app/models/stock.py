@@ -26,6 +26,9 @@ class Stock(Base):
     __table_args__ = (
         Index("ix_stocks_product", "product_id"),
         Index("ix_stocks_location", "location_id"),
+        Index("ix_stocks_updated", "updated_at"),
+        # Una sola fila de stock por producto y ubicacion (base de los upserts ON CONFLICT)
+        Index("ux_stocks_product_location", "product_id", "location_id", unique=True),
     )
 
     @property
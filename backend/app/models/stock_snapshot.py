@@ -0,0 +1,20 @@
+from sqlalchemy import BigInteger, Date, ForeignKey, Index, Integer
+from sqlalchemy.orm import Mapped, mapped_column
+from app.db.base import Base
+from datetime import date
+
+
+# Stock al cierre de cada dia UTC por producto y ubicacion; lo escribe la tarea snapshot_stocks
+class StockSnapshot(Base):
+    __tablename__ = "stock_snapshots"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    day: Mapped[date] = mapped_column(Date, nullable=False)
+    product_id: Mapped[int] = mapped_column(ForeignKey("products.id", ondelete="CASCADE"), nullable=False)
+    location_id: Mapped[int] = mapped_column(ForeignKey("locations.id"), nullable=False)
+    quantity: Mapped[int] = mapped_column(BigInteger, nullable=False, default=0)
+
+    __table_args__ = (
+        Index("ux_stock_snapshots", "day", "product_id", "location_id", unique=True),
+        Index("ix_stock_snapshots_product_day", "product_id", "day"),
+    )
@@ -25,7 +25,8 @@ class StockThreshold(Base):
     
     __table_args__ = (
         Index("ix_thresholds_product", "product_id"),
-        Index("ix_thresholds_location", "location_id")
+        Index("ix_thresholds_location", "location_id"),
+        Index("ix_thresholds_updated", "updated_at"),
     )
 
     @property
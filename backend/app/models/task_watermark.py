@@ -0,0 +1,21 @@
+from sqlalchemy import Integer, String, DateTime, func
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.db.base import Base
+from datetime import datetime
+
+
+# Marca de agua persistida de las tareas incrementales (hasta donde se proceso)
+class TaskWatermark(Base):
+    __tablename__ = "task_watermarks"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    name: Mapped[str] = mapped_column(String(100), nullable=False, unique=True)
+    watermark_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True), nullable=True)
+    watermark_id: Mapped[int | None] = mapped_column(Integer, nullable=True)
+    updated_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True),
+        server_default=func.now(),
+        onupdate=func.now(),
+        nullable=True,
+    )
@@ -1,15 +1,13 @@
 from datetime import datetime
 from typing import Iterable, Tuple
 
-from sqlalchemy import func, select
+from sqlalchemy import insert, select
 from sqlalchemy.orm import Session
 
+from app.db.pagination import TotalMode, after_cursor, count_total, order_by_created
 from app.models.alert import Alert
 from app.models.enums import AlertStatus, AlertType
-from app.schemas.alert import AlertResponse
-from app.ws.alerts_ws import publish_alert
-from app.services import fcm_service
-from app.services.notification_service import send_stock_alert_email
+from app.repositories import notification_outbox_repo
 from app.models.stock import Stock
 from app.models.location import Location
 from app.models.product import Product
@@ -30,7 +28,9 @@ def list_alerts(
     alert_types: set[AlertType] | None = None,
     limit: int = 50,
     offset: int = 0,
-) -> Tuple[Iterable[Alert], int]:
+    after: tuple[datetime, int] | None = None,
+    with_total: TotalMode = TotalMode.EXACT,
+) -> Tuple[Iterable[Alert], int | None]:
     stmt = select(Alert)
 
     if product_id is not None or location is not None:
@@ -51,9 +51,12 @@ def list_alerts(
     if date_to is not None:
         filters.append(Alert.created_at <= date_to)
 
-    stmt = stmt.where(*filters).order_by(Alert.created_at.desc())
-    total = db.scalar(select(func.count()).select_from(stmt.subquery())) or 0
-    items = db.scalars(stmt.offset(offset).limit(limit)).all()
+    stmt = stmt.where(*filters)
+    total = count_total(db, stmt, with_total)
+    if after is not None:
+        stmt = stmt.where(after_cursor(db, Alert, after, "desc"))
+        offset = 0
+    items = db.scalars(order_by_created(stmt, Alert, "desc").offset(offset).limit(limit)).all()
     return items, total
 
 
@@ -75,6 +78,7 @@ def create_alert(
     min_quantity: int,
     alert_type: AlertType = AlertType.LOW_STOCK,
     status: AlertStatus = AlertStatus.PENDING,
+    commit: bool = True,
 ) -> Alert:
     alert = Alert(
         stock_id=stock_id,
@@ -84,45 +88,45 @@ def create_alert(
         alert_status=status,
     )
     db.add(alert)
-    db.commit()
-    db.refresh(alert)
-    try:
-        publish_alert(AlertResponse.model_validate(alert))
-    except Exception:
-        pass
-    if alert.alert_type in (AlertType.LOW_STOCK, AlertType.OUT_OF_STOCK) and alert.stock_id is not None:
-        try:
-            row = db.execute(
-                select(Stock, Location, Product)
-                .join(Location, Stock.location_id == Location.id)
-                .join(Product, Stock.product_id == Product.id)
-                .where(Stock.id == alert.stock_id)
-            ).first()
-            if row:
-                stock, location, product = row
-                sent = send_stock_alert_email(
-                    alert_type=alert.alert_type,
-                    product_id=product.id,
-                    product_name=product.name,
-                    location=location.code,
-                    quantity=alert.quantity,
-                    min_quantity=alert.min_quantity,
-                )
-                if sent:
-                    alert.notification_sent = True
-                    alert.notification_sent_at = datetime.utcnow()
-                    alert.notification_channel = "email"
-                    db.add(alert)
-                    db.commit()
-        except Exception:
-            pass
-    try:
-        fcm_service.send_alert_push(db, alert)
-    except Exception:
-        pass
+    db.flush()
+    # Las notificaciones salen por el outbox, nunca dentro de la peticion
+    notification_outbox_repo.add_for_alerts(db, [alert.id])
+    if commit:
+        db.commit()
+        db.refresh(alert)
     return alert
 
 
+def create_alerts_bulk(db: Session, rows: list[dict], commit: bool = True) -> list[Alert]:
+    # Inserta todas las alertas y sus filas de outbox con un unico commit
+    alerts = [
+        Alert(
+            stock_id=row["stock_id"],
+            quantity=row["quantity"],
+            min_quantity=row["min_quantity"],
+            alert_type=row.get("alert_type", AlertType.LOW_STOCK),
+            alert_status=row.get("status", AlertStatus.PENDING),
+        )
+        for row in rows
+    ]
+    if not alerts:
+        return []
+    db.add_all(alerts)
+    db.flush()
+    notification_outbox_repo.add_for_alerts(db, [alert.id for alert in alerts])
+    if commit:
+        db.commit()
+    return alerts
+
+
+def create_alerts_from_select(db: Session, columns: list[str], stmt) -> list[int]:
+    # INSERT ... SELECT: las alertas se generan dentro de la BD sin traer stocks a Python
+    ids = list(db.scalars(insert(Alert).from_select(columns, stmt).returning(Alert.id)).all())
+    notification_outbox_repo.add_for_alerts(db, ids)
+    db.commit()
+    return ids
+
+
 def ack_alert(db: Session, alert: Alert, user_id: int) -> Alert:
     alert.alert_status = AlertStatus.ACK
     alert.ack_user_id = user_id
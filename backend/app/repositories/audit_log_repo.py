@@ -1,9 +1,10 @@
 from datetime import datetime
 from typing import Iterable, Tuple
 
-from sqlalchemy import func, select
+from sqlalchemy import insert, select
 from sqlalchemy.orm import Session
 
+from app.db.pagination import TotalMode, after_cursor, count_total, order_by_created
 from app.models.audit_log import AuditLog
 from app.models.enums import ActionType, Entity
 
@@ -32,6 +33,12 @@ def create_log(
     return entry
 
 
+def create_logs_bulk(db: Session, rows: list[dict]) -> None:
+    # Un INSERT multi-fila (entity, action, user_id, details); sin commit
+    if rows:
+        db.execute(insert(AuditLog), rows)
+
+
 def list_logs(
     db: Session,
     *,
@@ -43,7 +50,9 @@ def list_logs(
     order_dir: str | None = "desc",
     limit: int = 50,
     offset: int = 0,
-) -> Tuple[Iterable[AuditLog], int]:
+    after: tuple[datetime, int] | None = None,
+    with_total: TotalMode = TotalMode.EXACT,
+) -> Tuple[Iterable[AuditLog], int | None]:
     filters = []
     if entity is not None:
         filters.append(AuditLog.entity == entity)
@@ -56,11 +65,10 @@ def list_logs(
     if date_to is not None:
         filters.append(AuditLog.created_at <= date_to)
 
-    if order_dir == "asc":
-        stmt = select(AuditLog).where(*filters).order_by(AuditLog.created_at.asc())
-    else:
-        stmt = select(AuditLog).where(*filters).order_by(AuditLog.created_at.desc())
-
-    total = db.scalar(select(func.count()).select_from(stmt.subquery())) or 0
-    items = db.scalars(stmt.offset(offset).limit(limit)).all()
+    stmt = select(AuditLog).where(*filters)
+    total = count_total(db, stmt, with_total)
+    if after is not None:
+        stmt = stmt.where(after_cursor(db, AuditLog, after, order_dir))
+        offset = 0
+    items = db.scalars(order_by_created(stmt, AuditLog, order_dir).offset(offset).limit(limit)).all()
     return items, total
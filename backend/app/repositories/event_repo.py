@@ -1,11 +1,22 @@
+from datetime import datetime
 from typing import Iterable, Tuple
-from sqlalchemy import func, select
+from sqlalchemy import select
 from sqlalchemy.orm import Session
+from app.db.pagination import TotalMode, after_cursor, count_total, order_by_created
+from app.db.upsert import dialect_insert
 from app.models.event import Event
+from app.models.location import Location
 from app.models.enums import EventType, EventStatus, Source
 import uuid
 
 
+def _normalize_source(source: Source | str) -> Source:
+    try:
+        return source if isinstance(source, Source) else Source(source)
+    except ValueError:
+        return Source.MANUAL
+
+
 def create_event(
     db: Session,
     *,
@@ -17,16 +28,12 @@ def create_event(
     processed: bool = False,
     idempotency_key: str | None = None,
 ) -> Event:
-    try:
-        normalized_source = source if isinstance(source, Source) else Source(source)
-    except ValueError:
-        normalized_source = Source.MANUAL
     status = EventStatus.PROCESSED if processed else EventStatus.PENDING
     event = Event(
         event_type=event_type,
         product_id=product_id,
         delta=delta,
-        source=normalized_source,
+        source=_normalize_source(source),
         location_id=location_id,
         event_status=status,
         idempotency_key=idempotency_key or str(uuid.uuid4()),
@@ -37,16 +44,12 @@ def create_event(
     return event
 
 
-def list_events(
-    db: Session,
+def _filters(
     *,
     event_type: EventType | None = None,
     product_id: int | None = None,
     processed: bool | None = None,
-    order_dir: str | None = "desc",
-    limit: int = 50,
-    offset: int = 0,
-) -> Tuple[Iterable[Event], int]:
+) -> list:
     filters = []
     if event_type is not None:
         filters.append(Event.event_type == event_type)
@@ -55,16 +58,98 @@ def list_events(
     if processed is not None:
         status = EventStatus.PROCESSED if processed else EventStatus.PENDING
         filters.append(Event.event_status == status)
+    return filters
 
-    if order_dir == "asc":
-        stmt = select(Event).where(*filters).order_by(Event.created_at.asc())
-    else:
-        stmt = select(Event).where(*filters).order_by(Event.created_at.desc())
-    total = db.scalar(select(func.count()).select_from(stmt.subquery())) or 0
-    items = db.scalars(stmt.offset(offset).limit(limit)).all()
+
+def list_events(
+    db: Session,
+    *,
+    event_type: EventType | None = None,
+    product_id: int | None = None,
+    processed: bool | None = None,
+    order_dir: str | None = "desc",
+    limit: int = 50,
+    offset: int = 0,
+    after: tuple[datetime, int] | None = None,
+    with_total: TotalMode = TotalMode.EXACT,
+) -> Tuple[Iterable[Event], int | None]:
+    filters = _filters(event_type=event_type, product_id=product_id, processed=processed)
+    stmt = select(Event).where(*filters)
+    total = count_total(db, stmt, with_total)
+    if after is not None:
+        stmt = stmt.where(after_cursor(db, Event, after, order_dir))
+        offset = 0
+    items = db.scalars(order_by_created(stmt, Event, order_dir).offset(offset).limit(limit)).all()
     return items, total
 
+
+def select_for_export(
+    *,
+    event_type: EventType | None = None,
+    product_id: int | None = None,
+    processed: bool | None = None,
+    order_dir: str | None = "desc",
+):
+    filters = _filters(event_type=event_type, product_id=product_id, processed=processed)
+    stmt = (
+        select(
+            Event.id,
+            Event.event_type,
+            Event.product_id,
+            Event.delta,
+            Event.location_id,
+            Location.code.label("location"),
+            Event.source,
+            Event.event_status,
+            Event.idempotency_key,
+            Event.retry_count,
+            Event.last_error,
+            Event.created_at,
+            Event.processed_at,
+        )
+        .join(Location, Location.id == Event.location_id, isouter=True)
+        .where(*filters)
+    )
+    return order_by_created(stmt, Event, order_dir)
+
 #Esto te permite "si ya existe, devuelvo el mismo".
 def get_by_idempotency_key(db: Session, key: str) -> Event | None:
     return db.scalar(select(Event).where(Event.idempotency_key == key))
 
+
+def get_by_idempotency_keys(db: Session, keys: Iterable[str]) -> dict[str, Event]:
+    keys = set(keys)
+    if not keys:
+        return {}
+    events = db.scalars(select(Event).where(Event.idempotency_key.in_(keys))).all()
+    return {event.idempotency_key: event for event in events}
+
+
+def create_events_bulk(db: Session, rows: list[dict]) -> set[str]:
+    """
+    Inserta varios eventos PENDING en una sola sentencia.
+    Las claves de idempotencia ya existentes se ignoran (ON CONFLICT DO NOTHING);
+    devuelve las claves realmente insertadas. No hace commit.
+    """
+    if not rows:
+        return set()
+    values = [
+        {
+            "event_type": row["event_type"],
+            "product_id": row["product_id"],
+            "delta": row["delta"],
+            "source": _normalize_source(row["source"]),
+            "location_id": row.get("location_id"),
+            "event_status": EventStatus.PENDING,
+            "retry_count": 0,
+            "idempotency_key": row.get("idempotency_key") or str(uuid.uuid4()),
+        }
+        for row in rows
+    ]
+    stmt = (
+        dialect_insert(db, Event)
+        .values(values)
+        .on_conflict_do_nothing(index_elements=["idempotency_key"])
+        .returning(Event.idempotency_key)
+    )
+    return set(db.scalars(stmt).all())
@@ -1,7 +1,7 @@
 from datetime import datetime
 from typing import Iterable
 
-from sqlalchemy import select
+from sqlalchemy import delete, select
 from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 
@@ -72,3 +72,13 @@ def list_tokens_for_roles(db: Session, roles: set[UserRole]) -> list[str]:
         .where(User.role.in_(roles))
     )
     return [row[0] for row in db.execute(stmt).all()]
+
+
+def delete_tokens(db: Session, tokens: Iterable[str], commit: bool = True) -> int:
+    tokens = list(tokens)
+    if not tokens:
+        return 0
+    deleted = db.execute(delete(FcmToken).where(FcmToken.token.in_(tokens))).rowcount
+    if commit:
+        db.commit()
+    return deleted
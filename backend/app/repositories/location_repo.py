@@ -1,6 +1,9 @@
+from typing import Iterable
+
 from sqlalchemy import select, func
 from sqlalchemy.orm import Session
 
+from app.db.upsert import dialect_insert
 from app.models.location import Location
 
 
@@ -10,7 +13,7 @@ def get_by_code(db: Session, code: str) -> Location | None:
         select(Location).where(func.lower(Location.code) == normalized.lower())
     )
 
-def get_or_create(db: Session, code: str, description: str | None = None) -> Location:
+def get_or_create(db: Session, code: str, description: str | None = None, commit: bool = True) -> Location:
     normalized = code.strip()
     location = db.scalar(
         select(Location).where(func.lower(Location.code) == normalized.lower())
@@ -19,11 +22,36 @@ def get_or_create(db: Session, code: str, description: str | None = None) -> Loc
         return location
     location = Location(code=normalized, description=description)
     db.add(location)
-    db.commit()
-    db.refresh(location)
+    if commit:
+        db.commit()
+        db.refresh(location)
+    else:
+        db.flush()
     return location
 
 
+def get_or_create_many(db: Session, codes: Iterable[str], commit: bool = True) -> dict[str, Location]:
+    # Resuelve varias ubicaciones de golpe; la clave del dict es el codigo en minusculas
+    normalized = {code.strip().lower(): code.strip() for code in codes if code and code.strip()}
+    if not normalized:
+        return {}
+    stmt = select(Location).where(func.lower(Location.code).in_(list(normalized)))
+    found = {loc.code.lower(): loc for loc in db.scalars(stmt).all()}
+    missing = [code for key, code in normalized.items() if key not in found]
+    if missing:
+        db.execute(
+            dialect_insert(db, Location)
+            .values([{"code": code} for code in missing])
+            .on_conflict_do_nothing(index_elements=["code"])
+        )
+        if commit:
+            db.commit()
+        else:
+            db.flush()
+        found = {loc.code.lower(): loc for loc in db.scalars(stmt).all()}
+    return found
+
+
 def list_locations(
     db: Session,
     *,
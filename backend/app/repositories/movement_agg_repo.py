@@ -0,0 +1,59 @@
+from datetime import date, datetime, time, timedelta, timezone
+
+from sqlalchemy import delete, func, insert, literal, select
+from sqlalchemy.orm import Session
+
+from app.models.movement import Movement
+from app.models.movement_daily_agg import MovementDailyAgg
+from app.repositories import watermark_repo
+
+
+ROLLUP_WATERMARK = "movement_daily_agg"
+
+
+def day_start(day: date) -> datetime:
+    return datetime.combine(day, time.min, tzinfo=timezone.utc)
+
+
+def rebuild_day(db: Session, day: date) -> None:
+    # Idempotente: borra y recalcula el dia entero con INSERT ... SELECT (sin commit)
+    start = day_start(day)
+    end = start + timedelta(days=1)
+    db.execute(delete(MovementDailyAgg).where(MovementDailyAgg.day == day))
+    db.execute(
+        insert(MovementDailyAgg).from_select(
+            ["day", "product_id", "location_id", "movement_type", "quantity", "delta", "movement_count"],
+            select(
+                literal(day, MovementDailyAgg.day.type),
+                Movement.product_id,
+                Movement.location_id,
+                Movement.movement_type,
+                func.sum(Movement.quantity),
+                func.sum(Movement.delta),
+                func.count(),
+            )
+            .where(Movement.created_at >= start, Movement.created_at < end)
+            .group_by(Movement.product_id, Movement.location_id, Movement.movement_type),
+        )
+    )
+
+
+def first_movement_day(db: Session) -> date | None:
+    first = db.scalar(select(func.min(Movement.created_at)))
+    if first is None:
+        return None
+    if not isinstance(first, datetime):
+        first = datetime.fromisoformat(str(first))
+    return first.astimezone(timezone.utc).date() if first.tzinfo else first.date()
+
+
+def rolled_until(db: Session) -> date | None:
+    """Primer dia que aun no esta en movement_daily_agg (los anteriores estan completos)."""
+    watermark = watermark_repo.get(db, ROLLUP_WATERMARK)
+    if watermark is None or watermark.watermark_at is None:
+        return None
+    return watermark.watermark_at.date()
+
+
+def set_rolled_until(db: Session, day: date, commit: bool = True) -> None:
+    watermark_repo.set_watermark(db, ROLLUP_WATERMARK, watermark_at=day_start(day), commit=commit)
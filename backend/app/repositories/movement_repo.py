@@ -1,10 +1,12 @@
 from datetime import datetime
 from typing import Iterable, Tuple
 
-from sqlalchemy import func, select
+from sqlalchemy import select
 from sqlalchemy.orm import Session
 
+from app.db.pagination import TotalMode, after_cursor, count_total, order_by_created
 from app.models.enums import Source, MovementType
+from app.models.location import Location
 from app.models.movement import Movement
 
 
@@ -12,8 +14,7 @@ def get(db: Session, movement_id: int) -> Movement | None:
     return db.get(Movement, movement_id)
 
 
-def list_movements(
-    db: Session,
+def _filters(
     *,
     product_id: int | None = None,
     movement_type: MovementType | None = None,
@@ -22,10 +23,7 @@ def list_movements(
     location_id: int | None = None,
     date_from: datetime | None = None,
     date_to: datetime | None = None,
-    order_dir: str | None = "desc",
-    limit: int = 50,
-    offset: int = 0,
-) -> Tuple[Iterable[Movement], int]:
+) -> list:
     filters = []
     if product_id is not None:
         filters.append(Movement.product_id == product_id)
@@ -41,16 +39,84 @@ def list_movements(
         filters.append(Movement.created_at >= date_from)
     if date_to is not None:
         filters.append(Movement.created_at <= date_to)
+    return filters
 
-    if order_dir == "asc":
-        stmt = select(Movement).where(*filters).order_by(Movement.created_at.asc())
-    else:
-        stmt = select(Movement).where(*filters).order_by(Movement.created_at.desc())
-    total = db.scalar(select(func.count()).select_from(stmt.subquery())) or 0
-    items = db.scalars(stmt.offset(offset).limit(limit)).all()
+
+def list_movements(
+    db: Session,
+    *,
+    product_id: int | None = None,
+    movement_type: MovementType | None = None,
+    movement_source: Source | None = None,
+    user_id: int | None = None,
+    location_id: int | None = None,
+    date_from: datetime | None = None,
+    date_to: datetime | None = None,
+    order_dir: str | None = "desc",
+    limit: int = 50,
+    offset: int = 0,
+    after: tuple[datetime, int] | None = None,
+    with_total: TotalMode = TotalMode.EXACT,
+) -> Tuple[Iterable[Movement], int | None]:
+    filters = _filters(
+        product_id=product_id,
+        movement_type=movement_type,
+        movement_source=movement_source,
+        user_id=user_id,
+        location_id=location_id,
+        date_from=date_from,
+        date_to=date_to,
+    )
+    stmt = select(Movement).where(*filters)
+    total = count_total(db, stmt, with_total)
+    if after is not None:
+        stmt = stmt.where(after_cursor(db, Movement, after, order_dir))
+        offset = 0
+    items = db.scalars(order_by_created(stmt, Movement, order_dir).offset(offset).limit(limit)).all()
     return items, total
 
 
+def select_for_export(
+    *,
+    product_id: int | None = None,
+    movement_type: MovementType | None = None,
+    movement_source: Source | None = None,
+    user_id: int | None = None,
+    location_id: int | None = None,
+    date_from: datetime | None = None,
+    date_to: datetime | None = None,
+    order_dir: str | None = "desc",
+):
+    filters = _filters(
+        product_id=product_id,
+        movement_type=movement_type,
+        movement_source=movement_source,
+        user_id=user_id,
+        location_id=location_id,
+        date_from=date_from,
+        date_to=date_to,
+    )
+    # Columnas planas (sin cargar la relacion Location fila a fila) con los mismos filtros que el listado
+    stmt = (
+        select(
+            Movement.id,
+            Movement.product_id,
+            Movement.quantity,
+            Movement.delta,
+            Movement.movement_type,
+            Movement.movement_source,
+            Movement.transfer_id,
+            Movement.user_id,
+            Movement.location_id,
+            Location.code.label("location"),
+            Movement.created_at,
+        )
+        .join(Location, Location.id == Movement.location_id, isouter=True)
+        .where(*filters)
+    )
+    return order_by_created(stmt, Movement, order_dir)
+
+
 def create_movement(
     db: Session,
     *,
@@ -0,0 +1,47 @@
+from datetime import datetime, timezone
+from typing import Iterable
+
+from sqlalchemy import insert, or_, select
+from sqlalchemy.orm import Session
+
+from app.models.enums import OutboxStatus
+from app.models.notification_outbox import NotificationOutbox
+
+
+def add_for_alerts(db: Session, alert_ids: list[int]) -> None:
+    # Sin commit: se escribe en la misma transaccion que las alertas
+    if not alert_ids:
+        return
+    db.execute(
+        insert(NotificationOutbox),
+        [{"alert_id": alert_id, "status": OutboxStatus.PENDING, "attempts": 0} for alert_id in alert_ids],
+    )
+
+
+def claim_pending(
+    db: Session,
+    *,
+    limit: int,
+    created_before: datetime | None = None,
+    exclude_ids: Iterable[int] = (),
+) -> list[NotificationOutbox]:
+    # SKIP LOCKED: varios dispatchers pueden drenar la cola sin pisarse
+    now = datetime.now(timezone.utc)
+    filters = [
+        NotificationOutbox.status == OutboxStatus.PENDING,
+        or_(NotificationOutbox.next_attempt_at.is_(None), NotificationOutbox.next_attempt_at <= now),
+    ]
+    if created_before is not None:
+        filters.append(NotificationOutbox.created_at <= created_before)
+    exclude_ids = list(exclude_ids)
+    if exclude_ids:
+        filters.append(NotificationOutbox.id.notin_(exclude_ids))
+    return list(
+        db.scalars(
+            select(NotificationOutbox)
+            .where(*filters)
+            .order_by(NotificationOutbox.id)
+            .limit(limit)
+            .with_for_update(skip_locked=True)
+        ).all()
+    )
@@ -1,8 +1,9 @@
 from typing import Iterable, Tuple
 
-from sqlalchemy import func, select
+from sqlalchemy import func, select, text
 from sqlalchemy.orm import Session
 
+from app.db.pagination import TotalMode, count_total
 from app.models.product import Product
 
 
@@ -18,6 +19,35 @@ def get_by_barcode(db: Session, barcode: str) -> Product | None:
     return db.scalar(select(Product).where(Product.barcode == barcode))
 
 
+def existing_ids(db: Session, product_ids: Iterable[int]) -> set[int]:
+    ids = set(product_ids)
+    if not ids:
+        return set()
+    return set(db.scalars(select(Product.id).where(Product.id.in_(ids))).all())
+
+
+# Valor por defecto de pg_trgm.similarity_threshold, el corte del operador %
+TRGM_SIMILARITY_THRESHOLD = 0.3
+
+
+def similar_by_name(db: Session, name: str, *, limit: int, min_similarity: float | None = None) -> list:
+    # Solo PostgreSQL: el operador % de pg_trgm usa el indice GIN ix_products_name_trgm
+    target = name.strip().lower()
+    if min_similarity is not None and min_similarity < TRGM_SIMILARITY_THRESHOLD:
+        # Umbral del lote por debajo del de pg_trgm: se baja solo en esta transaccion (SET LOCAL)
+        db.execute(
+            text("SELECT set_config('pg_trgm.similarity_threshold', :threshold, true)"),
+            {"threshold": str(min_similarity)},
+        )
+    name_lower = func.lower(Product.name)
+    return db.execute(
+        select(Product.id, Product.name, Product.sku, Product.barcode)
+        .where(name_lower.op("%")(target))
+        .order_by(func.similarity(name_lower, target).desc())
+        .limit(limit)
+    ).all()
+
+
 def list_products(
     db: Session,
     *,
@@ -30,7 +60,8 @@ def list_products(
     order_dir: str | None = "asc",
     limit: int = 50,
     offset: int = 0,
-) -> Tuple[Iterable[Product], int]:
+    with_total: TotalMode = TotalMode.EXACT,
+) -> Tuple[Iterable[Product], int | None]:
     filters = []
     if sku:
         filters.append(Product.sku.ilike(f"%{sku}%"))
@@ -48,7 +79,7 @@ def list_products(
         stmt = select(Product).where(*filters).order_by(order_col.asc())
     else:
         stmt = select(Product).where(*filters).order_by(order_col.desc())
-    total = db.scalar(select(func.count()).select_from(stmt.subquery())) or 0
+    total = count_total(db, stmt, with_total)
     items = db.scalars(stmt.offset(offset).limit(limit)).all()
     return items, total
 
@@ -1,115 +1,203 @@
+from datetime import date, datetime, timedelta, timezone
 from typing import Iterable, Tuple
-from sqlalchemy import select, func, case
+from sqlalchemy import select, func, case, or_, union_all
 from sqlalchemy.orm import Session
 from app.models.movement import Movement
+from app.models.movement_daily_agg import MovementDailyAgg
 from app.models.product import Product
 from app.models.stock import Stock
+from app.models.stock_snapshot import StockSnapshot
 from app.models.enums import MovementType
-from app.repositories import location_repo
+from app.repositories import location_repo, movement_agg_repo, stock_snapshot_repo
 
 
-def list_top_consumed(
+def _as_utc(value: datetime) -> datetime:
+    return value.replace(tzinfo=timezone.utc) if value.tzinfo is None else value.astimezone(timezone.utc)
+
+
+def _movement_source(
+    db: Session,
+    *,
+    date_from: datetime | None,
+    date_to: datetime | None,
+    location_id: int | None,
+    movement_type: MovementType | None = None,
+):
+    """
+    (product_id, movement_type, quantity) de los movimientos del rango: los dias completos ya consolidados
+    salen de movement_daily_agg y solo los extremos parciales y los dias aun abiertos de movements.
+    """
+    raw_filters = []
+    agg_filters = []
+    if location_id is not None:
+        raw_filters.append(Movement.location_id == location_id)
+        agg_filters.append(MovementDailyAgg.location_id == location_id)
+    if movement_type is not None:
+        raw_filters.append(Movement.movement_type == movement_type)
+        agg_filters.append(MovementDailyAgg.movement_type == movement_type)
+    if date_from is not None:
+        raw_filters.append(Movement.created_at >= date_from)
+    if date_to is not None:
+        raw_filters.append(Movement.created_at <= date_to)
+
+    raw = select(Movement.product_id, Movement.movement_type, Movement.quantity.label("quantity"))
+
+    # Dias completos dentro de [date_from, date_to] y ya consolidados: [first_day, end_day)
+    end_day = movement_agg_repo.rolled_until(db)
+    first_day = None
+    if end_day is not None and date_to is not None:
+        end_day = min(end_day, (_as_utc(date_to) + timedelta(microseconds=1)).date())
+    if end_day is not None and date_from is not None:
+        start = _as_utc(date_from)
+        first_day = start.date() if start == movement_agg_repo.day_start(start.date()) else start.date() + timedelta(days=1)
+    if end_day is None or (first_day is not None and first_day >= end_day):
+        return raw.where(*raw_filters).subquery("mov_src")
+
+    tail = Movement.created_at >= movement_agg_repo.day_start(end_day)
+    if first_day is not None:
+        tail = or_(Movement.created_at < movement_agg_repo.day_start(first_day), tail)
+        agg_filters.append(MovementDailyAgg.day >= first_day)
+    agg_filters.append(MovementDailyAgg.day < end_day)
+    agg = select(
+        MovementDailyAgg.product_id,
+        MovementDailyAgg.movement_type,
+        MovementDailyAgg.quantity.label("quantity"),
+    ).where(*agg_filters)
+    return union_all(raw.where(*raw_filters, tail), agg).subquery("mov_src")
+
+
+def _closing_day(date_to: datetime | None) -> date | None:
+    # date_to al final de un dia (23:59:59.999999): su cierre es el snapshot de ese dia
+    if date_to is None:
+        return None
+    end = _as_utc(date_to) + timedelta(microseconds=1)
+    return end.date() - timedelta(days=1) if end == movement_agg_repo.day_start(end.date()) else None
+
+
+def _opening_day(date_from: datetime | None) -> date | None:
+    # date_from a medianoche: su apertura es el cierre del dia anterior
+    if date_from is None:
+        return None
+    start = _as_utc(date_from)
+    return start.date() - timedelta(days=1) if start == movement_agg_repo.day_start(start.date()) else None
+
+
+def _balance_by_product(balances, location_id: int | None, label: str):
+    # Suma por producto de (product_id, location_id, quantity); sin balances usa el stock actual
+    if balances is None:
+        balances = select(Stock.product_id, Stock.location_id, Stock.quantity).subquery()
+    filters = [balances.c.location_id == location_id] if location_id is not None else []
+    return (
+        select(balances.c.product_id, func.sum(balances.c.quantity).label(label))
+        .where(*filters)
+        .group_by(balances.c.product_id)
+        .subquery()
+    )
+
+
+def select_top_consumed(
     db: Session,
     *,
     date_from=None,
     date_to=None,
     location: str | None = None,
     order_dir: str | None = "desc",
-    limit: int = 10,
-    offset: int = 0,
-) -> Tuple[Iterable[tuple], int]:
-    filters = [Movement.movement_type == MovementType.OUT]
-    if date_from:
-        filters.append(Movement.created_at >= date_from)
-    if date_to:
-        filters.append(Movement.created_at <= date_to)
+):
+    """Consulta ordenada (sin paginar) del top consumidos; None si la ubicación no existe."""
+    loc_id = None
     if location:
         loc = location_repo.get_by_code(db, location)
         if not loc:
-            return [], 0  # ubicación inexistente: sin resultados
-        filters.append(Movement.location_id == loc.id)
+            return None
+        loc_id = loc.id
+    src = _movement_source(
+        db, date_from=date_from, date_to=date_to, location_id=loc_id, movement_type=MovementType.OUT
+    )
 
     base = (
         select(
-            Movement.product_id,
+            src.c.product_id,
             Product.sku,
             Product.name,
-            func.sum(Movement.quantity).label("total_out"),
+            func.sum(src.c.quantity).label("total_out"),
         )
-        .join(Product, Product.id == Movement.product_id)
-        .where(*filters)
-        .group_by(Movement.product_id, Product.sku, Product.name)
+        .join(Product, Product.id == src.c.product_id)
+        .group_by(src.c.product_id, Product.sku, Product.name)
     )
-    total_out = func.sum(Movement.quantity)
+    total_out = func.sum(src.c.quantity)
     if order_dir == "asc":
         base = base.order_by(total_out.asc())
     else:
         base = base.order_by(total_out.desc())
+    return base
+
 
+def list_top_consumed(
+    db: Session,
+    *,
+    date_from=None,
+    date_to=None,
+    location: str | None = None,
+    order_dir: str | None = "desc",
+    limit: int = 10,
+    offset: int = 0,
+) -> Tuple[Iterable[tuple], int]:
+    base = select_top_consumed(db, date_from=date_from, date_to=date_to, location=location, order_dir=order_dir)
+    if base is None:
+        return [], 0  # ubicación inexistente: sin resultados
     total = db.scalar(select(func.count()).select_from(base.subquery())) or 0
     rows = db.execute(base.offset(offset).limit(limit)).all()
     return rows, total
 
 
-def list_turnover(
+def select_turnover(
     db: Session,
     *,
     date_from=None,
     date_to=None,
     location: str | None = None,
     order_dir: str | None = "desc",
-    limit: int = 10,
-    offset: int = 0,
-) -> Tuple[Iterable[tuple], int, str | None]:
-    filters = []
-    if date_from:
-        filters.append(Movement.created_at >= date_from)
-    if date_to:
-        filters.append(Movement.created_at <= date_to)
-
+):
+    """(consulta ordenada sin paginar, código de ubicación); (None, None) si la ubicación no existe."""
     loc_id = None
     loc_code = None
     if location:
         loc = location_repo.get_by_code(db, location)
         if not loc:
-            return [], 0, None  # ubicación inexistente
+            return None, None
         loc_id = loc.id
         loc_code = loc.code
-        filters.append(Movement.location_id == loc_id)
+    src = _movement_source(db, date_from=date_from, date_to=date_to, location_id=loc_id)
 
     mov_agg = (
         select(
-            Movement.product_id,
+            src.c.product_id,
             func.sum(
-                case((Movement.movement_type == MovementType.OUT, Movement.quantity), else_=0)
+                case((src.c.movement_type == MovementType.OUT, src.c.quantity), else_=0)
             ).label("outs"),
             func.sum(
                 case(
-                    (Movement.movement_type == MovementType.IN, Movement.quantity),
-                    (Movement.movement_type == MovementType.OUT, -Movement.quantity),
-                    (Movement.movement_type == MovementType.ADJUST, Movement.quantity),
+                    (src.c.movement_type == MovementType.IN, src.c.quantity),
+                    (src.c.movement_type == MovementType.OUT, -src.c.quantity),
+                    (src.c.movement_type == MovementType.ADJUST, src.c.quantity),
                     else_=0,
                 )
             ).label("net"),
         )
-        .where(*filters)
-        .group_by(Movement.product_id)
+        .group_by(src.c.product_id)
         .cte("mov_agg")
     )
 
-    stock_filters = []
-    if loc_id is not None:
-        stock_filters.append(Stock.location_id == loc_id)
-
-    stock_agg = (
-        select(
-            Stock.product_id,
-            func.sum(Stock.quantity).label("stock_final"),
-        )
-        .where(*stock_filters)
-        .group_by(Stock.product_id)
-        .subquery()
-    )
+    # Saldos de apertura y cierre de stock_snapshots cuando el rango son dias completos;
+    # sin date_to el cierre es el stock actual y sin date_from la apertura se deduce de los movimientos
+    closing_day = _closing_day(date_to)
+    opening_day = _opening_day(date_from)
+    closing = stock_snapshot_repo.balances_on(db, closing_day).subquery() if closing_day else None
+    stock_agg = _balance_by_product(closing, loc_id, "stock_final")
+    open_agg = None
+    if opening_day is not None:
+        opening = stock_snapshot_repo.balances_on(db, opening_day).subquery()
+        open_agg = _balance_by_product(opening, loc_id, "stock_initial")
 
     base = (
         select(
@@ -124,17 +212,21 @@ def list_turnover(
         .join(stock_agg, stock_agg.c.product_id == Product.id, isouter=True)
     )
 
+    if open_agg is not None:
+        base = base.join(open_agg, open_agg.c.product_id == Product.id, isouter=True)
+
     # Excluir productos sin movimientos ni stock en la ubicación filtrada
     if loc_id is not None:
-        base = base.where(
-            (mov_agg.c.product_id.isnot(None)) | (stock_agg.c.product_id.isnot(None))
-        )
+        present = (mov_agg.c.product_id.isnot(None)) | (stock_agg.c.product_id.isnot(None))
+        if open_agg is not None:
+            present = present | open_agg.c.product_id.isnot(None)
+        base = base.where(present)
 
     # Cálculos derivados
     stock_final = func.coalesce(stock_agg.c.stock_final, 0)
     outs = func.coalesce(mov_agg.c.outs, 0)
     net = func.coalesce(mov_agg.c.net, 0)
-    stock_initial = stock_final - net
+    stock_initial = func.coalesce(open_agg.c.stock_initial, 0) if open_agg is not None else stock_final - net
     stock_average = (stock_initial + stock_final) / 2
     turnover = case(
         (stock_average > 0, outs / stock_average),
@@ -147,11 +239,111 @@ def list_turnover(
         turnover.label("turnover"),
     )
 
-    total = db.scalar(select(func.count()).select_from(base.subquery())) or 0
     if order_dir == "asc":
         base = base.order_by(turnover.asc().nulls_last())
     else:
         base = base.order_by(turnover.desc().nulls_last())
+    return base, loc_code
+
+
+def list_turnover(
+    db: Session,
+    *,
+    date_from=None,
+    date_to=None,
+    location: str | None = None,
+    order_dir: str | None = "desc",
+    limit: int = 10,
+    offset: int = 0,
+) -> Tuple[Iterable[tuple], int, str | None]:
+    base, loc_code = select_turnover(db, date_from=date_from, date_to=date_to, location=location, order_dir=order_dir)
+    if base is None:
+        return [], 0, None  # ubicación inexistente
+    total = db.scalar(select(func.count()).select_from(base.order_by(None).subquery())) or 0
     rows = db.execute(base.offset(offset).limit(limit)).all()
 
     return rows, total, loc_code
+
+
+def list_stock_on_date(
+    db: Session,
+    *,
+    day: date,
+    location: str | None = None,
+    order_dir: str | None = "desc",
+    limit: int = 10,
+    offset: int = 0,
+) -> Tuple[Iterable[tuple], int, str | None]:
+    loc_id = None
+    loc_code = None
+    if location:
+        loc = location_repo.get_by_code(db, location)
+        if not loc:
+            return [], 0, None  # ubicación inexistente
+        loc_id = loc.id
+        loc_code = loc.code
+
+    balances = _balance_by_product(stock_snapshot_repo.balances_on(db, day).subquery(), loc_id, "quantity")
+    base = select(Product.id.label("product_id"), Product.sku, Product.name, balances.c.quantity).join(
+        balances, balances.c.product_id == Product.id
+    )
+    total = db.scalar(select(func.count()).select_from(base.subquery())) or 0
+    if order_dir == "asc":
+        base = base.order_by(balances.c.quantity.asc(), Product.id.asc())
+    else:
+        base = base.order_by(balances.c.quantity.desc(), Product.id.asc())
+    rows = db.execute(base.offset(offset).limit(limit)).all()
+    return rows, total, loc_code
+
+
+def list_stock_trend(
+    db: Session,
+    *,
+    date_from: date,
+    date_to: date,
+    product_id: int | None = None,
+    location: str | None = None,
+    now: datetime | None = None,
+) -> Tuple[list[tuple[date, int]], str | None]:
+    """
+    Stock al cierre de cada dia de [date_from, date_to]. Los dias con snapshot salen de stock_snapshots;
+    los posteriores al ultimo snapshot (hasta hoy) se calculan desde el stock actual y los anteriores
+    al primer snapshot se omiten.
+    """
+    loc_id = None
+    loc_code = None
+    if location:
+        loc = location_repo.get_by_code(db, location)
+        if not loc:
+            return [], None  # ubicación inexistente
+        loc_id = loc.id
+        loc_code = loc.code
+
+    today = _as_utc(now or datetime.now(timezone.utc)).date()
+    date_to = min(date_to, today)
+    floor, until = stock_snapshot_repo.covered_days(db)
+    points: dict[date, int] = {}
+
+    if floor is not None:
+        first, last = max(date_from, floor), min(date_to + timedelta(days=1), until)
+        filters = [StockSnapshot.day >= first, StockSnapshot.day < last]
+        if product_id is not None:
+            filters.append(StockSnapshot.product_id == product_id)
+        if loc_id is not None:
+            filters.append(StockSnapshot.location_id == loc_id)
+        day = first
+        while day < last:
+            points[day] = 0  # dia cubierto sin filas: stock 0
+            day += timedelta(days=1)
+        rows = db.execute(
+            select(StockSnapshot.day, func.sum(StockSnapshot.quantity)).where(*filters).group_by(StockSnapshot.day)
+        ).all()
+        for row_day, quantity in rows:
+            points[row_day] = int(quantity or 0)
+
+    # Dias sin snapshot: todos en una consulta, no una por dia
+    start = max(date_from, until or today)
+    live_days = [start + timedelta(days=offset) for offset in range((date_to - start).days + 1)]
+    points.update(stock_snapshot_repo.live_totals(db, live_days, product_id=product_id, location_id=loc_id))
+
+    return sorted(points.items()), loc_code
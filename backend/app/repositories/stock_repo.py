@@ -1,8 +1,10 @@
 from typing import Iterable, Tuple
 
-from sqlalchemy import func, select
+from sqlalchemy import func, select, update
 from sqlalchemy.orm import Session
 
+from app.db.pagination import TotalMode, count_total
+from app.db.upsert import dialect_insert
 from app.models.stock import Stock
 from app.models.location import Location
 from app.repositories import location_repo
@@ -36,6 +38,18 @@ def select_by_product_and_location_id(*, product_id: int, location_id: int):
     )
 
 
+def _filtered(stmt, *, product_id: int | None, location: str | None, order_dir: str | None):
+    filters = []
+    if product_id is not None:
+        filters.append(Stock.product_id == product_id)
+    if location:
+        filters.append(Location.code.ilike(f"%{location}%"))
+    stmt = stmt.where(*filters)
+    if order_dir == "desc":
+        return stmt.order_by(Stock.id.desc())
+    return stmt.order_by(Stock.id.asc())
+
+
 def list_stocks(
     db: Session,
     *,
@@ -44,25 +58,30 @@ def list_stocks(
     order_dir: str | None = "asc",
     limit: int = 50,
     offset: int = 0,
-) -> Tuple[Iterable[Stock], int]:
+    with_total: TotalMode = TotalMode.EXACT,
+) -> Tuple[Iterable[Stock], int | None]:
     stmt = select(Stock)
-    filters = []
-    if product_id is not None:
-        filters.append(Stock.product_id == product_id)
     if location:
         stmt = stmt.join(Location, Stock.location_id == Location.id)
-        filters.append(Location.code.ilike(f"%{location}%"))
-
-    stmt = stmt.where(*filters)
-    if order_dir == "desc":
-        stmt = stmt.order_by(Stock.id.desc())
-    else:
-        stmt = stmt.order_by(Stock.id.asc())
-    total = db.scalar(select(func.count()).select_from(stmt.subquery())) or 0
+    stmt = _filtered(stmt, product_id=product_id, location=location, order_dir=order_dir)
+    total = count_total(db, stmt, with_total)
     items = db.scalars(stmt.offset(offset).limit(limit)).all()
     return items, total
 
 
+def select_for_export(*, product_id: int | None = None, location: str | None = None, order_dir: str | None = "asc"):
+    stmt = select(
+        Stock.id,
+        Stock.product_id,
+        Stock.location_id,
+        Location.code.label("location"),
+        Stock.quantity,
+        Stock.created_at,
+        Stock.updated_at,
+    ).join(Location, Stock.location_id == Location.id)
+    return _filtered(stmt, product_id=product_id, location=location, order_dir=order_dir)
+
+
 def create_stock(
     db: Session,
     *,
@@ -116,3 +135,59 @@ def adjust_stock_quantity(db: Session, stock: Stock, delta: int, commit: bool =
         db.flush()
 
     return stock
+
+
+def upsert_stock(db: Session, *, product_id: int, location_id: int, delta: int = 0) -> Stock:
+    """
+    INSERT ... ON CONFLICT (product_id, location_id) DO UPDATE quantity = quantity + delta ... RETURNING.
+    Crea la fila si no existe y, si existe, la deja bloqueada hasta el commit. Sin commit.
+    """
+    stmt = dialect_insert(db, Stock).values(product_id=product_id, location_id=location_id, quantity=delta)
+    set_ = {"quantity": Stock.quantity + stmt.excluded.quantity}
+    if delta:
+        set_["updated_at"] = func.now()
+    stmt = stmt.on_conflict_do_update(index_elements=["product_id", "location_id"], set_=set_)
+    return db.scalars(
+        stmt.returning(Stock).execution_options(populate_existing=True)
+    ).one()
+
+
+def ensure_stocks(db: Session, keys: Iterable[tuple[int, int]]) -> None:
+    # Crea con cantidad 0 los pares (producto, ubicacion) que falten; seguro ante workers concurrentes
+    rows = [{"product_id": product_id, "location_id": location_id, "quantity": 0} for product_id, location_id in keys]
+    if not rows:
+        return
+    db.execute(
+        dialect_insert(db, Stock)
+        .values(rows)
+        .on_conflict_do_nothing(index_elements=["product_id", "location_id"])
+    )
+
+
+def apply_delta(
+    db: Session,
+    *,
+    product_id: int,
+    location_id: int,
+    delta: int,
+    allow_negative: bool = False,
+) -> Stock | None:
+    """
+    Aplica quantity = quantity + delta en una sola sentencia, sin leer antes el stock
+    (no hay lost updates entre peticiones concurrentes). Sin commit.
+    Las entradas usan el upsert (crean la fila si falta); las salidas un UPDATE con guarda.
+    Devuelve None cuando la cantidad resultante seria negativa.
+    """
+    if delta >= 0 or allow_negative:
+        return upsert_stock(db, product_id=product_id, location_id=location_id, delta=delta)
+    return db.scalars(
+        update(Stock)
+        .where(
+            Stock.product_id == product_id,
+            Stock.location_id == location_id,
+            Stock.quantity + delta >= 0,
+        )
+        .values(quantity=Stock.quantity + delta)
+        .returning(Stock)
+        .execution_options(synchronize_session=False, populate_existing=True)
+    ).first()
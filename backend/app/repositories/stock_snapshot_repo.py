@@ -0,0 +1,160 @@
+from datetime import date, timedelta
+
+from sqlalchemy import delete, func, insert, literal, select, union_all
+from sqlalchemy.orm import Session
+
+from app.models.movement import Movement
+from app.models.movement_daily_agg import MovementDailyAgg
+from app.models.stock import Stock
+from app.models.stock_snapshot import StockSnapshot
+from app.repositories import movement_agg_repo, watermark_repo
+
+
+SNAPSHOT_WATERMARK = "stock_snapshots"
+SNAPSHOT_FLOOR = "stock_snapshots_from"
+
+
+def _delta_after(db: Session, day: date):
+    # Suma de deltas por producto/ubicacion posteriores al cierre de day (rollup para dias consolidados)
+    next_day = day + timedelta(days=1)
+    rolled = movement_agg_repo.rolled_until(db)
+    raw_from = next_day if rolled is None or rolled <= next_day else rolled
+    parts = [
+        select(Movement.product_id, Movement.location_id, Movement.delta.label("delta")).where(
+            Movement.location_id.isnot(None),
+            Movement.created_at >= movement_agg_repo.day_start(raw_from),
+        )
+    ]
+    if raw_from > next_day:
+        parts.append(
+            select(MovementDailyAgg.product_id, MovementDailyAgg.location_id, MovementDailyAgg.delta).where(
+                MovementDailyAgg.location_id.isnot(None),
+                MovementDailyAgg.day >= next_day,
+                MovementDailyAgg.day < raw_from,
+            )
+        )
+    src = union_all(*parts).subquery("delta_src")
+    return (
+        select(src.c.product_id, src.c.location_id, func.sum(src.c.delta).label("delta"))
+        .group_by(src.c.product_id, src.c.location_id)
+        .subquery("delta_after")
+    )
+
+
+def live_balances(db: Session, day: date):
+    """(product_id, location_id, quantity) al cierre de day: stock actual menos los deltas posteriores."""
+    after = _delta_after(db, day)
+    return select(
+        Stock.product_id,
+        Stock.location_id,
+        (Stock.quantity - func.coalesce(after.c.delta, 0)).label("quantity"),
+    ).join(
+        after,
+        (after.c.product_id == Stock.product_id) & (after.c.location_id == Stock.location_id),
+        isouter=True,
+    )
+
+
+def live_totals(
+    db: Session,
+    days: list[date],
+    *,
+    product_id: int | None = None,
+    location_id: int | None = None,
+) -> dict[date, int]:
+    """
+    Stock total al cierre de cada dia de days (mismo resultado que sumar live_balances dia a dia) con
+    dos consultas: el stock actual y los deltas posteriores a cada dia en un solo GROUP BY.
+    """
+    if not days:
+        return {}
+    stock_filters = []
+    if product_id is not None:
+        stock_filters.append(Stock.product_id == product_id)
+    if location_id is not None:
+        stock_filters.append(Stock.location_id == location_id)
+    current = int(db.scalar(select(func.coalesce(func.sum(Stock.quantity), 0)).where(*stock_filters)) or 0)
+
+    # Una fila por dia con sus limites: movements crudos desde raw_from y rollup en [next_day, rolled)
+    rolled = movement_agg_repo.rolled_until(db)
+    bounds = []
+    for day in days:
+        next_day = day + timedelta(days=1)
+        raw_from = next_day if rolled is None or rolled <= next_day else rolled
+        bounds.append(
+            select(
+                literal(day, StockSnapshot.day.type).label("day"),
+                literal(next_day, StockSnapshot.day.type).label("next_day"),
+                literal(movement_agg_repo.day_start(raw_from), Movement.created_at.type).label("raw_from"),
+            )
+        )
+    trend_days = (union_all(*bounds) if len(bounds) > 1 else bounds[0]).subquery("trend_days")
+
+    # Solo deltas de pares con fila en stocks, como el LEFT JOIN de live_balances
+    in_stock = (Stock.product_id == Movement.product_id) & (Stock.location_id == Movement.location_id)
+    parts = [
+        select(trend_days.c.day, Movement.delta.label("delta"))
+        .join(Movement, Movement.created_at >= trend_days.c.raw_from)
+        .join(Stock, in_stock)
+        .where(*stock_filters)
+    ]
+    if rolled is not None and days[0] + timedelta(days=1) < rolled:
+        agg_in_stock = (Stock.product_id == MovementDailyAgg.product_id) & (
+            Stock.location_id == MovementDailyAgg.location_id
+        )
+        parts.append(
+            select(trend_days.c.day, MovementDailyAgg.delta)
+            .join(
+                MovementDailyAgg,
+                (MovementDailyAgg.day >= trend_days.c.next_day) & (MovementDailyAgg.day < rolled),
+            )
+            .join(Stock, agg_in_stock)
+            .where(*stock_filters)
+        )
+    src = (union_all(*parts) if len(parts) > 1 else parts[0]).subquery("delta_src")
+    deltas = dict(db.execute(select(src.c.day, func.sum(src.c.delta)).group_by(src.c.day)).all())
+    return {day: current - int(deltas.get(day) or 0) for day in days}
+
+
+def snapshot_day(db: Session, day: date) -> None:
+    # Idempotente: borra y reescribe el dia con un INSERT ... SELECT (sin commit)
+    balances = live_balances(db, day).subquery()
+    db.execute(delete(StockSnapshot).where(StockSnapshot.day == day))
+    db.execute(
+        insert(StockSnapshot).from_select(
+            ["day", "product_id", "location_id", "quantity"],
+            select(literal(day, StockSnapshot.day.type), balances.c.product_id, balances.c.location_id, balances.c.quantity),
+        )
+    )
+
+
+def covered_days(db: Session) -> tuple[date | None, date | None]:
+    """[desde, hasta) de los dias con snapshot; (None, None) si aun no hay ninguno."""
+    floor = watermark_repo.get(db, SNAPSHOT_FLOOR)
+    until = watermark_repo.get(db, SNAPSHOT_WATERMARK)
+    if floor is None or until is None or floor.watermark_at is None or until.watermark_at is None:
+        return None, None
+    return floor.watermark_at.date(), until.watermark_at.date()
+
+
+def set_covered_days(db: Session, *, floor: date | None = None, until: date | None = None, commit: bool = True) -> None:
+    if floor is not None:
+        watermark_repo.set_watermark(db, SNAPSHOT_FLOOR, watermark_at=movement_agg_repo.day_start(floor), commit=False)
+    if until is not None:
+        watermark_repo.set_watermark(db, SNAPSHOT_WATERMARK, watermark_at=movement_agg_repo.day_start(until), commit=False)
+    if commit:
+        db.commit()
+
+
+def is_covered(db: Session, day: date) -> bool:
+    floor, until = covered_days(db)
+    return floor is not None and floor <= day < until
+
+
+def balances_on(db: Session, day: date):
+    """Stock al cierre de day: del snapshot si existe (O(productos)) o calculado desde el stock actual."""
+    if is_covered(db, day):
+        return select(StockSnapshot.product_id, StockSnapshot.location_id, StockSnapshot.quantity).where(
+            StockSnapshot.day == day
+        )
+    return live_balances(db, day)
@@ -0,0 +1,34 @@
+from datetime import datetime
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app.models.task_watermark import TaskWatermark
+
+
+def get(db: Session, name: str) -> TaskWatermark | None:
+    return db.scalar(select(TaskWatermark).where(TaskWatermark.name == name))
+
+
+def set_watermark(
+    db: Session,
+    name: str,
+    *,
+    watermark_at: datetime | None = None,
+    watermark_id: int | None = None,
+    commit: bool = True,
+) -> TaskWatermark:
+    row = get(db, name)
+    if row is None:
+        row = TaskWatermark(name=name)
+    if watermark_at is not None:
+        row.watermark_at = watermark_at
+    if watermark_id is not None:
+        row.watermark_id = watermark_id
+    db.add(row)
+    if commit:
+        db.commit()
+        db.refresh(row)
+    else:
+        db.flush()
+    return row
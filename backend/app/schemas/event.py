@@ -1,6 +1,6 @@
 from datetime import datetime
 
-from pydantic import BaseModel, ConfigDict, Field
+from pydantic import BaseModel, ConfigDict, Field, field_validator
 
 from app.models.enums import EventType
 
@@ -12,6 +12,15 @@ class EventCreate(BaseModel):
     source: str = Field(default="sensor_simulado", examples=["sensor_simulado"])
     location: str = Field("default", min_length=1, max_length=100, examples=["ALM-CENTRAL"])
     idempotency_key: str = Field(..., min_length=1, max_length=100, examples=["evt-001"])
+
+    @field_validator("location")
+    @classmethod
+    def normalize_location(cls, v: str) -> str:
+        normalized = v.strip()
+        if not normalized:
+            raise ValueError("La ubicación no puede estar vacía")
+        return normalized
+
     model_config = ConfigDict(
         json_schema_extra={
             "example": {
@@ -50,3 +59,46 @@ class EventResponse(BaseModel):
             }
         },
     )
+
+
+class EventBatchCreate(BaseModel):
+    items: list[EventCreate] = Field(..., min_length=1, max_length=500)
+    model_config = ConfigDict(
+        json_schema_extra={
+            "example": {
+                "items": [
+                    {
+                        "event_type": "SENSOR_IN",
+                        "product_id": 1,
+                        "delta": 3,
+                        "source": "sensor_simulado",
+                        "location": "ALM-CENTRAL",
+                        "idempotency_key": "evt-001",
+                    },
+                    {
+                        "event_type": "SENSOR_OUT",
+                        "product_id": 2,
+                        "delta": 1,
+                        "source": "sensor_simulado",
+                        "location": "ALM-NORTE",
+                        "idempotency_key": "evt-002",
+                    },
+                ]
+            }
+        }
+    )
+
+
+class EventBatchItemResult(BaseModel):
+    index: int
+    idempotency_key: str
+    status: str  # CREATED | DUPLICATE | ERROR
+    event: EventResponse | None = None
+    detail: str | None = None
+
+
+class EventBatchResponse(BaseModel):
+    items: list[EventBatchItemResult]
+    created: int
+    duplicates: int
+    errors: int
@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-from datetime import datetime
+from datetime import date, datetime
 
 class TopConsumedItem(BaseModel):
     product_id: int
@@ -29,3 +29,26 @@ class TurnoverResponse(BaseModel):
     total: int
     limit: int
     offset: int
+
+class StockOnDateItem(BaseModel):
+    product_id: int
+    sku: str
+    name: str
+    quantity: int
+
+class StockOnDateResponse(BaseModel):
+    items: list[StockOnDateItem]
+    total: int
+    limit: int
+    offset: int
+    day: date
+    location: str | None = None
+
+class StockTrendPoint(BaseModel):
+    day: date
+    quantity: int
+
+class StockTrendResponse(BaseModel):
+    items: list[StockTrendPoint]
+    product_id: int | None = None
+    location: str | None = None
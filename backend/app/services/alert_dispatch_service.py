@@ -0,0 +1,177 @@
+import logging
+import os
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from typing import Iterable
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app.models.alert import Alert
+from app.models.enums import AlertType, OutboxStatus
+from app.models.location import Location
+from app.models.notification_outbox import NotificationOutbox
+from app.models.product import Product
+from app.models.stock import Stock
+from app.repositories import notification_outbox_repo
+from app.schemas.alert import AlertResponse
+from app.services import fcm_service
+from app.services.notification_service import send_stock_alert_digest, smtp_configured
+from app.ws.alerts_ws import publish_alert
+
+
+logger = logging.getLogger("app.notifications")
+
+
+def _max_attempts() -> int:
+    return int(os.getenv("NOTIFICATION_OUTBOX_MAX_ATTEMPTS", "5"))
+
+
+def _backoff(attempts: int) -> timedelta:
+    # Exponencial desde NOTIFICATION_OUTBOX_BACKOFF_SECONDS, con tope: un corte breve no agota los intentos
+    base = float(os.getenv("NOTIFICATION_OUTBOX_BACKOFF_SECONDS", "30"))
+    cap = float(os.getenv("NOTIFICATION_OUTBOX_BACKOFF_MAX_SECONDS", "3600"))
+    return timedelta(seconds=min(base * 2 ** max(attempts - 1, 0), cap))
+
+
+def _fan_out(
+    db: Session,
+    entries: list[NotificationOutbox],
+    alerts: list[Alert],
+    stock_info: dict[int, tuple],
+) -> list[str]:
+    """
+    Envia cada canal solo a las entradas que aun no lo tienen entregado y devuelve los errores de
+    los canales configurados que fallaron (lista vacia si todo salio).
+    """
+    now = datetime.now(timezone.utc)
+    by_alert: dict[int, list[NotificationOutbox]] = defaultdict(list)
+    for entry in entries:
+        by_alert[entry.alert_id].append(entry)
+    errors = []
+
+    for alert in alerts:
+        pending = [entry for entry in by_alert[alert.id] if entry.published_at is None]
+        if not pending:
+            continue
+        try:
+            publish_alert(AlertResponse.model_validate(alert))
+        except Exception as exc:
+            # El WebSocket es best-effort (clientes conectados en ese momento): no bloquea el outbox
+            logger.warning("alert websocket publish failed alert_id=%s: %s", alert.id, exc)
+            continue
+        for entry in pending:
+            entry.published_at = now
+
+    # Email: un unico resumen con todas las alertas de stock de la ventana que aun no salieron por email
+    email_alerts = [
+        alert
+        for alert in alerts
+        if alert.alert_type in (AlertType.LOW_STOCK, AlertType.OUT_OF_STOCK)
+        and alert.stock_id in stock_info
+        and not alert.notification_sent
+    ]
+    items = []
+    for alert in email_alerts:
+        product_id, product_name, location_code = stock_info[alert.stock_id]
+        items.append(
+            {
+                "alert_type": alert.alert_type,
+                "product_id": product_id,
+                "product_name": product_name,
+                "location": location_code,
+                "quantity": alert.quantity,
+                "min_quantity": alert.min_quantity,
+            }
+        )
+    if items:
+        # Los emails del resumen que ya salieron no se repiten: se marcan sus alertas
+        delivered = send_stock_alert_digest(items)
+        sent_at = datetime.utcnow()
+        for alert in email_alerts[:delivered]:
+            alert.notification_sent = True
+            alert.notification_sent_at = sent_at
+            alert.notification_channel = "email"
+        if delivered < len(items) and smtp_configured():
+            # Sin SMTP configurado no hay nada que reintentar
+            errors.append("fallo el envio del email resumen")
+
+    push_alerts = [alert for alert in alerts if any(entry.pushed_at is None for entry in by_alert[alert.id])]
+    if push_alerts:
+        if fcm_service.send_alert_pushes(db, push_alerts, stock_info):
+            for alert in push_alerts:
+                for entry in by_alert[alert.id]:
+                    entry.pushed_at = now
+        else:
+            errors.append("no se entrego ningun push del lote")
+    return errors
+
+
+def dispatch_pending(
+    db: Session,
+    *,
+    batch_size: int,
+    coalesce_seconds: float = 0,
+    exclude_ids: Iterable[int] = (),
+) -> dict:
+    """
+    Reclama un lote del outbox (solo filas con mas de `coalesce_seconds` de antiguedad,
+    para agrupar rafagas, y cuyo backoff ya vencio) y envia WebSocket, un email resumen y
+    los push FCM del lote. Todo el lote se confirma con un unico commit.
+    `failed_ids` permite al llamador no volver a reclamar en la misma ejecucion lo que fallo.
+    """
+    created_before = None
+    if coalesce_seconds > 0:
+        created_before = datetime.now(timezone.utc) - timedelta(seconds=coalesce_seconds)
+    entries = notification_outbox_repo.claim_pending(
+        db, limit=batch_size, created_before=created_before, exclude_ids=exclude_ids
+    )
+    if not entries:
+        db.commit()
+        return {"claimed": 0, "sent": 0, "failed": 0, "failed_ids": []}
+
+    alert_ids = [entry.alert_id for entry in entries]
+    alerts = list(db.scalars(select(Alert).where(Alert.id.in_(alert_ids)).order_by(Alert.id)).all())
+    stock_ids = {alert.stock_id for alert in alerts if alert.stock_id is not None}
+    stock_info: dict[int, tuple] = {}
+    if stock_ids:
+        rows = db.execute(
+            select(Stock.id, Product.id, Product.name, Location.code)
+            .join(Product, Stock.product_id == Product.id)
+            .join(Location, Stock.location_id == Location.id)
+            .where(Stock.id.in_(stock_ids))
+        ).all()
+        stock_info = {row[0]: (row[1], row[2], row[3]) for row in rows}
+
+    now = datetime.now(timezone.utc)
+    try:
+        errors = _fan_out(db, entries, alerts, stock_info)
+    except Exception as exc:
+        errors = [str(exc)]
+
+    if errors:
+        # Sin rollback: los canales ya entregados quedan marcados y no se reenvian al reintentar
+        logger.warning("outbox batch failed: %s", "; ".join(errors))
+        for entry in entries:
+            entry.attempts += 1
+            entry.last_error = "; ".join(errors)[:255]
+            if entry.attempts >= _max_attempts():
+                entry.status = OutboxStatus.ERROR
+            else:
+                entry.next_attempt_at = now + _backoff(entry.attempts)
+        db.commit()
+        return {
+            "claimed": len(entries),
+            "sent": 0,
+            "failed": len(entries),
+            "failed_ids": [entry.id for entry in entries],
+        }
+
+    for entry in entries:
+        entry.attempts += 1
+        entry.status = OutboxStatus.SENT
+        entry.sent_at = now
+        entry.next_attempt_at = None
+        entry.last_error = None
+    db.commit()
+    return {"claimed": len(entries), "sent": len(entries), "failed": 0, "failed_ids": []}
@@ -1,8 +1,11 @@
 import os
+import threading
+import time
+from collections import defaultdict
 from typing import Iterable
 
 import firebase_admin
-from firebase_admin import credentials, messaging
+from firebase_admin import credentials, exceptions, messaging
 
 from app.models.alert import Alert
 from app.models.enums import AlertType, UserRole
@@ -16,6 +19,20 @@ from sqlalchemy import select
 
 _app = None
 
+# send_each admite como maximo 500 mensajes por llamada
+FCM_BATCH_LIMIT = 500
+
+# Tokens por conjunto de roles, cacheados FCM_TOKEN_CACHE_SECONDS
+_token_cache: dict[frozenset, tuple[float, list[str]]] = {}
+_token_cache_lock = threading.Lock()
+
+_ALERT_TITLES = {
+    AlertType.LOW_STOCK: "Stock bajo",
+    AlertType.OUT_OF_STOCK: "Stock agotado",
+    AlertType.LARGE_MOVEMENT: "Movimiento grande",
+    AlertType.IMPORT_ISSUES: "Importación con errores",
+}
+
 
 def _init_firebase() -> bool:
     global _app
@@ -36,70 +53,137 @@ def _init_firebase() -> bool:
 
 
 def _send_to_tokens(tokens: Iterable[str], title: str, body: str, data: dict[str, str] | None = None) -> None:
+    tokens = list(tokens)
     if not tokens:
         return
     if not _init_firebase():
         return
-    msg = messaging.MulticastMessage(
-        notification=messaging.Notification(title=title, body=body),
-        tokens=list(tokens),
-        data=data or {},
-    )
-    try:
-        messaging.send_each_for_multicast(msg)
-    except Exception:
-        pass
+    notification = messaging.Notification(title=title, body=body)
+    _send_each([messaging.Message(notification=notification, token=token, data=data or {}) for token in tokens])
+
+
+def _tokens_for_roles(db: Session, roles: set[UserRole]) -> list[str]:
+    ttl = float(os.getenv("FCM_TOKEN_CACHE_SECONDS", "60"))
+    key = frozenset(roles)
+    now = time.monotonic()
+    with _token_cache_lock:
+        cached = _token_cache.get(key)
+        if cached is not None and now - cached[0] < ttl:
+            return cached[1]
+    tokens = fcm_token_repo.list_tokens_for_roles(db, roles)
+    with _token_cache_lock:
+        _token_cache[key] = (now, tokens)
+    return tokens
 
 
-def send_alert_push(db: Session, alert: Alert) -> None:
-    alert_type = alert.alert_type
-    if alert_type not in {
-        AlertType.LOW_STOCK,
-        AlertType.OUT_OF_STOCK,
-        AlertType.LARGE_MOVEMENT,
-        AlertType.IMPORT_ISSUES,
-    }:
-        return
+def invalidate_token_cache() -> None:
+    with _token_cache_lock:
+        _token_cache.clear()
 
-    roles = {UserRole.ADMIN, UserRole.MANAGER}
-    if alert_type in {AlertType.LOW_STOCK, AlertType.OUT_OF_STOCK}:
-        roles.add(UserRole.USER)
 
-    title = {
-        AlertType.LOW_STOCK: "Stock bajo",
-        AlertType.OUT_OF_STOCK: "Stock agotado",
-        AlertType.LARGE_MOVEMENT: "Movimiento grande",
-        AlertType.IMPORT_ISSUES: "Importación con errores",
-    }[alert_type]
+# Respuestas permanentes: el token no vale y reintentar no sirve de nada
+_STALE_TOKEN_ERRORS = (messaging.UnregisteredError, exceptions.InvalidArgumentError)
 
-    body = _build_alert_body(db, alert)
-    tokens = fcm_token_repo.list_tokens_for_roles(db, roles)
-    _send_to_tokens(tokens, title, body, data={"alert_type": alert_type.value})
 
+def _send_each(messages: list, db: Session | None = None) -> bool:
+    """
+    False solo si no se entrego ningun mensaje y alguno fallo por un error transitorio (transporte,
+    cuota, servidor). Los tokens caducados o invalidos no cuentan para reintentar: con db se borran.
+    """
+    if not messages or not _init_firebase():
+        return True
+    delivered = 0
+    retryable = 0
+    stale: set[str] = set()
+    for start in range(0, len(messages), FCM_BATCH_LIMIT):
+        chunk = messages[start:start + FCM_BATCH_LIMIT]
+        try:
+            response = messaging.send_each(chunk)
+        except Exception:
+            retryable += len(chunk)
+            continue
+        delivered += response.success_count
+        for message, result in zip(chunk, response.responses):
+            if result.success:
+                continue
+            if isinstance(result.exception, _STALE_TOKEN_ERRORS):
+                stale.add(message.token)
+            else:
+                retryable += 1
+    if stale and db is not None:
+        fcm_token_repo.delete_tokens(db, stale, commit=False)
+        invalidate_token_cache()
+    return delivered > 0 or retryable == 0
+
+
+def _alert_roles(alert_type: AlertType) -> set[UserRole]:
+    roles = {UserRole.ADMIN, UserRole.MANAGER}
+    if alert_type in {AlertType.LOW_STOCK, AlertType.OUT_OF_STOCK}:
+        roles.add(UserRole.USER)
+    return roles
+
+
+def send_alert_pushes(db: Session, alerts: list[Alert], stock_info: dict[int, tuple] | None = None) -> bool:
+    """
+    Envia las alertas de un lote con send_each. Si un tipo supera FCM_DIGEST_THRESHOLD alertas
+    se manda un unico push resumen para ese tipo.
+    stock_info: stock_id -> (product_id, product_name, location_code) ya cargado por el llamador.
+    Devuelve False si el lote entero fallo por errores transitorios (ver _send_each).
+    """
+    by_type: dict[AlertType, list[Alert]] = defaultdict(list)
+    for alert in alerts:
+        if alert.alert_type in _ALERT_TITLES:
+            by_type[alert.alert_type].append(alert)
+    if not by_type:
+        return True
 
-def _build_alert_body(db: Session, alert: Alert) -> str:
+    digest_threshold = int(os.getenv("FCM_DIGEST_THRESHOLD", "5"))
+    messages = []
+    for alert_type, group in by_type.items():
+        tokens = _tokens_for_roles(db, _alert_roles(alert_type))
+        if not tokens:
+            continue
+        title = _ALERT_TITLES[alert_type]
+        data = {"alert_type": alert_type.value}
+        if len(group) > digest_threshold:
+            payloads = [(title, f"{len(group)} alertas nuevas", {**data, "count": str(len(group))})]
+        else:
+            payloads = [(title, _build_alert_body(db, alert, stock_info), data) for alert in group]
+        for push_title, body, push_data in payloads:
+            notification = messaging.Notification(title=push_title, body=body)
+            messages.extend(
+                messaging.Message(notification=notification, token=token, data=push_data) for token in tokens
+            )
+    return _send_each(messages, db)
+
+
+def _build_alert_body(db: Session, alert: Alert, stock_info: dict[int, tuple] | None = None) -> str:
     if alert.alert_type == AlertType.IMPORT_ISSUES:
         return f"Se detectaron {alert.quantity} incidencias en la importación."
     if alert.stock_id is None:
         return "Se generó una alerta de stock."
 
-    row = db.execute(
-        select(Stock, Product, Location)
-        .join(Product, Stock.product_id == Product.id)
-        .join(Location, Stock.location_id == Location.id)
-        .where(Stock.id == alert.stock_id)
-    ).first()
-    if not row:
-        return f"Cantidad: {alert.quantity}"
+    if stock_info is not None and alert.stock_id in stock_info:
+        product_id, product_name, location_code = stock_info[alert.stock_id]
+    else:
+        row = db.execute(
+            select(Product.id, Product.name, Location.code)
+            .select_from(Stock)
+            .join(Product, Stock.product_id == Product.id)
+            .join(Location, Stock.location_id == Location.id)
+            .where(Stock.id == alert.stock_id)
+        ).first()
+        if not row:
+            return f"Cantidad: {alert.quantity}"
+        product_id, product_name, location_code = row
 
-    stock, product, location = row
     if alert.alert_type == AlertType.LOW_STOCK:
-        return f"{product.name} ({product.id}) en {location.code}: {alert.quantity} (min {alert.min_quantity})"
+        return f"{product_name} ({product_id}) en {location_code}: {alert.quantity} (min {alert.min_quantity})"
     if alert.alert_type == AlertType.OUT_OF_STOCK:
-        return f"{product.name} ({product.id}) en {location.code}: agotado"
+        return f"{product_name} ({product_id}) en {location_code}: agotado"
     if alert.alert_type == AlertType.LARGE_MOVEMENT:
-        return f"{product.name} ({product.id}) en {location.code}: {alert.quantity} uds"
-    return f"{product.name} ({product.id})"
+        return f"{product_name} ({product_id}) en {location_code}: {alert.quantity} uds"
+    return f"{product_name} ({product_id})"
 
 
 def send_import_completed_push(db: Session, *, total_rows: int, error_rows: int, review_rows: int) -> None:
@@ -109,5 +193,5 @@ def send_import_completed_push(db: Session, *, total_rows: int, error_rows: int,
     roles = {UserRole.ADMIN, UserRole.MANAGER}
     title = "Importación completada"
     body = f"Lote procesado. OK: {max(0, total_rows - error_rows - review_rows)} · Errores: {error_rows} · Reviews: {review_rows}"
-    tokens = fcm_token_repo.list_tokens_for_roles(db, roles)
+    tokens = _tokens_for_roles(db, roles)
     _send_to_tokens(tokens, title, body, data={"alert_type": "IMPORT_COMPLETED"})
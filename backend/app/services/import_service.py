@@ -0,0 +1,1180 @@
+import codecs
+import csv
+import hashlib
+import io
+import logging
+import os
+import shutil
+import zlib
+import uuid
+from datetime import datetime, timedelta, timezone
+from itertools import islice
+from pathlib import Path
+from typing import Any, BinaryIO, Callable, Iterable
+
+from sqlalchemy import func, insert, or_, select, tuple_, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app.cache.redis_cache import cache_invalidate_prefix
+from app.db.upsert import dialect_insert
+from app.models import ImportBatch, ImportError, ImportPartition, ImportReview
+from app.models.alert import Alert
+from app.models.category import Category
+from app.models.enums import ActionType, AlertStatus, AlertType, Entity, ImportStatus, MovementType, Source
+from app.models.location import Location
+from app.models.movement import Movement
+from app.models.product import Product
+from app.models.stock import Stock
+from app.models.stock_threshold import StockThreshold
+from app.repositories import alert_repo, audit_log_repo, product_repo, stock_repo
+from app.services import fcm_service, inventory_service, product_match_service
+from app.ws.alerts_ws import publish_import_progress
+
+
+logger = logging.getLogger("app.imports")
+
+_ROOT_DIR = Path(__file__).resolve().parents[2]
+
+REQUIRED_COLUMNS = {
+    "EVENTS": {"type", "sku", "barcode", "name", "category_id", "location_id", "quantity"},
+    "TRANSFERS": {"sku", "barcode", "name", "category_id", "from_location_id", "to_location_id", "quantity"},
+}
+
+# Columna con el numero de fila original en los ficheros de particion
+PARTITION_COLUMN = "_row_number"
+
+# Listados que cambian cuando un lote aplica filas
+CACHE_PREFIXES = (
+    "movements:list",
+    "stocks:list",
+    "stocks:detail",
+    "products:list",
+    "reports:top-consumed",
+    "reports:turnover",
+    "reports:stock-on-date",
+    "reports:stock-trend",
+)
+
+
+class ImportFileError(Exception):
+    """Fichero CSV no procesable (vacio, codificacion o cabecera)."""
+    pass
+
+
+class DuplicateImportError(Exception):
+    """Otro lote real con el mismo contenido se registro a la vez (indice unico kind + content_hash)."""
+
+    def __init__(self, batch: ImportBatch) -> None:
+        super().__init__("duplicate_import")
+        self.batch = batch
+
+
+class ImportOutcome:
+    """
+    Contadores de un lote; collect guarda tambien una muestra (IMPORT_RESPONSE_SAMPLE) de errores y
+    reviews para la respuesta. El detalle completo queda en ImportError/ImportReview.
+    """
+
+    def __init__(self, *, collect: bool = False) -> None:
+        self.collect = collect
+        self.sample = response_sample() if collect else 0
+        self.ok_rows = 0
+        self.error_rows = 0
+        self.review_rows = 0
+        self.errors: list[dict] = []
+        self.reviews: list[dict] = []
+
+    def error(self, row_number: int, code: str, message: str) -> None:
+        self.error_rows += 1
+        if len(self.errors) < self.sample:
+            self.errors.append({"row_number": row_number, "error_code": code, "message": message})
+
+    def review(self, row_number: int, reason: str, suggestions: dict | None) -> None:
+        self.review_rows += 1
+        if len(self.reviews) < self.sample:
+            self.reviews.append({"row_number": row_number, "reason": reason, "suggestions": suggestions})
+
+
+def storage_dir() -> Path:
+    # El worker de Celery debe ver el mismo directorio que la API (volumen compartido)
+    return Path(os.getenv("IMPORT_STORAGE_DIR") or _ROOT_DIR / "storage" / "imports")
+
+
+def async_min_bytes() -> int:
+    return int(os.getenv("IMPORT_ASYNC_MIN_BYTES", str(1024 * 1024)))
+
+
+def response_sample() -> int:
+    return max(int(os.getenv("IMPORT_RESPONSE_SAMPLE", "100")), 0)
+
+
+_READ_BLOCK = 1024 * 1024
+
+
+def inspect_upload(stream: BinaryIO) -> tuple[int, str]:
+    """
+    Tamano y SHA-256 del fichero comprobando por bloques que es UTF-8; deja el cursor al principio.
+    """
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        while block := stream.read(_READ_BLOCK):
+            size += len(block)
+            digest.update(block)
+            decoder.decode(block)
+        decoder.decode(b"", final=True)
+    except UnicodeDecodeError:
+        raise ImportFileError("CSV debe estar en UTF-8")
+    if not size:
+        raise ImportFileError("CSV vacio")
+    stream.seek(0)
+    return size, digest.hexdigest()
+
+
+def open_csv(stream: BinaryIO, kind: str) -> csv.DictReader:
+    # Decodifica y parte filas segun se leen: la memoria no depende del tamano del fichero
+    reader = csv.DictReader(io.TextIOWrapper(stream, encoding="utf-8-sig", newline=""))
+    if not reader.fieldnames:
+        raise ImportFileError("CSV sin cabecera")
+    missing = REQUIRED_COLUMNS[kind] - {name.strip() for name in reader.fieldnames}
+    if missing:
+        raise ImportFileError(f"Faltan columnas: {', '.join(sorted(missing))}")
+    return reader
+
+
+def _parse_int(value: str, *, field_name: str) -> int:
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"{field_name} debe ser un entero")
+
+
+def normalize_row(row: dict[str, Any]) -> dict[str, Any]:
+    return {k.strip(): (v.strip() if isinstance(v, str) else v) for k, v in row.items()}
+
+
+def chunk_rows() -> int:
+    return max(int(os.getenv("IMPORT_CHUNK_ROWS", "500")), 1)
+
+
+class _Lookup:
+    """
+    Referencias precargadas para un bloque de filas: categorias, ubicaciones y productos por sku
+    y barcode salen de unas pocas consultas IN (...); los duplicados difusos se buscan con un indice de trigramas.
+    Los productos que el bloque va a crear se registran aqui para que las filas siguientes los vean.
+    """
+
+    def __init__(
+        self,
+        db: Session,
+        parsed: Iterable[dict[str, Any]],
+        matcher: product_match_service.ProductMatcher | None = None,
+    ) -> None:
+        self.db = db
+        parsed = list(parsed)
+        category_ids = {data["category_id"] for data in parsed}
+        location_ids = {loc for data in parsed for loc in _location_ids(data)}
+        skus = {data["sku"] for data in parsed}
+        barcodes = {data["barcode"] for data in parsed}
+        self.category_ids = set(db.scalars(select(Category.id).where(Category.id.in_(category_ids))).all()) if category_ids else set()
+        self.location_ids = set(db.scalars(select(Location.id).where(Location.id.in_(location_ids))).all()) if location_ids else set()
+        products = (
+            db.scalars(select(Product).where(or_(Product.sku.in_(skus), Product.barcode.in_(barcodes)))).all()
+            if skus
+            else []
+        )
+        self.by_sku = {product.sku: product for product in products}
+        self.by_barcode = {product.barcode: product for product in products if product.barcode}
+        self.matcher = matcher or product_match_service.ProductMatcher(db)
+
+    def add_pending(self, product: Product) -> None:
+        self.by_sku[product.sku] = product
+        self.by_barcode[product.barcode] = product
+        self.matcher.add(product)
+
+
+def _suggestions(matches: list[tuple[float, Any]]) -> dict:
+    # Se construye al volcar el bloque: un producto creado en el mismo bloque ya tiene id
+    return {
+        "matches": [
+            {"product_id": c.id, "name": c.name, "sku": c.sku, "barcode": c.barcode, "similarity": round(ratio, 3)}
+            for ratio, c in matches
+        ]
+    }
+
+
+def _location_ids(data: dict[str, Any]) -> tuple[int, ...]:
+    if "location_id" in data:
+        return (data["location_id"],)
+    return data["from_location_id"], data["to_location_id"]
+
+
+def _parse_event_row(row: dict[str, Any]) -> dict[str, Any]:
+    movement_type = row.get("type", "").upper()
+    if movement_type not in {"IN", "OUT", "ADJUST"}:
+        raise ValueError("type invalido (IN/OUT/ADJUST)")
+
+    sku = row.get("sku", "")
+    barcode = row.get("barcode", "")
+    if not sku or not barcode:
+        raise ValueError("sku y barcode son obligatorios")
+
+    category_id = _parse_int(row.get("category_id"), field_name="category_id")
+    location_id = _parse_int(row.get("location_id"), field_name="location_id")
+    quantity = _parse_int(row.get("quantity"), field_name="quantity")
+
+    if movement_type in {"IN", "OUT"} and quantity <= 0:
+        raise ValueError("quantity debe ser > 0 para IN/OUT")
+    if movement_type == "ADJUST" and quantity == 0:
+        raise ValueError("quantity no puede ser 0 para ADJUST")
+
+    return {
+        "movement_type": movement_type,
+        "sku": sku,
+        "barcode": barcode,
+        "name": row.get("name", "") or None,
+        "category_id": category_id,
+        "location_id": location_id,
+        "quantity": quantity,
+    }
+
+
+def _parse_transfer_row(row: dict[str, Any]) -> dict[str, Any]:
+    sku = row.get("sku", "")
+    barcode = row.get("barcode", "")
+    if not sku or not barcode:
+        raise ValueError("sku y barcode son obligatorios")
+
+    category_id = _parse_int(row.get("category_id"), field_name="category_id")
+    from_location_id = _parse_int(row.get("from_location_id"), field_name="from_location_id")
+    to_location_id = _parse_int(row.get("to_location_id"), field_name="to_location_id")
+    quantity = _parse_int(row.get("quantity"), field_name="quantity")
+
+    if quantity <= 0:
+        raise ValueError("quantity debe ser > 0")
+    if from_location_id == to_location_id:
+        raise ValueError("from_location_id y to_location_id no pueden ser iguales")
+
+    return {
+        "sku": sku,
+        "barcode": barcode,
+        "name": row.get("name", "") or None,
+        "category_id": category_id,
+        "from_location_id": from_location_id,
+        "to_location_id": to_location_id,
+        "quantity": quantity,
+    }
+
+
+def _parse_row(kind: str, row: dict[str, Any]) -> dict[str, Any]:
+    # Solo formato; la existencia de categoria y ubicaciones se comprueba contra _Lookup
+    if kind == "EVENTS":
+        return _parse_event_row(row)
+    return _parse_transfer_row(row)
+
+
+def _check_references(kind: str, data: dict[str, Any], lookup: _Lookup) -> None:
+    if data["category_id"] not in lookup.category_ids:
+        raise ValueError("category_id no existe")
+    if kind == "EVENTS":
+        if data["location_id"] not in lookup.location_ids:
+            raise ValueError("location_id no existe")
+        return
+    if data["from_location_id"] not in lookup.location_ids:
+        raise ValueError("from_location_id no existe")
+    if data["to_location_id"] not in lookup.location_ids:
+        raise ValueError("to_location_id no existe")
+
+
+def _apply(db: Session, kind: str, *, product_id: int, data: dict[str, Any], user_id: int) -> None:
+    if kind == "TRANSFERS":
+        inventory_service.transfer_stock_by_location_id(
+            db,
+            product_id=product_id,
+            quantity=data["quantity"],
+            user_id=user_id,
+            from_location_id=data["from_location_id"],
+            to_location_id=data["to_location_id"],
+            source=Source.MANUAL,
+        )
+        return
+    apply_fn = {
+        "IN": inventory_service.increase_stock_by_location_id,
+        "OUT": inventory_service.decrease_stock_by_location_id,
+        "ADJUST": inventory_service.adjust_stock_by_location_id,
+    }[data["movement_type"]]
+    apply_fn(
+        db,
+        product_id=product_id,
+        quantity=data["quantity"],
+        user_id=user_id,
+        location_id=data["location_id"],
+        source=Source.MANUAL,
+    )
+
+
+def _resolve_product(
+    lookup: _Lookup,
+    *,
+    sku: str,
+    barcode: str,
+    name: str | None,
+    category_id: int,
+    fuzzy_threshold: float,
+) -> tuple[Product | None, str | None, list | None, bool]:
+    by_sku = lookup.by_sku.get(sku)
+    by_barcode = lookup.by_barcode.get(barcode)
+
+    if by_sku and by_barcode and by_sku is not by_barcode:
+        return None, "sku_barcode_conflict", None, False
+
+    product = by_sku or by_barcode
+    if product:
+        if product.sku != sku or (product.barcode or "") != barcode:
+            return None, "sku_barcode_mismatch", None, False
+        if product.category_id != category_id:
+            return None, "category_mismatch", None, False
+        return product, None, None, False
+
+    if not name:
+        return None, "missing_product_name", None, False
+
+    matches = lookup.matcher.similar(name, threshold=fuzzy_threshold)
+    if matches:
+        return None, "possible_duplicate", matches, False
+
+    return None, None, None, True
+
+
+def record_error(db: Session, batch_id: int, row_number: int, code: str, message: str, payload: dict) -> ImportError:
+    entry = ImportError(
+        batch_id=batch_id,
+        row_number=row_number,
+        error_code=code,
+        message=message,
+        payload=payload,
+    )
+    db.add(entry)
+    return entry
+
+
+def _record_review(
+    db: Session,
+    batch_id: int,
+    row_number: int,
+    reason: str,
+    payload: dict,
+    suggestions: dict | None = None,
+) -> ImportReview:
+    entry = ImportReview(
+        batch_id=batch_id,
+        row_number=row_number,
+        reason=reason,
+        payload=payload,
+        suggestions=suggestions,
+    )
+    db.add(entry)
+    return entry
+
+
+class _Row:
+    """Resultado de una fila del bloque; se vuelca en orden de fichero al terminar el bloque."""
+
+    def __init__(self, row_number: int, payload: dict) -> None:
+        self.row_number = row_number
+        self.payload = payload
+        self.data: dict[str, Any] | None = None
+        self.product: Product | None = None
+        self.error: tuple[str, str] | None = None
+        self.review: tuple[str, list | None] | None = None
+
+
+def _resolve_rows(
+    db: Session,
+    batch: ImportBatch,
+    rows: list[tuple[int, dict]],
+    matcher: product_match_service.ProductMatcher,
+) -> list[_Row]:
+    # Fase 1: valida todo el bloque en memoria contra las referencias precargadas
+    results = []
+    for row_number, raw_row in rows:
+        row = normalize_row(raw_row)
+        result = _Row(row_number, dict(row))
+        try:
+            result.data = _parse_row(batch.kind, row)
+        except ValueError as exc:
+            result.error = ("validation_error", str(exc))
+        results.append(result)
+
+    lookup = _Lookup(db, (r.data for r in results if r.data is not None), matcher)
+    for result in results:
+        data = result.data
+        if data is None:
+            continue
+        try:
+            _check_references(batch.kind, data, lookup)
+        except ValueError as exc:
+            result.error, result.data = ("validation_error", str(exc)), None
+            continue
+        product, product_issue, matches, would_create = _resolve_product(
+            lookup,
+            sku=data["sku"],
+            barcode=data["barcode"],
+            name=data["name"],
+            category_id=data["category_id"],
+            fuzzy_threshold=batch.fuzzy_threshold,
+        )
+        if product_issue:
+            result.review, result.data = (product_issue, matches), None
+            continue
+        if would_create and not batch.dry_run:
+            product = Product(
+                sku=data["sku"],
+                name=data["name"] or data["sku"],
+                barcode=data["barcode"],
+                category_id=data["category_id"],
+                active=True,
+            )
+            lookup.add_pending(product)
+        result.product = product
+    return results
+
+
+def _create_products(db: Session, results: list[_Row]) -> None:
+    # Un INSERT multi-fila para los productos nuevos; los que choquen con otro alta concurrente fallan la fila
+    pending = {id(r.product): r.product for r in results if r.product is not None and r.product.id is None}
+    if not pending:
+        return
+    db.execute(
+        dialect_insert(db, Product)
+        .values(
+            [
+                {"sku": p.sku, "name": p.name, "barcode": p.barcode, "category_id": p.category_id, "active": True}
+                for p in pending.values()
+            ]
+        )
+        .on_conflict_do_nothing()
+    )
+    stored = {
+        row.sku: row
+        for row in db.execute(
+            select(Product.id, Product.sku, Product.barcode, Product.category_id).where(
+                Product.sku.in_([p.sku for p in pending.values()])
+            )
+        ).all()
+    }
+    for product in pending.values():
+        row = stored.get(product.sku)
+        if row is not None and row.barcode == product.barcode and row.category_id == product.category_id:
+            product.id = row.id
+    for result in results:
+        if result.product is not None and result.product.id is None:
+            result.error, result.product = ("product_unique_conflict", "Producto duplicado"), None
+
+
+def _steps(kind: str, data: dict[str, Any]) -> list[tuple[int, int, MovementType, str]]:
+    # (location_id, delta, tipo, mensaje de stock insuficiente) en el orden en que se aplican
+    quantity = data["quantity"]
+    if kind == "TRANSFERS":
+        message = "Stock insuficiente en la ubicacion origen"
+        return [
+            (data["from_location_id"], -quantity, MovementType.OUT, message),
+            (data["to_location_id"], quantity, MovementType.IN, message),
+        ]
+    movement_type = MovementType(data["movement_type"])
+    if movement_type == MovementType.OUT:
+        return [(data["location_id"], -quantity, movement_type, "Stock insuficiente para la salida")]
+    return [(data["location_id"], quantity, movement_type, "Stock resultante no puede ser negativo")]
+
+
+def _apply_rows(db: Session, batch: ImportBatch, results: list[_Row]) -> None:
+    """
+    Fase 2: stocks, movimientos, auditoria y alertas del bloque con sentencias multi-fila.
+    Reproduce fila a fila las reglas de inventory_service (stock no negativo, alertas de agotado,
+    stock bajo, movimiento grande y transferencia) sobre las cantidades bloqueadas.
+    """
+    _create_products(db, results)
+    applicable = [r for r in results if r.product is not None]
+    if not applicable:
+        return
+
+    positive, keys = set(), set()
+    for result in applicable:
+        for location_id, delta, _, _ in _steps(batch.kind, result.data):
+            keys.add((result.product.id, location_id))
+            if delta > 0:
+                positive.add((result.product.id, location_id))
+    # Solo se crean filas de stock donde alguna fila suma; una salida sobre stock inexistente falla igual que antes
+    stock_repo.ensure_stocks(db, sorted(positive))
+    stocks = {
+        (stock.product_id, stock.location_id): stock
+        for stock in db.scalars(
+            select(Stock)
+            .where(tuple_(Stock.product_id, Stock.location_id).in_(sorted(keys)))
+            .order_by(Stock.product_id, Stock.location_id)
+            .with_for_update()
+        ).all()
+    }
+    product_ids = {product_id for product_id, _ in keys}
+    thresholds: dict[tuple[int, int | None], int] = {}
+    for threshold in db.scalars(select(StockThreshold).where(StockThreshold.product_id.in_(product_ids))).all():
+        thresholds.setdefault((threshold.product_id, threshold.location_id), threshold.min_quantity)
+    active = set(
+        db.execute(
+            select(Alert.stock_id, Alert.alert_type).where(
+                Alert.stock_id.in_([stock.id for stock in stocks.values()]),
+                Alert.alert_type.in_([AlertType.OUT_OF_STOCK, AlertType.LOW_STOCK]),
+                Alert.alert_status.in_([AlertStatus.PENDING, AlertStatus.ACK]),
+            )
+        ).all()
+    )
+    quantities = {key: stock.quantity for key, stock in stocks.items()}
+    large_movement = int(os.getenv("LARGE_MOVEMENT_THRESHOLD", "50"))
+
+    movements: list[dict] = []
+    alerts: list[dict] = []
+
+    def _alert(stock: Stock, alert_type: AlertType, quantity: int, min_quantity: int = 0) -> None:
+        alerts.append({"stock_id": stock.id, "quantity": quantity, "min_quantity": min_quantity, "alert_type": alert_type})
+
+    for result in applicable:
+        product_id = result.product.id
+        steps = _steps(batch.kind, result.data)
+        # Toda la fila o nada: una transferencia sin stock en origen no escribe el destino
+        failed = next(
+            (
+                message
+                for location_id, delta, _, message in steps
+                if (product_id, location_id) not in stocks or quantities[(product_id, location_id)] + delta < 0
+            ),
+            None,
+        )
+        if failed:
+            result.error, result.product = ("inventory_error", failed), None
+            continue
+
+        transfer_id = str(uuid.uuid4()) if batch.kind == "TRANSFERS" else None
+        for index, (location_id, delta, movement_type, _) in enumerate(steps):
+            key = (product_id, location_id)
+            stock = stocks[key]
+            quantities[key] += delta
+            quantity = quantities[key]
+            movements.append(
+                {
+                    "product_id": product_id,
+                    "quantity": result.data["quantity"],
+                    "delta": delta,
+                    "user_id": batch.user_id,
+                    "movement_type": movement_type,
+                    "movement_source": Source.MANUAL,
+                    "location_id": location_id,
+                    "transfer_id": transfer_id,
+                }
+            )
+            if quantity == 0 and (stock.id, AlertType.OUT_OF_STOCK) not in active:
+                active.add((stock.id, AlertType.OUT_OF_STOCK))
+                _alert(stock, AlertType.OUT_OF_STOCK, quantity)
+            min_quantity = thresholds.get(key, thresholds.get((product_id, None)))
+            if min_quantity is not None and quantity < min_quantity and (stock.id, AlertType.LOW_STOCK) not in active:
+                active.add((stock.id, AlertType.LOW_STOCK))
+                _alert(stock, AlertType.LOW_STOCK, quantity, min_quantity)
+            # En transferencias solo la salida cuenta como movimiento grande
+            if index == 0 and abs(delta) >= large_movement:
+                _alert(stock, AlertType.LARGE_MOVEMENT, abs(delta))
+        if transfer_id:
+            _alert(stocks[(product_id, steps[-1][0])], AlertType.TRANSFER_COMPLETE, result.data["quantity"])
+
+    for key, stock in stocks.items():
+        if quantities[key] != stock.quantity:
+            stock.quantity = quantities[key]
+    if movements:
+        movement_ids = db.scalars(insert(Movement).returning(Movement.id, sort_by_parameter_order=True), movements).all()
+        logs = []
+        for movement_id, movement in zip(movement_ids, movements):
+            details = (
+                f"movement_id={movement_id} product_id={movement['product_id']} "
+                f"delta={movement['delta']} type={movement['movement_type'].value}"
+            )
+            if movement["transfer_id"]:
+                details += f" transfer_id={movement['transfer_id']}"
+            logs.append({"entity": Entity.MOVEMENT, "action": ActionType.CREATE, "user_id": batch.user_id, "details": details})
+        audit_log_repo.create_logs_bulk(db, logs)
+    alert_repo.create_alerts_bulk(db, alerts, commit=False)
+
+
+def _process_chunk(
+    db: Session,
+    batch: ImportBatch,
+    rows: list[tuple[int, dict]],
+    outcome: ImportOutcome,
+    matcher: product_match_service.ProductMatcher,
+    checkpoint: Callable[[int], None] | None,
+) -> None:
+    results = _resolve_rows(db, batch, rows, matcher)
+    if not batch.dry_run:
+        _apply_rows(db, batch, results)
+
+    for result in results:
+        if result.error:
+            code, message = result.error
+            record_error(db, batch.id, result.row_number, code, message, result.payload)
+            outcome.error(result.row_number, code, message)
+        elif result.review:
+            reason, matches = result.review
+            suggestions = _suggestions(matches) if matches else None
+            _record_review(db, batch.id, result.row_number, reason, result.payload, suggestions)
+            outcome.review(result.row_number, reason, suggestions)
+        else:
+            outcome.ok_rows += 1
+    if checkpoint is not None:
+        checkpoint(len(rows))
+    # Una transaccion por bloque: productos, stocks, movimientos, auditoria, alertas, errores y checkpoint juntos
+    db.commit()
+
+
+def process_rows(
+    db: Session,
+    batch: ImportBatch,
+    rows: Iterable[tuple[int, dict]],
+    outcome: ImportOutcome,
+    matcher: product_match_service.ProductMatcher | None = None,
+    checkpoint: Callable[[int], None] | None = None,
+) -> int:
+    # Un mismo indice de similitud para todo el lote: se construye una vez, no por bloque
+    matcher = matcher or product_match_service.ProductMatcher(db)
+    processed = 0
+    rows = iter(rows)
+    size = chunk_rows()
+    while True:
+        chunk = list(islice(rows, size))
+        if not chunk:
+            return processed
+        _process_chunk(db, batch, chunk, outcome, matcher, checkpoint)
+        processed += len(chunk)
+
+
+def apply_review_row(db: Session, kind: str, row: dict[str, Any], *, user_id: int) -> None:
+    """Aplica una fila aprobada en revision: sin sugerencias difusas, crea el producto si no existe."""
+    data = _parse_row(kind, row)
+    _check_references(kind, data, _Lookup(db, [data]))
+    by_sku = product_repo.get_by_sku(db, data["sku"])
+    by_barcode = product_repo.get_by_barcode(db, data["barcode"])
+    if by_sku and by_barcode and by_sku.id != by_barcode.id:
+        raise ValueError("sku_barcode_conflict")
+
+    product = by_sku or by_barcode
+    if product:
+        if product.sku != data["sku"] or (product.barcode or "") != data["barcode"]:
+            raise ValueError("sku_barcode_mismatch")
+        if product.category_id != data["category_id"]:
+            raise ValueError("category_mismatch")
+    else:
+        if not data["name"]:
+            raise ValueError("missing_product_name")
+        try:
+            product = product_repo.create_product(
+                db,
+                sku=data["sku"],
+                name=data["name"],
+                barcode=data["barcode"],
+                category_id=data["category_id"],
+            )
+        except IntegrityError:
+            db.rollback()
+            raise ValueError("product_unique_conflict")
+
+    _apply(db, kind, product_id=product.id, data=data, user_id=user_id)
+
+
+def create_batch(
+    db: Session,
+    *,
+    kind: str,
+    user_id: int,
+    dry_run: bool,
+    fuzzy_threshold: float,
+    status: ImportStatus,
+    content_hash: str | None = None,
+) -> ImportBatch:
+    now = datetime.now(timezone.utc)
+    batch = ImportBatch(
+        kind=kind,
+        user_id=user_id,
+        dry_run=dry_run,
+        fuzzy_threshold=fuzzy_threshold,
+        status=status,
+        content_hash=content_hash,
+        started_at=now if status == ImportStatus.PROCESSING else None,
+        heartbeat_at=now if status == ImportStatus.PROCESSING else None,
+    )
+    db.add(batch)
+    try:
+        db.flush()
+    except IntegrityError:
+        # Dos subidas del mismo fichero a la vez: find_by_hash no vio la otra, el indice unico si
+        db.rollback()
+        existing = find_by_hash(db, kind, content_hash) if content_hash else None
+        if existing is None:
+            raise
+        raise DuplicateImportError(existing)
+    audit_log_repo.create_log(
+        db,
+        entity=Entity.IMPORT,
+        action=ActionType.CREATE,
+        user_id=user_id,
+        details=f"batch_id={batch.id} kind={batch.kind} dry_run={batch.dry_run}",
+        commit=False,
+    )
+    db.commit()
+    return batch
+
+
+def find_by_hash(db: Session, kind: str, content_hash: str) -> ImportBatch | None:
+    """Ultimo lote real (no dry-run) del mismo tipo con el mismo contenido."""
+    return db.scalar(
+        select(ImportBatch)
+        .where(
+            ImportBatch.kind == kind,
+            ImportBatch.content_hash == content_hash,
+            ImportBatch.dry_run.is_(False),
+        )
+        .order_by(ImportBatch.id.desc())
+        .limit(1)
+    )
+
+
+def release_hash(db: Session, kind: str, content_hash: str) -> None:
+    # Reimportacion forzada: el nuevo lote pasa a ser el duenno del hash (solo uno por el indice unico)
+    db.execute(
+        update(ImportBatch)
+        .where(
+            ImportBatch.kind == kind,
+            ImportBatch.content_hash == content_hash,
+            ImportBatch.dry_run.is_(False),
+        )
+        .values(content_hash=None)
+    )
+
+
+def stale_minutes() -> int:
+    return max(int(os.getenv("IMPORT_STALE_MINUTES", "15")), 1)
+
+
+def _is_stale(batch: ImportBatch, now: datetime) -> bool:
+    heartbeat = batch.heartbeat_at or batch.started_at or batch.created_at
+    if heartbeat.tzinfo is None:
+        heartbeat = heartbeat.replace(tzinfo=timezone.utc)
+    return heartbeat < now - timedelta(minutes=stale_minutes())
+
+
+def is_resumable(batch: ImportBatch, now: datetime | None = None) -> bool:
+    # Fallido, o en proceso sin checkpoint reciente (worker caido)
+    now = now or datetime.now(timezone.utc)
+    return batch.status == ImportStatus.FAILED or (batch.status == ImportStatus.PROCESSING and _is_stale(batch, now))
+
+
+def requeue(db: Session, batch: ImportBatch) -> None:
+    # Vuelve a PENDING conservando contadores y checkpoint: el worker continua donde se quedo
+    batch.status = ImportStatus.PENDING
+    batch.error_message = None
+    batch.finished_at = None
+    db.add(batch)
+    db.commit()
+
+
+def requeue_stale(db: Session, now: datetime | None = None) -> list[int]:
+    """Lotes PROCESSING con fichero guardado y sin latido en IMPORT_STALE_MINUTES: se reencolan."""
+    now = now or datetime.now(timezone.utc)
+    candidates = db.scalars(
+        select(ImportBatch).where(ImportBatch.status == ImportStatus.PROCESSING, ImportBatch.file_path.isnot(None))
+    ).all()
+    ids = []
+    for batch in candidates:
+        if not _is_stale(batch, now):
+            continue
+        # UPDATE condicional: si otro proceso lo reclama a la vez solo uno lo reencola
+        claimed = db.execute(
+            update(ImportBatch)
+            .where(ImportBatch.id == batch.id, ImportBatch.status == ImportStatus.PROCESSING)
+            .values(status=ImportStatus.PENDING)
+        ).rowcount
+        if claimed:
+            ids.append(batch.id)
+    db.commit()
+    return ids
+
+
+def store_file(db: Session, batch: ImportBatch, stream: BinaryIO) -> None:
+    directory = storage_dir()
+    directory.mkdir(parents=True, exist_ok=True)
+    path = directory / f"batch-{batch.id}.csv"
+    stream.seek(0)
+    with path.open("wb") as target:
+        shutil.copyfileobj(stream, target, _READ_BLOCK)
+    batch.file_path = str(path)
+    db.add(batch)
+    db.commit()
+
+
+def _publish_progress(batch: ImportBatch) -> None:
+    publish_import_progress(
+        {
+            "alert_type": "IMPORT_PROGRESS",
+            "batch_id": batch.id,
+            "status": batch.status.value,
+            "total_rows": batch.total_rows,
+            "processed_rows": batch.processed_rows,
+            "ok_rows": batch.ok_rows,
+            "error_rows": batch.error_rows,
+            "review_rows": batch.review_rows,
+        }
+    )
+
+
+def _batch_checkpoint(batch: ImportBatch, outcome: ImportOutcome) -> Callable[[int], None]:
+    def checkpoint(rows: int) -> None:
+        batch.processed_rows += rows
+        batch.ok_rows = outcome.ok_rows
+        batch.error_rows = outcome.error_rows
+        batch.review_rows = outcome.review_rows
+        batch.heartbeat_at = datetime.now(timezone.utc)
+    return checkpoint
+
+
+def _partition_checkpoint(
+    db: Session, batch: ImportBatch, partition: ImportPartition, outcome: ImportOutcome
+) -> Callable[[int], None]:
+    seen = [outcome.ok_rows, outcome.error_rows, outcome.review_rows]
+
+    def checkpoint(rows: int) -> None:
+        # Incremento atomico: varias particiones suman a la vez sobre el mismo lote
+        db.execute(
+            update(ImportBatch)
+            .where(ImportBatch.id == batch.id)
+            .values(
+                processed_rows=ImportBatch.processed_rows + rows,
+                ok_rows=ImportBatch.ok_rows + outcome.ok_rows - seen[0],
+                error_rows=ImportBatch.error_rows + outcome.error_rows - seen[1],
+                review_rows=ImportBatch.review_rows + outcome.review_rows - seen[2],
+                heartbeat_at=datetime.now(timezone.utc),
+            )
+        )
+        partition.processed_rows += rows
+        seen[:] = [outcome.ok_rows, outcome.error_rows, outcome.review_rows]
+    return checkpoint
+
+
+def finish_batch(db: Session, batch: ImportBatch, outcome: ImportOutcome) -> None:
+    batch.total_rows = max(batch.total_rows, batch.processed_rows)
+    batch.ok_rows = outcome.ok_rows
+    batch.error_rows = outcome.error_rows
+    batch.review_rows = outcome.review_rows
+    batch.status = ImportStatus.COMPLETED
+    batch.finished_at = datetime.now(timezone.utc)
+    db.add(batch)
+    db.commit()
+
+    if outcome.ok_rows and not batch.dry_run:
+        cache_invalidate_prefix(*CACHE_PREFIXES)
+
+    if not batch.dry_run and (outcome.error_rows > 0 or outcome.review_rows > 0):
+        alert_repo.create_alert(
+            db,
+            stock_id=None,
+            quantity=outcome.error_rows + outcome.review_rows,
+            min_quantity=0,
+            alert_type=AlertType.IMPORT_ISSUES,
+            status=AlertStatus.PENDING,
+        )
+    if not batch.dry_run:
+        fcm_service.send_import_completed_push(
+            db,
+            total_rows=batch.total_rows,
+            error_rows=outcome.error_rows,
+            review_rows=outcome.review_rows,
+        )
+
+
+def run_sync(db: Session, batch: ImportBatch, reader: csv.DictReader) -> ImportOutcome:
+    """Camino sincrono para ficheros pequenos: procesa todo dentro de la peticion."""
+    outcome = ImportOutcome(collect=True)
+    try:
+        process_rows(db, batch, enumerate(reader, start=2), outcome, checkpoint=_batch_checkpoint(batch, outcome))
+        batch.total_rows = batch.processed_rows
+        finish_batch(db, batch, outcome)
+    except Exception as exc:
+        # FAILED en vez de quedarse PROCESSING: la re-subida lo reanuda al momento desde su checkpoint
+        _fail(db, batch, exc)
+        raise
+    return outcome
+
+
+def _claim(db: Session, batch_id: int) -> ImportBatch | None:
+    # PENDING -> PROCESSING con UPDATE condicional: dos entregas de la misma tarea no procesan a la vez
+    now = datetime.now(timezone.utc)
+    claimed = db.execute(
+        update(ImportBatch)
+        .where(ImportBatch.id == batch_id, ImportBatch.status == ImportStatus.PENDING)
+        .values(
+            status=ImportStatus.PROCESSING,
+            started_at=func.coalesce(ImportBatch.started_at, now),
+            heartbeat_at=now,
+        )
+    ).rowcount
+    db.commit()
+    if not claimed:
+        return None
+    batch = db.get(ImportBatch, batch_id)
+    db.refresh(batch)
+    return batch
+
+
+def _fail(db: Session, batch: ImportBatch, exc: Exception) -> dict:
+    # Las filas ya aplicadas quedan confirmadas con su checkpoint; el lote se puede reanudar
+    db.rollback()
+    batch.status = ImportStatus.FAILED
+    batch.error_message = str(exc)[:255]
+    batch.finished_at = datetime.now(timezone.utc)
+    db.add(batch)
+    db.commit()
+    logger.exception("import batch failed batch_id=%s", batch.id)
+    return {"batch_id": batch.id, "status": batch.status.value}
+
+
+def _summary(batch: ImportBatch) -> dict:
+    logger.info(
+        "import batch done batch_id=%s total=%s ok=%s errors=%s reviews=%s",
+        batch.id, batch.total_rows, batch.ok_rows, batch.error_rows, batch.review_rows,
+    )
+    return {
+        "batch_id": batch.id,
+        "status": batch.status.value,
+        "total_rows": batch.total_rows,
+        "ok_rows": batch.ok_rows,
+        "error_rows": batch.error_rows,
+        "review_rows": batch.review_rows,
+    }
+
+
+def _restored_outcome(batch: ImportBatch) -> ImportOutcome:
+    outcome = ImportOutcome()
+    outcome.ok_rows = batch.ok_rows
+    outcome.error_rows = batch.error_rows
+    outcome.review_rows = batch.review_rows
+    return outcome
+
+
+def run_batch(db: Session, batch_id: int) -> dict:
+    """
+    Procesa en bloques de IMPORT_CHUNK_ROWS un lote subido en segundo plano. Cada bloque confirma
+    sus filas junto con el checkpoint (processed_rows y contadores) en la misma transaccion, asi un
+    lote reencolado tras una caida continua en la primera fila no aplicada. Solo arranca lotes
+    PENDING: una reentrega de la tarea mientras otro worker lo procesa no hace nada.
+    """
+    batch = _claim(db, batch_id)
+    if batch is None:
+        return {"batch_id": batch_id, "skipped": True}
+
+    path = Path(batch.file_path or "")
+    try:
+        # Dos pasadas en streaming sobre el fichero: contar filas y procesarlas por bloques
+        with path.open("rb") as stream:
+            batch.total_rows = sum(1 for _ in open_csv(stream, batch.kind))
+        db.commit()
+        _publish_progress(batch)
+
+        outcome = _restored_outcome(batch)
+        matcher = product_match_service.ProductMatcher(db)
+        checkpoint = _batch_checkpoint(batch, outcome)
+        chunk_size = chunk_rows()
+        with path.open("rb") as stream:
+            rows = islice(enumerate(open_csv(stream, batch.kind), start=2), batch.processed_rows, None)
+            while True:
+                chunk = list(islice(rows, chunk_size))
+                if not chunk:
+                    break
+                process_rows(db, batch, chunk, outcome, matcher, checkpoint=checkpoint)
+                _publish_progress(batch)
+
+        finish_batch(db, batch, outcome)
+    except Exception as exc:
+        return _fail(db, batch, exc)
+
+    path.unlink(missing_ok=True)
+    return _summary(batch)
+
+
+def partition_count() -> int:
+    return max(int(os.getenv("IMPORT_PARTITIONS", "1")), 1)
+
+
+def is_partitioned(db: Session, batch_id: int) -> bool:
+    return db.scalar(select(ImportPartition.id).where(ImportPartition.batch_id == batch_id).limit(1)) is not None
+
+
+def uses_partitions(db: Session, batch_id: int, partitions: int) -> bool:
+    # Un lote reanudado sigue el modo con el que empezo, aunque haya cambiado IMPORT_PARTITIONS
+    if is_partitioned(db, batch_id):
+        return True
+    batch = db.get(ImportBatch, batch_id)
+    return partitions > 1 and batch is not None and batch.processed_rows == 0
+
+
+def _partition_path(batch: ImportBatch, index: int) -> Path:
+    return Path(batch.file_path or "").with_name(f"batch-{batch.id}-p{index}.csv")
+
+
+def _product_keys(row: dict[str, Any]) -> list[str]:
+    row = normalize_row(row)
+    return [f"{field}:{row[field]}" for field in ("sku", "barcode") if row.get(field)]
+
+
+def split_batch(db: Session, batch_id: int, partitions: int) -> list[int] | None:
+    """
+    Reparte un lote PENDING en ficheros de particion. Las filas que comparten sku o barcode
+    (y por tanto producto y filas de stock) caen en la misma particion y conservan su orden,
+    asi una salida sigue viendo las entradas anteriores. Tambien van juntas las de nombres
+    parecidos, para que el alta de un producto nuevo se compare con los de las demas filas
+    igual que en un lote secuencial. Devuelve los indices pendientes;
+    un lote ya particionado que se reanuda conserva sus ficheros y checkpoints.
+    """
+    batch = _claim(db, batch_id)
+    if batch is None:
+        return None
+    pending = db.scalars(
+        select(ImportPartition.partition)
+        .where(ImportPartition.batch_id == batch.id, ImportPartition.done.is_(False))
+        .order_by(ImportPartition.partition)
+    ).all()
+    if pending or is_partitioned(db, batch.id):
+        return list(pending)
+
+    path = Path(batch.file_path or "")
+    try:
+        # Componentes conexas sku/barcode en una primera pasada (solo claves en memoria)
+        parent: dict[str, str] = {}
+
+        def find(key: str) -> str:
+            parent.setdefault(key, key)
+            while parent[key] != key:
+                parent[key] = parent[parent[key]]
+                key = parent[key]
+            return key
+
+        total = 0
+        names = product_match_service.NameGroups(batch.fuzzy_threshold)
+        with path.open("rb") as stream:
+            for row in open_csv(stream, batch.kind):
+                total += 1
+                keys = _product_keys(row)
+                if keys:
+                    keys += [f"name:{name}" for name in names.matches(normalize_row(row).get("name") or "")]
+                for key in keys[1:]:
+                    parent[find(key)] = find(keys[0])
+
+        files, writers = {}, {}
+        try:
+            with path.open("rb") as stream:
+                reader = open_csv(stream, batch.kind)
+                for row_number, row in enumerate(reader, start=2):
+                    keys = _product_keys(row)
+                    root = find(keys[0]) if keys else str(row_number)
+                    index = zlib.crc32(root.encode("utf-8")) % partitions
+                    if index not in writers:
+                        files[index] = _partition_path(batch, index).open("w", encoding="utf-8", newline="")
+                        writers[index] = csv.DictWriter(
+                            files[index], fieldnames=[*reader.fieldnames, PARTITION_COLUMN], extrasaction="ignore"
+                        )
+                        writers[index].writeheader()
+                    writers[index].writerow({**row, PARTITION_COLUMN: row_number})
+        finally:
+            for handle in files.values():
+                handle.close()
+
+        batch.total_rows = total
+        db.add_all(ImportPartition(batch_id=batch.id, partition=index) for index in sorted(writers))
+        db.commit()
+        _publish_progress(batch)
+    except Exception as exc:
+        _fail(db, batch, exc)
+        return None
+    return sorted(writers)
+
+
+def run_partition(db: Session, batch_id: int, index: int) -> dict:
+    """Procesa una particion desde su checkpoint y suma sus contadores al lote padre en cada bloque."""
+    batch = db.get(ImportBatch, batch_id)
+    partition = db.scalar(
+        select(ImportPartition).where(ImportPartition.batch_id == batch_id, ImportPartition.partition == index)
+    )
+    if batch is None or partition is None or partition.done or batch.status != ImportStatus.PROCESSING:
+        return {"batch_id": batch_id, "partition": index, "skipped": True}
+
+    path = _partition_path(batch, index)
+    outcome = ImportOutcome()
+    matcher = product_match_service.ProductMatcher(db)
+    checkpoint = _partition_checkpoint(db, batch, partition, outcome)
+    processed = 0
+    try:
+        with path.open("rb") as stream:
+            rows = islice(
+                ((int(row.pop(PARTITION_COLUMN)), row) for row in open_csv(stream, batch.kind)),
+                partition.processed_rows,
+                None,
+            )
+            while batch.status == ImportStatus.PROCESSING:
+                chunk = list(islice(rows, chunk_rows()))
+                if not chunk:
+                    break
+                processed += process_rows(db, batch, chunk, outcome, matcher, checkpoint=checkpoint)
+                # Refresca el lote: si otra particion fallo, esta se detiene en su checkpoint
+                db.refresh(batch)
+                _publish_progress(batch)
+        if batch.status == ImportStatus.PROCESSING:
+            partition.done = True
+            db.commit()
+    except Exception as exc:
+        _fail(db, batch, exc)
+        return {"batch_id": batch_id, "partition": index, "failed": True}
+
+    if partition.done:
+        path.unlink(missing_ok=True)
+    return {
+        "batch_id": batch_id,
+        "partition": index,
+        "processed_rows": processed,
+        "ok_rows": outcome.ok_rows,
+        "error_rows": outcome.error_rows,
+        "review_rows": outcome.review_rows,
+    }
+
+
+def finish_partitions(db: Session, batch_id: int, results: list[dict]) -> dict:
+    """
+    Cierra un lote particionado cuando todas sus particiones han terminado. Los contadores ya
+    estan sumados en el lote (tambien los de ejecuciones anteriores a una reanudacion); results
+    solo se registra en el log.
+    """
+    batch = db.get(ImportBatch, batch_id)
+    if batch is None:
+        return {"batch_id": batch_id, "skipped": True}
+    db.refresh(batch)
+    logger.info("import partitions finished batch_id=%s results=%s", batch_id, len(results))
+
+    unfinished = db.scalar(
+        select(func.count())
+        .select_from(ImportPartition)
+        .where(ImportPartition.batch_id == batch_id, ImportPartition.done.is_(False))
+    )
+    if batch.status != ImportStatus.PROCESSING or unfinished:
+        # Fallido o incompleto: ficheros y checkpoints se conservan para reanudar
+        return {"batch_id": batch_id, "status": batch.status.value}
+
+    finish_batch(db, batch, _restored_outcome(batch))
+    path = Path(batch.file_path or "")
+    for partition_file in path.parent.glob(f"batch-{batch.id}-p*.csv"):
+        partition_file.unlink(missing_ok=True)
+    path.unlink(missing_ok=True)
+    return _summary(batch)
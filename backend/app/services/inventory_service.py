@@ -27,17 +27,11 @@ def _get_product_or_fail(db: Session, product_id: int) -> Product:
 
 
 def _resolve_location_id(db: Session, location: str) -> int:
-    loc = location_repo.get_or_create(db, location)
+    # Sin commit: la ubicacion nueva entra en la misma transaccion que el movimiento
+    loc = location_repo.get_or_create(db, location, commit=False)
     return loc.id
 
 
-def _get_or_create_stock(db: Session, product_id: int, location: str) -> Stock:
-    stock = stock_repo.get_by_product_and_location(db, product_id, location)
-    if stock:
-        return stock
-    return stock_repo.create_stock(db, product_id=product_id, location=location, quantity=0)
-
-
 def _get_threshold(db: Session, product_id: int, location_id: int) -> StockThreshold | None:
     threshold = db.scalar(
         select(StockThreshold).where(
@@ -61,6 +55,7 @@ def _maybe_create_alerts(
     stock: Stock,
     delta: int,
     include_large_movement: bool = True,
+    commit: bool = True,
 ) -> None:
     # Stock agotado
     if stock.quantity == 0:
@@ -73,6 +68,7 @@ def _maybe_create_alerts(
                 min_quantity=0,
                 alert_type=AlertType.OUT_OF_STOCK,
                 status=AlertStatus.PENDING,
+                commit=commit,
             )
 
     # Stock bajo
@@ -87,6 +83,7 @@ def _maybe_create_alerts(
                 min_quantity=threshold.min_quantity,
                 alert_type=AlertType.LOW_STOCK,
                 status=AlertStatus.PENDING,
+                commit=commit,
             )
 
     # Movimiento grande
@@ -100,6 +97,7 @@ def _maybe_create_alerts(
                 min_quantity=0,
                 alert_type=AlertType.LARGE_MOVEMENT,
                 status=AlertStatus.PENDING,
+                commit=commit,
             )
 
 
@@ -115,55 +113,56 @@ def _get_location_or_fail_by_id(db: Session, location_id: int) -> Location:
     return location
 
 
-def _get_or_create_stock_by_location_id(db: Session, product_id: int, location_id: int) -> Stock:
-    stock = db.scalar(
-        stock_repo.select_by_product_and_location_id(product_id=product_id, location_id=location_id)
-    )
-    if stock:
-        return stock
-    stock = Stock(product_id=product_id, location_id=location_id, quantity=0)
-    db.add(stock)
-    db.commit()
-    db.refresh(stock)
-    return stock
-
-
-def increase_stock(
+def _apply_movement(
     db: Session,
     *,
     product_id: int,
+    location_id: int,
     quantity: int,
+    delta: int,
     user_id: int,
-    location: str,
+    movement_type: MovementType,
     source: Source,
+    insufficient_message: str,
+    transfer_id: str | None = None,
+    include_large_movement: bool = True,
 ) -> Tuple[Stock, Movement]:
-    _get_product_or_fail(db, product_id)
-    stock = _get_or_create_stock(db, product_id, location)
-    location_id = _resolve_location_id(db, location)
+    """
+    UPDATE atomico del stock + movimiento + auditoria + alertas, sin commit.
+    Si el stock quedaria negativo no se escribe nada y se lanza InventoryError.
+    """
+    stock = stock_repo.apply_delta(db, product_id=product_id, location_id=location_id, delta=delta)
+    if stock is None:
+        raise InventoryError(insufficient_message)
 
-    updated_stock = stock_repo.adjust_stock_quantity(db, stock, delta=quantity)
     movement = movement_repo.create_movement(
         db,
         product_id=product_id,
         quantity=quantity,
-        delta=quantity,
+        delta=delta,
         user_id=user_id,
-        movement_type=MovementType.IN,
+        movement_type=movement_type,
         movement_source=source,
         location_id=location_id,
+        transfer_id=transfer_id,
+        commit=False,
     )
+    details = f"movement_id={movement.id} product_id={product_id} delta={delta} type={movement_type.value}"
+    if transfer_id:
+        details += f" transfer_id={transfer_id}"
     audit_log_repo.create_log(
         db,
         entity=Entity.MOVEMENT,
         action=ActionType.CREATE,
         user_id=user_id,
-        details=f"movement_id={movement.id} product_id={product_id} delta={quantity} type=IN",
+        details=details,
+        commit=False,
     )
-    _maybe_create_alerts(db, stock=updated_stock, delta=quantity)
-    return updated_stock, movement
+    _maybe_create_alerts(db, stock=stock, delta=delta, include_large_movement=include_large_movement, commit=False)
+    return stock, movement
 
 
-def decrease_stock(
+def increase_stock(
     db: Session,
     *,
     product_id: int,
@@ -173,32 +172,44 @@ def decrease_stock(
     source: Source,
 ) -> Tuple[Stock, Movement]:
     _get_product_or_fail(db, product_id)
-    stock = _get_or_create_stock(db, product_id, location)
-    location_id = _resolve_location_id(db, location)
+    stock, movement = _apply_movement(
+        db,
+        product_id=product_id,
+        location_id=_resolve_location_id(db, location),
+        quantity=quantity,
+        delta=quantity,
+        user_id=user_id,
+        movement_type=MovementType.IN,
+        source=source,
+        insufficient_message="Stock resultante no puede ser negativo",
+    )
+    db.commit()
+    return stock, movement
 
-    if stock.quantity < quantity:
-        raise InventoryError("Stock insuficiente para la salida")
 
-    updated_stock = stock_repo.adjust_stock_quantity(db, stock, delta=-quantity)
-    movement = movement_repo.create_movement(
+def decrease_stock(
+    db: Session,
+    *,
+    product_id: int,
+    quantity: int,
+    user_id: int,
+    location: str,
+    source: Source,
+) -> Tuple[Stock, Movement]:
+    _get_product_or_fail(db, product_id)
+    stock, movement = _apply_movement(
         db,
         product_id=product_id,
+        location_id=_resolve_location_id(db, location),
         quantity=quantity,
         delta=-quantity,
         user_id=user_id,
         movement_type=MovementType.OUT,
-        movement_source=source,
-        location_id=location_id,
-    )
-    audit_log_repo.create_log(
-        db,
-        entity=Entity.MOVEMENT,
-        action=ActionType.CREATE,
-        user_id=user_id,
-        details=f"movement_id={movement.id} product_id={product_id} delta={-quantity} type=OUT",
+        source=source,
+        insufficient_message="Stock insuficiente para la salida",
     )
-    _maybe_create_alerts(db, stock=updated_stock, delta=-quantity)
-    return updated_stock, movement
+    db.commit()
+    return stock, movement
 
 
 def adjust_stock(
@@ -214,120 +225,68 @@ def adjust_stock(
     Ajuste directo de stock (positivo o negativo).
     """
     _get_product_or_fail(db, product_id)
-    stock = _get_or_create_stock(db, product_id, location)
-    location_id = _resolve_location_id(db, location)
-
-    new_qty = stock.quantity + quantity
-    if new_qty < 0:
-        raise InventoryError("Stock resultante no puede ser negativo")
-
-    updated_stock = stock_repo.adjust_stock_quantity(db, stock, delta=quantity)
-    movement = movement_repo.create_movement(
+    stock, movement = _apply_movement(
         db,
         product_id=product_id,
+        location_id=_resolve_location_id(db, location),
         quantity=quantity,
         delta=quantity,
         user_id=user_id,
         movement_type=MovementType.ADJUST,
-        movement_source=source,
-        location_id=location_id,
+        source=source,
+        insufficient_message="Stock resultante no puede ser negativo",
     )
-    audit_log_repo.create_log(
-        db,
-        entity=Entity.MOVEMENT,
-        action=ActionType.CREATE,
-        user_id=user_id,
-        details=f"movement_id={movement.id} product_id={product_id} delta={quantity} type=ADJUST",
-    )
-    _maybe_create_alerts(db, stock=updated_stock, delta=quantity)
-    return updated_stock, movement
+    db.commit()
+    return stock, movement
 
 
-def transfer_stock(
+def _transfer(
     db: Session,
     *,
     product_id: int,
     quantity: int,
     user_id: int,
-    from_location: str,
-    to_location: str,
+    from_location_id: int,
+    to_location_id: int,
     source: Source,
+    insufficient_message: str,
 ) -> Tuple[Stock, Stock, Movement, Movement]:
-    if from_location.strip().lower() == to_location.strip().lower():
-        raise InventoryError("La ubicación origen y destino no pueden ser iguales")
-
-    _get_product_or_fail(db, product_id)
-
-    from_stock = stock_repo.get_by_product_and_location(db, product_id, from_location)
-    if not from_stock:
-        from_stock = stock_repo.create_stock(
-            db, product_id=product_id, location=from_location, quantity=0, commit=False
-        )
-
-    to_stock = stock_repo.get_by_product_and_location(db, product_id, to_location)
-    if not to_stock:
-        to_stock = stock_repo.create_stock(
-            db, product_id=product_id, location=to_location, quantity=0, commit=False
-        )
-
-    from_location_id = _resolve_location_id(db, from_location)
-    to_location_id = _resolve_location_id(db, to_location)
-
-    if from_stock.quantity < quantity:
-        raise InventoryError("Stock insuficiente en la ubicación origen")
-
-    stock_repo.adjust_stock_quantity(db, from_stock, delta=-quantity, commit=False)
-    stock_repo.adjust_stock_quantity(db, to_stock, delta=quantity, commit=False)
-
+    # Bloquea ambas filas en orden fijo para que dos transferencias cruzadas no se interbloqueen
+    db.execute(
+        select(Stock.id)
+        .where(Stock.product_id == product_id, Stock.location_id.in_([from_location_id, to_location_id]))
+        .order_by(Stock.location_id)
+        .with_for_update()
+    )
     transfer_id = str(uuid.uuid4())
-
-    out_movement = movement_repo.create_movement(
+    # Primero el origen: si no hay stock suficiente no se ha escrito nada
+    from_stock, out_movement = _apply_movement(
         db,
         product_id=product_id,
+        location_id=from_location_id,
         quantity=quantity,
         delta=-quantity,
         user_id=user_id,
         movement_type=MovementType.OUT,
-        movement_source=source,
-        location_id=from_location_id,
+        source=source,
+        insufficient_message=insufficient_message,
         transfer_id=transfer_id,
-        commit=False,
+        include_large_movement=True,
     )
-    in_movement = movement_repo.create_movement(
+    to_stock, in_movement = _apply_movement(
         db,
         product_id=product_id,
+        location_id=to_location_id,
         quantity=quantity,
         delta=quantity,
         user_id=user_id,
         movement_type=MovementType.IN,
-        movement_source=source,
-        location_id=to_location_id,
+        source=source,
+        insufficient_message=insufficient_message,
         transfer_id=transfer_id,
-        commit=False,
+        include_large_movement=False,
     )
 
-    db.commit()
-    db.refresh(from_stock)
-    db.refresh(to_stock)
-    db.refresh(out_movement)
-    db.refresh(in_movement)
-    audit_log_repo.create_log(
-        db,
-        entity=Entity.MOVEMENT,
-        action=ActionType.CREATE,
-        user_id=user_id,
-        details=f"movement_id={out_movement.id} product_id={product_id} delta={-quantity} type=OUT transfer_id={transfer_id}",
-    )
-    audit_log_repo.create_log(
-        db,
-        entity=Entity.MOVEMENT,
-        action=ActionType.CREATE,
-        user_id=user_id,
-        details=f"movement_id={in_movement.id} product_id={product_id} delta={quantity} type=IN transfer_id={transfer_id}",
-    )
-
-    _maybe_create_alerts(db, stock=from_stock, delta=-quantity, include_large_movement=True)
-    _maybe_create_alerts(db, stock=to_stock, delta=quantity, include_large_movement=False)
     alert_repo.create_alert(
         db,
         stock_id=to_stock.id,
@@ -335,11 +294,38 @@ def transfer_stock(
         min_quantity=0,
         alert_type=AlertType.TRANSFER_COMPLETE,
         status=AlertStatus.PENDING,
+        commit=False,
     )
-
+    db.commit()
     return from_stock, to_stock, out_movement, in_movement
 
 
+def transfer_stock(
+    db: Session,
+    *,
+    product_id: int,
+    quantity: int,
+    user_id: int,
+    from_location: str,
+    to_location: str,
+    source: Source,
+) -> Tuple[Stock, Stock, Movement, Movement]:
+    if from_location.strip().lower() == to_location.strip().lower():
+        raise InventoryError("La ubicación origen y destino no pueden ser iguales")
+
+    _get_product_or_fail(db, product_id)
+    return _transfer(
+        db,
+        product_id=product_id,
+        quantity=quantity,
+        user_id=user_id,
+        from_location_id=_resolve_location_id(db, from_location),
+        to_location_id=_resolve_location_id(db, to_location),
+        source=source,
+        insufficient_message="Stock insuficiente en la ubicación origen",
+    )
+
+
 def increase_stock_by_location_id(
     db: Session,
     *,
@@ -351,28 +337,19 @@ def increase_stock_by_location_id(
 ) -> Tuple[Stock, Movement]:
     _get_product_or_fail(db, product_id)
     _get_location_or_fail_by_id(db, location_id)
-    stock = _get_or_create_stock_by_location_id(db, product_id, location_id)
-
-    updated_stock = stock_repo.adjust_stock_quantity(db, stock, delta=quantity)
-    movement = movement_repo.create_movement(
+    stock, movement = _apply_movement(
         db,
         product_id=product_id,
+        location_id=location_id,
         quantity=quantity,
         delta=quantity,
         user_id=user_id,
         movement_type=MovementType.IN,
-        movement_source=source,
-        location_id=location_id,
-    )
-    audit_log_repo.create_log(
-        db,
-        entity=Entity.MOVEMENT,
-        action=ActionType.CREATE,
-        user_id=user_id,
-        details=f"movement_id={movement.id} product_id={product_id} delta={quantity} type=IN",
+        source=source,
+        insufficient_message="Stock resultante no puede ser negativo",
     )
-    _maybe_create_alerts(db, stock=updated_stock, delta=quantity)
-    return updated_stock, movement
+    db.commit()
+    return stock, movement
 
 
 def decrease_stock_by_location_id(
@@ -386,31 +363,19 @@ def decrease_stock_by_location_id(
 ) -> Tuple[Stock, Movement]:
     _get_product_or_fail(db, product_id)
     _get_location_or_fail_by_id(db, location_id)
-    stock = _get_or_create_stock_by_location_id(db, product_id, location_id)
-
-    if stock.quantity < quantity:
-        raise InventoryError("Stock insuficiente para la salida")
-
-    updated_stock = stock_repo.adjust_stock_quantity(db, stock, delta=-quantity)
-    movement = movement_repo.create_movement(
+    stock, movement = _apply_movement(
         db,
         product_id=product_id,
+        location_id=location_id,
         quantity=quantity,
         delta=-quantity,
         user_id=user_id,
         movement_type=MovementType.OUT,
-        movement_source=source,
-        location_id=location_id,
+        source=source,
+        insufficient_message="Stock insuficiente para la salida",
     )
-    audit_log_repo.create_log(
-        db,
-        entity=Entity.MOVEMENT,
-        action=ActionType.CREATE,
-        user_id=user_id,
-        details=f"movement_id={movement.id} product_id={product_id} delta={-quantity} type=OUT",
-    )
-    _maybe_create_alerts(db, stock=updated_stock, delta=-quantity)
-    return updated_stock, movement
+    db.commit()
+    return stock, movement
 
 
 def adjust_stock_by_location_id(
@@ -424,32 +389,19 @@ def adjust_stock_by_location_id(
 ) -> Tuple[Stock, Movement]:
     _get_product_or_fail(db, product_id)
     _get_location_or_fail_by_id(db, location_id)
-    stock = _get_or_create_stock_by_location_id(db, product_id, location_id)
-
-    new_qty = stock.quantity + quantity
-    if new_qty < 0:
-        raise InventoryError("Stock resultante no puede ser negativo")
-
-    updated_stock = stock_repo.adjust_stock_quantity(db, stock, delta=quantity)
-    movement = movement_repo.create_movement(
+    stock, movement = _apply_movement(
         db,
         product_id=product_id,
+        location_id=location_id,
         quantity=quantity,
         delta=quantity,
         user_id=user_id,
         movement_type=MovementType.ADJUST,
-        movement_source=source,
-        location_id=location_id,
+        source=source,
+        insufficient_message="Stock resultante no puede ser negativo",
     )
-    audit_log_repo.create_log(
-        db,
-        entity=Entity.MOVEMENT,
-        action=ActionType.CREATE,
-        user_id=user_id,
-        details=f"movement_id={movement.id} product_id={product_id} delta={quantity} type=ADJUST",
-    )
-    _maybe_create_alerts(db, stock=updated_stock, delta=quantity)
-    return updated_stock, movement
+    db.commit()
+    return stock, movement
 
 
 def transfer_stock_by_location_id(
@@ -468,85 +420,13 @@ def transfer_stock_by_location_id(
     _get_product_or_fail(db, product_id)
     _get_location_or_fail_by_id(db, from_location_id)
     _get_location_or_fail_by_id(db, to_location_id)
-
-    from_stock = db.scalar(
-        stock_repo.select_by_product_and_location_id(product_id=product_id, location_id=from_location_id)
-    )
-    if not from_stock:
-        from_stock = Stock(product_id=product_id, location_id=from_location_id, quantity=0)
-        db.add(from_stock)
-        db.flush()
-
-    to_stock = db.scalar(
-        stock_repo.select_by_product_and_location_id(product_id=product_id, location_id=to_location_id)
-    )
-    if not to_stock:
-        to_stock = Stock(product_id=product_id, location_id=to_location_id, quantity=0)
-        db.add(to_stock)
-        db.flush()
-
-    if from_stock.quantity < quantity:
-        raise InventoryError("Stock insuficiente en la ubicacion origen")
-
-    stock_repo.adjust_stock_quantity(db, from_stock, delta=-quantity, commit=False)
-    stock_repo.adjust_stock_quantity(db, to_stock, delta=quantity, commit=False)
-
-    transfer_id = str(uuid.uuid4())
-
-    out_movement = movement_repo.create_movement(
+    return _transfer(
         db,
         product_id=product_id,
         quantity=quantity,
-        delta=-quantity,
         user_id=user_id,
-        movement_type=MovementType.OUT,
-        movement_source=source,
-        location_id=from_location_id,
-        transfer_id=transfer_id,
-        commit=False,
+        from_location_id=from_location_id,
+        to_location_id=to_location_id,
+        source=source,
+        insufficient_message="Stock insuficiente en la ubicacion origen",
     )
-    in_movement = movement_repo.create_movement(
-        db,
-        product_id=product_id,
-        quantity=quantity,
-        delta=quantity,
-        user_id=user_id,
-        movement_type=MovementType.IN,
-        movement_source=source,
-        location_id=to_location_id,
-        transfer_id=transfer_id,
-        commit=False,
-    )
-
-    db.commit()
-    db.refresh(from_stock)
-    db.refresh(to_stock)
-    db.refresh(out_movement)
-    db.refresh(in_movement)
-    audit_log_repo.create_log(
-        db,
-        entity=Entity.MOVEMENT,
-        action=ActionType.CREATE,
-        user_id=user_id,
-        details=f"movement_id={out_movement.id} product_id={product_id} delta={-quantity} type=OUT transfer_id={transfer_id}",
-    )
-    audit_log_repo.create_log(
-        db,
-        entity=Entity.MOVEMENT,
-        action=ActionType.CREATE,
-        user_id=user_id,
-        details=f"movement_id={in_movement.id} product_id={product_id} delta={quantity} type=IN transfer_id={transfer_id}",
-    )
-
-    _maybe_create_alerts(db, stock=from_stock, delta=-quantity, include_large_movement=True)
-    _maybe_create_alerts(db, stock=to_stock, delta=quantity, include_large_movement=False)
-    alert_repo.create_alert(
-        db,
-        stock_id=to_stock.id,
-        quantity=quantity,
-        min_quantity=0,
-        alert_type=AlertType.TRANSFER_COMPLETE,
-        status=AlertStatus.PENDING,
-    )
-
-    return from_stock, to_stock, out_movement, in_movement
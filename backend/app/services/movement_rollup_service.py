@@ -0,0 +1,53 @@
+import logging
+import os
+from datetime import date, datetime, timedelta, timezone
+
+from sqlalchemy.orm import Session
+
+from app.repositories import movement_agg_repo
+
+
+logger = logging.getLogger("app.reports")
+
+
+def _lag() -> timedelta:
+    # Margen para transacciones que confirman tarde: un dia solo se cierra cuando han pasado estos segundos
+    return timedelta(seconds=int(os.getenv("MOVEMENT_ROLLUP_LAG_SECONDS", "300")))
+
+
+def closed_until(now: datetime) -> date:
+    """Primer dia UTC que aun no se considera cerrado (los anteriores ya no reciben movimientos)."""
+    return (now - _lag()).date()
+
+
+def rollup_days(db: Session, start: date, end: date) -> int:
+    """Recalcula los dias [start, end) y avanza la marca de agua dia a dia (un commit por dia)."""
+    day = start
+    while day < end:
+        movement_agg_repo.rebuild_day(db, day)
+        day += timedelta(days=1)
+        movement_agg_repo.set_rolled_until(db, day, commit=False)
+        db.commit()
+    return max((end - start).days, 0)
+
+
+def rollup_pending(db: Session, now: datetime | None = None) -> dict:
+    now = now or datetime.now(timezone.utc)
+    end = closed_until(now)
+    start = movement_agg_repo.rolled_until(db) or movement_agg_repo.first_movement_day(db) or end
+    days = rollup_days(db, start, end)
+    logger.info("movement rollup done from=%s to=%s days=%s", start, end, days)
+    return {"from": start.isoformat(), "to": end.isoformat(), "days": days}
+
+
+def backfill(db: Session, start: date | None = None, now: datetime | None = None) -> dict:
+    """
+    Reconstruye desde start (o desde el primer movimiento) hasta el ultimo dia cerrado.
+    start nunca pasa de la marca de agua actual: la tabla no puede quedar con huecos.
+    """
+    now = now or datetime.now(timezone.utc)
+    end = closed_until(now)
+    floor = movement_agg_repo.rolled_until(db) or movement_agg_repo.first_movement_day(db) or end
+    start = min(start, floor) if start else (movement_agg_repo.first_movement_day(db) or end)
+    days = rollup_days(db, start, end)
+    return {"from": start.isoformat(), "to": end.isoformat(), "days": days}
@@ -1,63 +1,83 @@
 import os
 import smtplib
+import threading
+import time
 from email.message import EmailMessage
 from app.models.enums import AlertType
 
 
+# Conexion SMTP reutilizada entre envios (una por proceso/worker)
+_smtp_lock = threading.Lock()
+_smtp_conn: smtplib.SMTP | None = None
+_smtp_last_used = 0.0
+
+
 def _get_env(name: str, default: str = "") -> str:
     value = os.getenv(name)
     return value if value is not None else default
 
 
-def _smtp_configured() -> bool:
+def smtp_configured() -> bool:
     return bool(_get_env("SMTP_HOST") and _get_env("SMTP_TO") and _get_env("SMTP_FROM"))
 
 
-def send_low_stock_email(
-    *,
-    product_id: int,
-    product_name: str | None = None,
-    location: str,
-    quantity: int,
-    min_quantity: int,
-) -> None:
-    if not _smtp_configured():
-        return
-
+def _open_smtp() -> smtplib.SMTP:
     host = _get_env("SMTP_HOST")
     port = int(_get_env("SMTP_PORT", "587"))
     user = _get_env("SMTP_USER")
     password = _get_env("SMTP_PASSWORD")
-    from_addr = _get_env("SMTP_FROM")
-    to_addr = _get_env("SMTP_TO")
     use_tls = _get_env("SMTP_USE_TLS", "true").lower() in ("1", "true", "yes")
-
-    product_label = f"{product_name} ({product_id})" if product_name else f"Producto {product_id}"
-    subject = f"Alerta de stock bajo: {product_label}"
-    body = (
-        "Se ha detectado stock bajo.\n\n"
-        f"Producto: {product_label}\n"
-        f"Ubicacion: {location}\n"
-        f"Cantidad actual: {quantity}\n"
-        f"Minimo configurado: {min_quantity}\n"
-    )
-
+    smtp = smtplib.SMTP(host, port, timeout=10)
+    if use_tls:
+        smtp.starttls()
+    if user and password:
+        smtp.login(user, password)
+    return smtp
+
+
+def _close_smtp() -> None:
+    global _smtp_conn
+    if _smtp_conn is not None:
+        try:
+            _smtp_conn.quit()
+        except Exception:
+            pass
+    _smtp_conn = None
+
+
+def _send_message(msg: EmailMessage) -> None:
+    """
+    Envia por la conexion SMTP del pool. Si lleva mas de SMTP_POOL_IDLE_SECONDS sin uso
+    se cierra; si el servidor la corto, se reabre una vez.
+    """
+    global _smtp_conn, _smtp_last_used
+    idle = float(_get_env("SMTP_POOL_IDLE_SECONDS", "60"))
+    with _smtp_lock:
+        if _smtp_conn is not None and time.monotonic() - _smtp_last_used > idle:
+            _close_smtp()
+        for attempt in range(2):
+            if _smtp_conn is None:
+                _smtp_conn = _open_smtp()
+            try:
+                _smtp_conn.send_message(msg)
+                _smtp_last_used = time.monotonic()
+                return
+            except smtplib.SMTPServerDisconnected:
+                _close_smtp()
+                if attempt:
+                    raise
+            except Exception:
+                _close_smtp()
+                raise
+
+
+def _build_message(subject: str, body: str) -> EmailMessage:
     msg = EmailMessage()
     msg["Subject"] = subject
-    msg["From"] = from_addr
-    msg["To"] = to_addr
+    msg["From"] = _get_env("SMTP_FROM")
+    msg["To"] = _get_env("SMTP_TO")
     msg.set_content(body)
-
-    try:
-        with smtplib.SMTP(host, port, timeout=10) as smtp:
-            if use_tls:
-                smtp.starttls()
-            if user and password:
-                smtp.login(user, password)
-            smtp.send_message(msg)
-    except Exception as exc:
-        # Evita romper el job por problemas de email
-        print(f"[notifications] Email error: {exc}")
+    return msg
 
 
 def send_stock_alert_email(
@@ -69,17 +89,9 @@ def send_stock_alert_email(
     quantity: int,
     min_quantity: int,
 ) -> bool:
-    if not _smtp_configured():
+    if not smtp_configured():
         return False
 
-    host = _get_env("SMTP_HOST")
-    port = int(_get_env("SMTP_PORT", "587"))
-    user = _get_env("SMTP_USER")
-    password = _get_env("SMTP_PASSWORD")
-    from_addr = _get_env("SMTP_FROM")
-    to_addr = _get_env("SMTP_TO")
-    use_tls = _get_env("SMTP_USE_TLS", "true").lower() in ("1", "true", "yes")
-
     product_label = f"{product_name} ({product_id})" if product_name else f"Producto {product_id}"
     if alert_type == AlertType.OUT_OF_STOCK:
         subject = f"Alerta de stock agotado: {product_label}"
@@ -96,20 +108,47 @@ def send_stock_alert_email(
         f"Minimo configurado: {min_quantity}\n"
     )
 
-    msg = EmailMessage()
-    msg["Subject"] = subject
-    msg["From"] = from_addr
-    msg["To"] = to_addr
-    msg.set_content(body)
-
     try:
-        with smtplib.SMTP(host, port, timeout=10) as smtp:
-            if use_tls:
-                smtp.starttls()
-            if user and password:
-                smtp.login(user, password)
-            smtp.send_message(msg)
+        _send_message(_build_message(subject, body))
         return True
     except Exception as exc:
         print(f"[notifications] Email error: {exc}")
         return False
+
+
+def send_stock_alert_digest(items: list[dict]) -> int:
+    """
+    Un unico email con todas las alertas de la ventana (por la conexion SMTP del pool), partido en
+    emails de NOTIFICATION_DIGEST_MAX_ITEMS. Cada item lleva las mismas claves que send_stock_alert_email.
+    Devuelve cuantos items (los primeros, en orden) salieron: si falla un email se para ahi y el
+    llamador solo reintenta el resto.
+    """
+    if not items or not smtp_configured():
+        return 0
+    if len(items) == 1:
+        return int(send_stock_alert_email(**items[0]))
+
+    max_items = int(_get_env("NOTIFICATION_DIGEST_MAX_ITEMS", "500"))
+    delivered = 0
+    try:
+        for start in range(0, len(items), max_items):
+            chunk = items[start:start + max_items]
+            out_of_stock = sum(1 for item in chunk if item["alert_type"] == AlertType.OUT_OF_STOCK)
+            subject = f"Resumen de alertas de stock: {len(chunk)} alertas ({out_of_stock} agotadas)"
+            lines = ["Se han detectado las siguientes alertas de stock.", ""]
+            for item in chunk:
+                product_label = (
+                    f"{item['product_name']} ({item['product_id']})"
+                    if item.get("product_name")
+                    else f"Producto {item['product_id']}"
+                )
+                kind = "AGOTADO" if item["alert_type"] == AlertType.OUT_OF_STOCK else "BAJO"
+                lines.append(
+                    f"- [{kind}] {product_label} en {item['location']}: "
+                    f"{item['quantity']} (minimo {item['min_quantity']})"
+                )
+            _send_message(_build_message(subject, "\n".join(lines) + "\n"))
+            delivered += len(chunk)
+    except Exception as exc:
+        print(f"[notifications] Email error: {exc}")
+    return delivered
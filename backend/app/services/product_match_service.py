@@ -0,0 +1,132 @@
+import os
+import re
+from collections import Counter, defaultdict
+from difflib import SequenceMatcher
+from types import SimpleNamespace
+from typing import Any, Iterable
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app.models.product import Product
+from app.repositories import product_repo
+
+
+_NON_WORD = re.compile(r"[^\w]+")
+
+
+def shortlist_size() -> int:
+    return max(int(os.getenv("IMPORT_FUZZY_CANDIDATES", "20")), 1)
+
+
+def trigrams(text: str) -> set[str]:
+    # Mismo criterio que pg_trgm: minusculas, palabra a palabra con dos espacios delante y uno detras
+    grams = set()
+    for word in _NON_WORD.sub(" ", text.lower()).split():
+        padded = f"  {word} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+def name_similarity(a: str, b: str) -> float:
+    return SequenceMatcher(a=a.strip().lower(), b=b.strip().lower()).ratio()
+
+
+class TrigramIndex:
+    """Indice invertido trigrama -> productos en memoria; devuelve solo los candidatos mas parecidos."""
+
+    def __init__(self, products: Iterable[Any] = ()) -> None:
+        self._items: list[Any] = []
+        self._sizes: list[int] = []
+        self._postings: dict[str, list[int]] = defaultdict(list)
+        for product in products:
+            self.add(product)
+
+    def add(self, product: Any) -> None:
+        position = len(self._items)
+        grams = trigrams(product.name)
+        self._items.append(product)
+        self._sizes.append(len(grams))
+        for gram in grams:
+            self._postings[gram].append(position)
+
+    def shortlist(self, name: str, limit: int) -> list[Any]:
+        grams = trigrams(name)
+        shared = Counter(position for gram in grams for position in self._postings.get(gram, ()))
+        # Similitud de trigramas (como similarity() de pg_trgm) para ordenar, no para filtrar
+        ranked = sorted(
+            shared.items(),
+            key=lambda item: item[1] / (len(grams) + self._sizes[item[0]] - item[1]),
+            reverse=True,
+        )
+        return [self._items[position] for position, _ in ranked[:limit]]
+
+
+class ProductMatcher:
+    """
+    Productos parecidos por nombre para detectar duplicados en importaciones.
+    En PostgreSQL la preseleccion sale del indice GIN pg_trgm; en otros motores de un TrigramIndex
+    cargado una vez. Solo la preseleccion se puntua con SequenceMatcher, asi fuzzy_threshold y la
+    similitud devuelta siguen siendo las de siempre.
+    """
+
+    def __init__(self, db: Session) -> None:
+        self.db = db
+        self.use_trgm = db.get_bind().dialect.name == "postgresql"
+        self._index: TrigramIndex | None = None
+        # Productos del bloque aun no insertados: no estan en la BD pero deben contar como duplicados
+        self._pending = TrigramIndex()
+
+    def _local_index(self) -> TrigramIndex:
+        if self._index is None:
+            self._index = TrigramIndex(self.db.execute(select(Product.id, Product.name, Product.sku, Product.barcode)).all())
+        return self._index
+
+    def add(self, product: Any) -> None:
+        self._pending.add(product)
+
+    def similar(self, name: str, *, threshold: float, limit: int = 3) -> list[tuple[float, Any]]:
+        size = shortlist_size()
+        if self.use_trgm:
+            candidates = product_repo.similar_by_name(self.db, name, limit=size, min_similarity=threshold)
+        else:
+            candidates = self._local_index().shortlist(name, size)
+        # Un producto creado en un bloque anterior puede salir tanto de la BD como de los pendientes
+        unique = {}
+        for candidate in [*candidates, *self._pending.shortlist(name, size)]:
+            unique.setdefault(candidate.id if candidate.id is not None else id(candidate), candidate)
+
+        scored = []
+        for candidate in unique.values():
+            ratio = name_similarity(name, candidate.name)
+            if ratio >= threshold:
+                scored.append((ratio, candidate))
+        scored.sort(key=lambda x: x[0], reverse=True)
+        return scored[:limit]
+
+
+class NameGroups:
+    """
+    Nombres ya vistos en un fichero. matches() devuelve los que ProductMatcher tomaria por duplicado
+    (mismo umbral y preseleccion) y registra el nuevo: al particionar, esas filas van juntas.
+    """
+
+    def __init__(self, threshold: float) -> None:
+        self.threshold = threshold
+        self._seen: set[str] = set()
+        self._index = TrigramIndex()
+
+    def matches(self, name: str) -> list[str]:
+        target = name.strip().lower()
+        if not target:
+            return []
+        if target in self._seen:
+            return [target]
+        similar = [
+            candidate.name
+            for candidate in self._index.shortlist(target, shortlist_size())
+            if name_similarity(target, candidate.name) >= self.threshold
+        ]
+        self._seen.add(target)
+        self._index.add(SimpleNamespace(name=target))
+        return [target, *similar]
@@ -0,0 +1,51 @@
+import logging
+from datetime import date, datetime, timedelta, timezone
+
+from sqlalchemy.orm import Session
+
+from app.repositories import movement_agg_repo, stock_snapshot_repo
+from app.services.movement_rollup_service import closed_until
+
+
+logger = logging.getLogger("app.reports")
+
+
+def snapshot_days(db: Session, start: date, end: date) -> int:
+    """Escribe los snapshots de [start, end) y amplia el rango cubierto dia a dia (un commit por dia)."""
+    floor, until = stock_snapshot_repo.covered_days(db)
+    day = start
+    while day < end:
+        stock_snapshot_repo.snapshot_day(db, day)
+        day += timedelta(days=1)
+        # start nunca pasa de until (ver backfill), asi el rango cubierto crece sin huecos
+        floor = min(start, floor) if floor else start
+        until = max(day, until) if until else day
+        stock_snapshot_repo.set_covered_days(db, floor=floor, until=until, commit=False)
+        db.commit()
+    return max((end - start).days, 0)
+
+
+def snapshot_pending(db: Session, now: datetime | None = None) -> dict:
+    now = now or datetime.now(timezone.utc)
+    end = closed_until(now)
+    _, until = stock_snapshot_repo.covered_days(db)
+    # Sin historico solo se fotografia el ultimo dia cerrado; el resto lo rellena el backfill
+    start = until or end - timedelta(days=1)
+    days = snapshot_days(db, start, end)
+    logger.info("stock snapshot done from=%s to=%s days=%s", start, end, days)
+    return {"from": start.isoformat(), "to": end.isoformat(), "days": days}
+
+
+def backfill(db: Session, start: date | None = None, now: datetime | None = None) -> dict:
+    """
+    Escribe los snapshots desde start (o desde el primer movimiento) hasta el ultimo dia cerrado.
+    Cada dia se calcula desde el stock actual restando los deltas posteriores (rollup + cola de movements).
+    """
+    now = now or datetime.now(timezone.utc)
+    end = closed_until(now)
+    _, until = stock_snapshot_repo.covered_days(db)
+    start = start or movement_agg_repo.first_movement_day(db) or end - timedelta(days=1)
+    if until is not None:
+        start = min(start, until)
+    days = snapshot_days(db, start, end)
+    return {"from": start.isoformat(), "to": end.isoformat(), "days": days}
@@ -1,6 +1,11 @@
-from sqlalchemy import select
+from collections import defaultdict
+from sqlalchemy import select, update, insert, tuple_, func, literal, and_
 from datetime import datetime, timezone, timedelta
 import logging
+import os
+import time
+import uuid
+from celery import chord
 from app.celery_app import celery_app
 from app.db.session import SessionLocal
 from app.models.enums import EventStatus, MovementType
@@ -10,76 +15,263 @@ from app.models.movement import Movement
 from app.models.alert import Alert
 from app.models.enums import AlertStatus, AlertType
 from app.models.location import Location
-from app.services.notification_service import send_low_stock_email
+from app.services import alert_dispatch_service, import_service, movement_rollup_service, stock_snapshot_service
 from app.models.stock import Stock
 from app.models.stock_threshold import StockThreshold
-from app.repositories import alert_repo
+from app.repositories import alert_repo, stock_repo, watermark_repo
 
 # Numero maximo de intentos para reintentar una tarea en caso de error retryable
 MAX_RETRIES = 3
 logger = logging.getLogger("app.tasks")
 
-@celery_app.task(name="app.tasks.scan_low_stock")
-def scan_low_stock() -> dict:
+LOW_STOCK_WATERMARK = "scan_low_stock"
+
+
+def _active_low_stock_alert():
+    return (
+        select(Alert.id)
+        .where(
+            Alert.stock_id == Stock.id,
+            Alert.alert_type == AlertType.LOW_STOCK,
+            Alert.alert_status.in_([AlertStatus.PENDING, AlertStatus.ACK]),
+        )
+        .exists()
+    )
+
+
+def _scan_low_stock_python(db, *, since: datetime | None, page_size: int) -> tuple[int, int]:
+    """
+    Recorre por paginas (keyset por id) los stocks candidatos sin alerta LOW_STOCK activa
+    y evalua el umbral (especifico de ubicacion o global) en Python.
+    Con `since` solo mira stocks o umbrales modificados desde esa fecha.
+    """
+    filters = [~_active_low_stock_alert()]
+    if since is not None:
+        changed_products = select(StockThreshold.product_id).where(StockThreshold.updated_at >= since)
+        filters.append((Stock.updated_at >= since) | (Stock.product_id.in_(changed_products)))
+
+    scanned = 0
     created = 0
-    to_notify: list[tuple[int, str | None, str, int, int]] = []
-    with SessionLocal() as db:
-        thresholds = db.scalars(select(StockThreshold)).all()
-        if not thresholds:
-            return {"created": 0}
-
-        threshold_map: dict[tuple[int, str | None], StockThreshold] = {}
-        for threshold in thresholds:
-            threshold_map[(threshold.product_id, threshold.location)] = threshold
-
-        stocks = db.execute(
-            select(Stock, Location, Product)
-            .join(Location, Stock.location_id == Location.id)
-            .join(Product, Stock.product_id == Product.id)
+    last_id = 0
+    while True:
+        rows = db.execute(
+            select(Stock.id, Stock.product_id, Stock.location_id, Stock.quantity)
+            .where(Stock.id > last_id, *filters)
+            .order_by(Stock.id)
+            .limit(page_size)
         ).all()
-        for stock, location, product in stocks:
-            threshold = threshold_map.get((stock.product_id, location.code)) or threshold_map.get(
-                (stock.product_id, None)
-            )
-            if not threshold:
-                continue
+        if not rows:
+            break
+        scanned += len(rows)
+        last_id = rows[-1].id
 
-            if stock.quantity >= threshold.min_quantity:
+        thresholds = db.scalars(
+            select(StockThreshold).where(StockThreshold.product_id.in_({row.product_id for row in rows}))
+        ).all()
+        threshold_map = {(t.product_id, t.location_id): t.min_quantity for t in thresholds}
+
+        new_alerts: list[dict] = []
+        for row in rows:
+            min_quantity = threshold_map.get((row.product_id, row.location_id))
+            if min_quantity is None:
+                min_quantity = threshold_map.get((row.product_id, None))
+            if min_quantity is None or row.quantity >= min_quantity:
                 continue
-
-            existing = db.scalar(
-                select(Alert).where(
-                    Alert.stock_id == stock.id,
-                    Alert.alert_status.in_([AlertStatus.PENDING, AlertStatus.ACK]),
-                )
+            new_alerts.append(
+                {"stock_id": row.id, "quantity": row.quantity, "min_quantity": min_quantity}
             )
-            if existing:
-                continue
+        created += len(alert_repo.create_alerts_bulk(db, new_alerts))
+
+        if len(rows) < page_size:
+            break
+    return scanned, created
+
+
+def _scan_low_stock_sql(db, *, since: datetime | None) -> tuple[int | None, int]:
+    """
+    Evalua todo el predicado en una sola sentencia: umbral especifico de ubicacion
+    con COALESCE al global, sin alerta LOW_STOCK activa, e inserta con INSERT ... SELECT.
+    """
+    def _threshold(location_match):
+        return (
+            select(StockThreshold.min_quantity)
+            .where(StockThreshold.product_id == Stock.product_id, location_match)
+            .order_by(StockThreshold.id.desc())
+            .limit(1)
+            .scalar_subquery()
+        )
+
+    min_quantity = func.coalesce(
+        _threshold(StockThreshold.location_id == Stock.location_id),
+        _threshold(StockThreshold.location_id.is_(None)),
+    )
+    filters = [~_active_low_stock_alert()]
+    if since is not None:
+        changed_products = select(StockThreshold.product_id).where(StockThreshold.updated_at >= since)
+        filters.append((Stock.updated_at >= since) | (Stock.product_id.in_(changed_products)))
+
+    candidates = (
+        select(Stock.id.label("stock_id"), Stock.quantity.label("quantity"), min_quantity.label("min_quantity"))
+        .where(*filters)
+        .subquery()
+    )
+    offending = select(
+        candidates.c.stock_id,
+        candidates.c.quantity,
+        candidates.c.min_quantity,
+        literal(AlertType.LOW_STOCK, Alert.alert_type.type),
+        literal(AlertStatus.PENDING, Alert.alert_status.type),
+        literal(False, Alert.notification_sent.type),
+    ).where(and_(candidates.c.min_quantity.is_not(None), candidates.c.quantity < candidates.c.min_quantity))
+
+    alert_ids = alert_repo.create_alerts_from_select(
+        db,
+        ["stock_id", "quantity", "min_quantity", "alert_type", "alert_status", "notification_sent"],
+        offending,
+    )
+    # En modo SQL solo salen de la BD los ids de las filas infractoras; contar las evaluadas
+    # costaria otra pasada completa, asi que scanned no se mide (None)
+    return None, len(alert_ids)
 
-            alert_repo.create_alert(
-                db,
-                stock_id=stock.id,
-                quantity=stock.quantity,
-                min_quantity=threshold.min_quantity,
-                alert_type=AlertType.LOW_STOCK,
-                status=AlertStatus.PENDING,
-            )
-            created += 1
-            to_notify.append(
-                (stock.product_id, product.name, location.code, stock.quantity, threshold.min_quantity)
-            )
 
-    if to_notify:
-        for product_id, product_name, location_code, quantity, min_quantity in to_notify:
-            send_low_stock_email(
-                product_id=product_id,
-                product_name=product_name,
-                location=location_code,
-                quantity=quantity,
-                min_quantity=min_quantity,
+@celery_app.task(name="app.tasks.scan_low_stock")
+def scan_low_stock(mode: str = "incremental", strategy: str | None = None) -> dict:
+    """
+    mode="incremental": solo stocks/umbrales cambiados desde la ultima marca de agua.
+    mode="full": reconciliacion completa bajo demanda.
+    strategy="sql": evaluacion en la BD con INSERT ... SELECT; "python": paginado en Python.
+    """
+    if mode not in {"incremental", "full"}:
+        raise ValueError(f"Modo de escaneo no soportado: {mode}")
+    strategy = strategy or os.getenv("LOW_STOCK_SCAN_STRATEGY", "sql")
+    if strategy not in {"sql", "python"}:
+        raise ValueError(f"Estrategia de escaneo no soportada: {strategy}")
+    page_size = int(os.getenv("LOW_STOCK_SCAN_PAGE_SIZE", "1000"))
+    overlap = timedelta(seconds=int(os.getenv("LOW_STOCK_SCAN_OVERLAP_SECONDS", "30")))
+    started_at = datetime.now(timezone.utc)
+
+    with SessionLocal() as db:
+        since = None
+        if mode == "incremental":
+            watermark = watermark_repo.get(db, LOW_STOCK_WATERMARK)
+            if watermark is not None and watermark.watermark_at is not None:
+                # Solapamiento para no perder transacciones que confirmaron tarde
+                since = watermark.watermark_at - overlap
+
+        t0 = time.perf_counter()
+        if strategy == "sql":
+            scanned, created = _scan_low_stock_sql(db, since=since)
+        else:
+            scanned, created = _scan_low_stock_python(db, since=since, page_size=page_size)
+        elapsed_ms = (time.perf_counter() - t0) * 1000.0
+        watermark_repo.set_watermark(db, LOW_STOCK_WATERMARK, watermark_at=started_at)
+
+    logger.info(
+        "scan_low_stock done mode=%s strategy=%s scanned=%s created=%s elapsed_ms=%.1f",
+        mode,
+        strategy,
+        scanned,
+        created,
+        elapsed_ms,
+    )
+    return {
+        "created": created,
+        "scanned": scanned,
+        "mode": mode,
+        "strategy": strategy,
+        "elapsed_ms": round(elapsed_ms, 3),
+    }
+
+
+@celery_app.task(name="app.tasks.dispatch_notifications")
+def dispatch_notifications() -> dict:
+    """
+    Drena el outbox de notificaciones por lotes (email, FCM y WebSocket fuera de la peticion HTTP).
+    """
+    batch_size = int(os.getenv("NOTIFICATION_OUTBOX_BATCH_SIZE", "200"))
+    max_rounds = int(os.getenv("NOTIFICATION_OUTBOX_MAX_ROUNDS", "20"))
+    # Ventana de agrupacion: una alerta espera al menos esto antes de enviarse
+    coalesce_seconds = float(os.getenv("NOTIFICATION_COALESCE_SECONDS", "5"))
+    totals = {"claimed": 0, "sent": 0, "failed": 0}
+    # Lo que falla en esta ejecucion espera a su backoff aunque queden rondas
+    failed_ids: set[int] = set()
+    with SessionLocal() as db:
+        for _ in range(max_rounds):
+            result = alert_dispatch_service.dispatch_pending(
+                db, batch_size=batch_size, coalesce_seconds=coalesce_seconds, exclude_ids=failed_ids
             )
+            for key in totals:
+                totals[key] += result[key]
+            failed_ids.update(result["failed_ids"])
+            if result["claimed"] < batch_size:
+                break
+    if totals["claimed"]:
+        logger.info("dispatch_notifications done claimed=%s sent=%s failed=%s", totals["claimed"], totals["sent"], totals["failed"])
+    return totals
+
+
+@celery_app.task(name="app.tasks.rollup_movements")
+def rollup_movements() -> dict:
+    """
+    Consolida en movement_daily_agg los dias UTC ya cerrados desde la ultima marca de agua.
+    """
+    with SessionLocal() as db:
+        return movement_rollup_service.rollup_pending(db)
+
+
+@celery_app.task(name="app.tasks.snapshot_stocks")
+def snapshot_stocks() -> dict:
+    """
+    Guarda el stock al cierre de cada dia UTC ya cerrado (stock_snapshots) desde la ultima marca de agua.
+    """
+    with SessionLocal() as db:
+        return stock_snapshot_service.snapshot_pending(db)
+
+
+@celery_app.task(name="app.tasks.import_csv_batch")
+def import_csv_batch(batch_id: int) -> dict:
+    """
+    Procesa en segundo plano un lote de importacion CSV subido a /imports (ficheros grandes).
+    Con IMPORT_PARTITIONS > 1 reparte las filas por producto y las procesa en paralelo con un chord.
+    """
+    partitions = import_service.partition_count()
+    with SessionLocal() as db:
+        if not import_service.uses_partitions(db, batch_id, partitions):
+            return import_service.run_batch(db, batch_id)
+        indexes = import_service.split_batch(db, batch_id, partitions)
+        if indexes is None:
+            return {"batch_id": batch_id, "skipped": True}
+        if not indexes:
+            return import_service.finish_partitions(db, batch_id, [])
+    chord(import_csv_partition.s(batch_id, index) for index in indexes)(finish_import_partitions.s(batch_id))
+    return {"batch_id": batch_id, "partitions": len(indexes)}
+
+
+@celery_app.task(name="app.tasks.import_csv_partition")
+def import_csv_partition(batch_id: int, index: int) -> dict:
+    with SessionLocal() as db:
+        return import_service.run_partition(db, batch_id, index)
+
+
+@celery_app.task(name="app.tasks.finish_import_partitions")
+def finish_import_partitions(results: list[dict], batch_id: int) -> dict:
+    # Callback del chord: recibe los resultados de todas las particiones
+    with SessionLocal() as db:
+        return import_service.finish_partitions(db, batch_id, results)
+
+
+@celery_app.task(name="app.tasks.resume_import_batches")
+def resume_import_batches() -> dict:
+    """
+    Reencola los lotes que se quedaron en PROCESSING sin checkpoint reciente (worker caido o
+    reiniciado); continuan desde la primera fila no aplicada.
+    """
+    with SessionLocal() as db:
+        batch_ids = import_service.requeue_stale(db)
+    for batch_id in batch_ids:
+        import_csv_batch.delay(batch_id)
+    return {"requeued": batch_ids}
 
-    return {"created": created}
 
 # Permite justificar fácilmente en la memoria del proyecto
 def is_retryable_error(exc: Exception) -> bool:
@@ -174,8 +366,13 @@ def process_event(event_id: int) -> dict:
         # 3) Transaccion: ajustar stock + crear movement + marcar evento PROCESSED
         try:
             # >>> CAMBIO ANADIDO: lock del evento para idempotencia real
+            # populate_existing: el evento ya esta en el identity map (db.get de arriba); sin el
+            # re-read bajo lock veria el PENDING antiguo aunque otro worker ya lo haya aplicado
             event = db.scalar(
-                select(Event).where(Event.id == event_id).with_for_update()
+                select(Event)
+                .where(Event.id == event_id)
+                .with_for_update()
+                .execution_options(populate_existing=True)
             )
 
             if not event:
@@ -191,21 +388,8 @@ def process_event(event_id: int) -> dict:
                 return {"ok": True, "reason": "already_processed", "status": event.event_status.value}
             # <<< FIN CAMBIO ANADIDO
 
-            # Lock del stock para evitar carreras
-            stock = db.scalar(
-                select(Stock)
-                .where(
-                    Stock.product_id == event.product_id,
-                    Stock.location_id == event.location_id,
-                )
-                .with_for_update()
-            )
-
-            if not stock:
-                # crear stock 0 dentro de la transaccion
-                stock = Stock(product_id=event.product_id, location_id=event.location_id, quantity=0)
-                db.add(stock)
-                db.flush()
+            # Upsert del stock (crea la fila a 0 si falta) que ademas la deja bloqueada
+            stock = stock_repo.upsert_stock(db, product_id=event.product_id, location_id=event.location_id)
 
             new_qty = stock.quantity + stock_delta
             if new_qty < 0:
@@ -291,24 +475,362 @@ def process_event(event_id: int) -> dict:
             }
 
 
+def _validate_event(event: Event, product_ids: set[int], location_ids: set[int]) -> tuple[str, str] | None:
+    # Mismas validaciones (y mensajes) que process_event, pero contra ids precargados
+    if event.delta <= 0:
+        return "invalid_delta", "Delta invalido (debe ser > 0)"
+    if event.product_id not in product_ids:
+        return "product_not_found", "Producto no encontrado"
+    if not event.location_id:
+        return "location_missing", "Ubicacion no informada"
+    if event.location_id not in location_ids:
+        return "location_not_found", "Ubicacion no encontrada"
+    if event.event_type.value not in {"SENSOR_IN", "SENSOR_OUT"}:
+        return "invalid_event_type", f"Tipo de evento no soportado: {event.event_type}"
+    return None
+
+
+def _mark_event_error(event: Event, message: str, now: datetime) -> None:
+    event.event_status = EventStatus.ERROR
+    event.last_error = message[:255]
+    event.retry_count += 1
+    event.processed_at = now
+
+
+def _event_refs(db, events: list[Event]) -> tuple[set[int], set[int]]:
+    product_ids = set(
+        db.scalars(select(Product.id).where(Product.id.in_({e.product_id for e in events}))).all()
+    )
+    location_ids = set(
+        db.scalars(
+            select(Location.id).where(Location.id.in_({e.location_id for e in events if e.location_id}))
+        ).all()
+    )
+    return product_ids, location_ids
+
+
+def _movement_for(event: Event) -> tuple[MovementType, int]:
+    if event.event_type.value == "SENSOR_IN":
+        return MovementType.IN, event.delta
+    return MovementType.OUT, -event.delta
+
+
+def _apply_event_batch(db, events: list[Event]) -> dict:
+    """Camino rapido: un UPDATE por fila de stock y un INSERT multi-fila. Sin commit."""
+    now = datetime.now(timezone.utc)
+    product_ids, location_ids = _event_refs(db, events)
+
+    errors = 0
+    groups: dict[tuple[int, int], list[Event]] = defaultdict(list)
+    for event in events:
+        issue = _validate_event(event, product_ids, location_ids)
+        if issue:
+            reason, message = issue
+            _mark_event_error(event, message, now)
+            errors += 1
+            logger.warning("process_events_batch %s event_id=%s", reason, event.id)
+            continue
+        groups[(event.product_id, event.location_id)].append(event)
+
+    if not groups:
+        return {"processed": 0, "errors": errors}
+
+    # Crea las filas que falten y bloquea todas las del lote en orden estable (evita deadlocks entre workers)
+    keys = sorted(groups)
+    stock_repo.ensure_stocks(db, keys)
+    stocks = {
+        (stock.product_id, stock.location_id): stock
+        for stock in db.scalars(
+            select(Stock)
+            .where(tuple_(Stock.product_id, Stock.location_id).in_(keys))
+            .order_by(Stock.product_id, Stock.location_id)
+            .with_for_update()
+        ).all()
+    }
+
+    movements: list[dict] = []
+    processed_ids: list[int] = []
+    for key in keys:
+        stock = stocks[key]
+        quantity = stock.quantity
+        for event in groups[key]:
+            movement_type, stock_delta = _movement_for(event)
+            if quantity + stock_delta < 0:
+                _mark_event_error(event, "Stock insuficiente para aplicar SENSOR_OUT", now)
+                errors += 1
+                logger.warning("process_events_batch insufficient_stock event_id=%s", event.id)
+                continue
+            quantity += stock_delta
+            movements.append(
+                {
+                    "product_id": event.product_id,
+                    "quantity": event.delta,
+                    "delta": stock_delta,
+                    "user_id": None,
+                    "movement_type": movement_type,
+                    "movement_source": event.source,
+                    "location_id": event.location_id,
+                }
+            )
+            processed_ids.append(event.id)
+
+        # Un unico UPDATE por fila de stock con el delta neto del grupo
+        if quantity != stock.quantity:
+            stock.quantity = quantity
+
+    if movements:
+        db.execute(insert(Movement), movements)
+    if processed_ids:
+        db.execute(
+            update(Event)
+            .where(Event.id.in_(processed_ids))
+            .values(event_status=EventStatus.PROCESSED, last_error=None, processed_at=now)
+        )
+    return {"processed": len(processed_ids), "errors": errors}
+
+
+def _apply_events_one_by_one(db, events: list[Event]) -> dict:
+    """
+    Camino de respaldo si el lote falla: cada evento en su SAVEPOINT, asi un fallo solo cuenta
+    (retry_count, PENDING/ERROR) para ese evento, igual que en process_event. Sin commit.
+    """
+    now = datetime.now(timezone.utc)
+    product_ids, location_ids = _event_refs(db, events)
+    result = {"processed": 0, "errors": 0, "retry_ids": []}
+    for event in events:
+        issue = _validate_event(event, product_ids, location_ids)
+        if issue:
+            _mark_event_error(event, issue[1], now)
+            result["errors"] += 1
+            continue
+        movement_type, stock_delta = _movement_for(event)
+        try:
+            with db.begin_nested():
+                stock = stock_repo.upsert_stock(db, product_id=event.product_id, location_id=event.location_id)
+                if stock.quantity + stock_delta < 0:
+                    _mark_event_error(event, "Stock insuficiente para aplicar SENSOR_OUT", now)
+                    result["errors"] += 1
+                    continue
+                stock.quantity += stock_delta
+                db.add(
+                    Movement(
+                        product_id=event.product_id,
+                        quantity=event.delta,
+                        delta=stock_delta,
+                        user_id=None,
+                        movement_type=movement_type,
+                        movement_source=event.source,
+                        location_id=event.location_id,
+                    )
+                )
+                event.event_status = EventStatus.PROCESSED
+                event.last_error = None
+                event.processed_at = now
+                db.flush()
+            result["processed"] += 1
+        except Exception as exc:
+            event.retry_count += 1
+            event.last_error = str(exc)[:255]
+            event.processed_at = now
+            if is_retryable_error(exc) and event.retry_count < MAX_RETRIES:
+                event.event_status = EventStatus.PENDING
+                result["retry_ids"].append(event.id)
+            else:
+                event.event_status = EventStatus.ERROR
+                result["errors"] += 1
+            logger.warning("process_events_batch event_failed event_id=%s error=%s", event.id, event.last_error)
+    return result
+
+
+def _release_leases(db, event_ids: list[int]) -> None:
+    # El lease de requeue_pending_events solo cubre el despacho; al terminar se libera
+    db.execute(
+        update(Event)
+        .where(Event.id.in_(event_ids), Event.lease_owner.is_not(None))
+        .values(lease_owner=None, lease_expires_at=None)
+    )
+
+
+@celery_app.task(name="app.tasks.process_events_batch")
+def process_events_batch(event_ids: list[int] | None = None) -> dict:
+    """
+    Procesa eventos PENDING en lotes: sin ids drena la cola en bloques de
+    `event_batch_size` hasta que un bloque sale incompleto. El drenado periodico solo toma
+    eventos con mas de `event_batch_linger_seconds` (los recien creados ya van por
+    process_event) y sin lease vigente de requeue_pending_events.
+    """
+    batch_size = int(celery_app.conf.event_batch_size)
+    linger = timedelta(seconds=float(celery_app.conf.event_batch_linger_seconds))
+    totals = {"claimed": 0, "processed": 0, "errors": 0, "retried": 0}
+    remaining = list(event_ids) if event_ids is not None else None
+    retry_ids: list[int] = []
+
+    while True:
+        if remaining is not None:
+            chunk, remaining = remaining[:batch_size], remaining[batch_size:]
+            if not chunk:
+                break
+        with SessionLocal() as db:
+            now = datetime.now(timezone.utc)
+            stmt = select(Event).where(Event.event_status == EventStatus.PENDING)
+            if remaining is not None:
+                stmt = stmt.where(Event.id.in_(chunk))
+            else:
+                stmt = stmt.where(
+                    Event.retry_count < MAX_RETRIES,
+                    Event.created_at < now - linger,
+                    (Event.lease_expires_at.is_(None)) | (Event.lease_expires_at < now),
+                )
+            events = db.scalars(
+                stmt.order_by(Event.id).limit(batch_size).with_for_update(skip_locked=True)
+            ).all()
+            if not events:
+                if remaining is None:
+                    break
+                continue
+            totals["claimed"] += len(events)
+            claimed_ids = [event.id for event in events]
+
+            try:
+                result = _apply_event_batch(db, list(events))
+                _release_leases(db, claimed_ids)
+                db.commit()
+            except Exception:
+                db.rollback()
+                logger.exception("process_events_batch batch_failed claimed=%s, retrying event by event", len(claimed_ids))
+                events = db.scalars(
+                    select(Event)
+                    .where(Event.id.in_(claimed_ids), Event.event_status == EventStatus.PENDING)
+                    .order_by(Event.id)
+                    .with_for_update(skip_locked=True)
+                ).all()
+                result = _apply_events_one_by_one(db, list(events))
+                _release_leases(db, claimed_ids)
+                db.commit()
+                retry_ids.extend(result["retry_ids"])
+                totals["retried"] += len(result["retry_ids"])
+            totals["processed"] += result["processed"]
+            totals["errors"] += result["errors"]
+
+        if remaining is None and len(events) < batch_size:
+            break
+
+    if retry_ids:
+        # Reintento explicito, como process_event; si el broker falla los recoge el drenado periodico
+        try:
+            process_events_batch.delay(retry_ids)
+        except Exception:
+            logger.exception("process_events_batch requeue_failed retry=%s", len(retry_ids))
+
+    logger.info(
+        "process_events_batch done claimed=%s processed=%s errors=%s retried=%s",
+        totals["claimed"],
+        totals["processed"],
+        totals["errors"],
+        totals["retried"],
+    )
+    return totals
+
+
+def enqueue_events(event_ids: list[int]) -> None:
+    # Encola muchos eventos con pocos mensajes: cada bloque se procesa como un micro-lote
+    if not event_ids:
+        return
+    chunk_size = max(1, int(os.getenv("EVENT_ENQUEUE_CHUNK_SIZE", "50")))
+    for start in range(0, len(event_ids), chunk_size):
+        process_events_batch.delay(event_ids[start:start + chunk_size])
+
+
+def _dispatch_settings() -> dict:
+    return {
+        "min_batch": int(os.getenv("EVENT_DISPATCH_MIN_BATCH", "100")),
+        "max_batch": int(os.getenv("EVENT_DISPATCH_MAX_BATCH", "5000")),
+        "max_rounds": int(os.getenv("EVENT_DISPATCH_MAX_ROUNDS", "20")),
+        "lease_seconds": int(os.getenv("EVENT_LEASE_SECONDS", "300")),
+        "grace_seconds": int(os.getenv("PENDING_EVENTS_GRACE_SECONDS", "60")),
+        "backlog_countdown": int(os.getenv("EVENT_DISPATCH_BACKLOG_COUNTDOWN", "1")),
+    }
+
+
 @celery_app.task(name="app.tasks.requeue_pending_events")
 def requeue_pending_events() -> dict:
-    requeued = 0
-    cutoff = datetime.now(timezone.utc) - timedelta(minutes=2)
+    """
+    Dispatcher de eventos PENDING basado en leases: reclama filas con
+    FOR UPDATE SKIP LOCKED, les pone owner + caducidad y solo vuelve a
+    despachar las que no tienen lease vigente.
+    """
+    cfg = _dispatch_settings()
+    owner = f"dispatcher-{uuid.uuid4().hex[:12]}"
+    now = datetime.now(timezone.utc)
+    eligible = (
+        Event.event_status == EventStatus.PENDING,
+        Event.retry_count < MAX_RETRIES,
+        # los recien creados ya se encolaron en la ingesta
+        Event.created_at < now - timedelta(seconds=cfg["grace_seconds"]),
+        (Event.lease_expires_at.is_(None)) | (Event.lease_expires_at < now),
+    )
+
+    # Basta con saber si el atasco llena todas las rondas: conteo acotado, no de toda la cola
+    backlog_cap = cfg["max_rounds"] * cfg["max_batch"] + 1
     with SessionLocal() as db:
-        events = db.scalars(
-            select(Event)
-            .where(
-                Event.event_status == EventStatus.PENDING,
-                Event.retry_count < MAX_RETRIES,
-                (Event.processed_at.is_(None)) | (Event.processed_at < cutoff),
+        backlog = db.scalar(
+            select(func.count()).select_from(
+                select(Event.id).where(*eligible).limit(backlog_cap).subquery()
             )
-            .limit(100)
-        ).all()
+        ) or 0
+    # Tamano de lote proporcional al atasco, acotado
+    batch_size = min(cfg["max_batch"], max(cfg["min_batch"], backlog))
+    dispatch_chunk = max(1, int(celery_app.conf.event_batch_size))
 
-        for event in events:
-            process_event.delay(event.id)
-            requeued += 1
+    requeued = 0
+    saturated = False
+    for _ in range(cfg["max_rounds"]):
+        with SessionLocal() as db:
+            ids = db.scalars(
+                select(Event.id)
+                .where(*eligible)
+                .order_by(Event.id)
+                .limit(batch_size)
+                .with_for_update(skip_locked=True)
+            ).all()
+            if not ids:
+                saturated = False
+                break
+            db.execute(
+                update(Event)
+                .where(Event.id.in_(ids))
+                .values(
+                    lease_owner=owner,
+                    lease_expires_at=now + timedelta(seconds=cfg["lease_seconds"]),
+                )
+            )
+            db.commit()
 
-    logger.info("requeue_pending_events done requeued=%s", requeued)
-    return {"requeued": requeued}
+        try:
+            for start in range(0, len(ids), dispatch_chunk):
+                process_events_batch.delay(list(ids[start:start + dispatch_chunk]))
+        except Exception:
+            # El lease caduca solo y los eventos se reintentan en otra pasada
+            logger.exception("requeue_pending_events dispatch_failed owner=%s", owner)
+            saturated = False
+            break
+        requeued += len(ids)
+        saturated = len(ids) == batch_size
+        if not saturated:
+            break
+
+    # Si aun queda cola, no esperar al siguiente tick de beat
+    if saturated:
+        try:
+            requeue_pending_events.apply_async(countdown=cfg["backlog_countdown"])
+        except Exception:
+            logger.exception("requeue_pending_events reschedule_failed owner=%s", owner)
+
+    logger.info(
+        "requeue_pending_events done requeued=%s backlog=%s batch_size=%s rescheduled=%s",
+        requeued,
+        backlog,
+        batch_size,
+        saturated,
+    )
+    return {"requeued": requeued, "backlog": backlog, "batch_size": batch_size, "rescheduled": saturated}
@@ -82,6 +82,17 @@ def publish_alert(alert: AlertResponse) -> None:
         pass
 
 
+def publish_import_progress(payload: dict[str, Any]) -> None:
+    # Se llama desde el worker: solo Redis, el listener de cada API lo reenvia a sus sockets
+    client = get_redis()
+    if client is None:
+        return
+    try:
+        client.publish(ALERTS_CHANNEL, json.dumps(jsonable_encoder(payload)))
+    except Exception:
+        pass
+
+
 async def start_redis_listener() -> None:
     redis_url = os.getenv("REDIS_URL") or f"redis://{os.getenv('REDIS_HOST', 'redis')}:{os.getenv('REDIS_PORT', '6379')}/0"
     client = aioredis.from_url(redis_url)
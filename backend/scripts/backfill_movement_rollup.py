@@ -0,0 +1,32 @@
+"""
+Rellena (o reconstruye) movement_daily_agg a partir de movements.
+
+Uso: python scripts/backfill_movement_rollup.py [--from YYYY-MM-DD]
+Sin --from reconstruye todo el historico; con --from rehace desde ese dia hasta el ultimo dia cerrado.
+"""
+import argparse
+import sys
+from datetime import date
+from pathlib import Path
+
+
+def main() -> int:
+    backend_root = Path(__file__).resolve().parents[1]
+    if str(backend_root) not in sys.path:
+        sys.path.insert(0, str(backend_root))
+
+    from app.db.session import SessionLocal  # noqa: WPS433
+    from app.services import movement_rollup_service  # noqa: WPS433
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--from", dest="start", type=date.fromisoformat, default=None)
+    args = parser.parse_args()
+
+    with SessionLocal() as db:
+        result = movement_rollup_service.backfill(db, start=args.start)
+    print(f"movement_daily_agg: {result['days']} dias consolidados ({result['from']} -> {result['to']})")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
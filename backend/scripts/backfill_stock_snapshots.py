@@ -0,0 +1,33 @@
+"""
+Rellena (o reconstruye) stock_snapshots a partir del stock actual y los movimientos.
+
+Uso: python scripts/backfill_stock_snapshots.py [--from YYYY-MM-DD]
+Sin --from empieza en el primer movimiento; con --from rehace desde ese dia hasta el ultimo dia cerrado.
+Conviene ejecutar antes backfill_movement_rollup.py: los dias consolidados abaratan el calculo.
+"""
+import argparse
+import sys
+from datetime import date
+from pathlib import Path
+
+
+def main() -> int:
+    backend_root = Path(__file__).resolve().parents[1]
+    if str(backend_root) not in sys.path:
+        sys.path.insert(0, str(backend_root))
+
+    from app.db.session import SessionLocal  # noqa: WPS433
+    from app.services import stock_snapshot_service  # noqa: WPS433
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--from", dest="start", type=date.fromisoformat, default=None)
+    args = parser.parse_args()
+
+    with SessionLocal() as db:
+        result = stock_snapshot_service.backfill(db, start=args.start)
+    print(f"stock_snapshots: {result['days']} dias guardados ({result['from']} -> {result['to']})")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
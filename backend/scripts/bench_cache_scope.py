@@ -0,0 +1,71 @@
+"""
+Simula la tasa de aciertos de la cache con claves por usuario (antes) y con el alcance
+de CACHE_SCOPES (ahora). No necesita Redis: usa LocalCache como almacen.
+
+Uso: python scripts/bench_cache_scope.py [--users 400] [--requests 200000] [--max-entries 5000]
+"""
+import argparse
+import random
+import sys
+from pathlib import Path
+from types import SimpleNamespace
+
+
+def build_workload(users: int, requests: int, seed: int) -> list[tuple[SimpleNamespace, str, dict]]:
+    rng = random.Random(seed)
+    roles = ["USER"] * 90 + ["MANAGER"] * 8 + ["ADMIN"] * 2
+    people = [SimpleNamespace(id=i + 1, role=rng.choice(roles)) for i in range(users)]
+    # Las primeras paginas y los productos mas usados concentran casi todo el trafico
+    endpoints = [
+        ("products:list", lambda: {"limit": 50, "offset": 50 * min(int(rng.paretovariate(2)) - 1, 20)}),
+        ("stocks:list", lambda: {"limit": 50, "offset": 50 * min(int(rng.paretovariate(2)) - 1, 20)}),
+        ("products:detail", lambda: {"id": min(int(rng.paretovariate(1.2)), 2000)}),
+        ("movements:list", lambda: {"limit": 50, "offset": 0, "order_dir": "desc"}),
+        ("reports:turnover", lambda: {"limit": 10, "offset": 0}),
+    ]
+    weights = [40, 25, 25, 8, 2]
+    workload = []
+    for _ in range(requests):
+        prefix, params = rng.choices(endpoints, weights=weights)[0]
+        workload.append((rng.choice(people), prefix, params()))
+    return workload
+
+
+def run(workload, key_fn, max_entries: int) -> dict[str, float]:
+    from app.cache.redis_cache import LocalCache
+
+    store = LocalCache(max_entries=max_entries, max_bytes=max_entries * 1024, ttl_seconds=3600)
+    keys = set()
+    for user, prefix, params in workload:
+        key = key_fn(prefix, user, params)
+        keys.add(key)
+        if store.get(key) is None:
+            store.set(key, True, size=1024, ttl_seconds=3600)
+    total = store.hits + store.misses
+    return {"hit_ratio": store.hits / total if total else 0.0, "distinct_keys": len(keys)}
+
+
+def main() -> int:
+    backend_root = Path(__file__).resolve().parents[1]
+    if str(backend_root) not in sys.path:
+        sys.path.insert(0, str(backend_root))
+
+    from app.cache.redis_cache import make_key, scoped_key
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=400)
+    parser.add_argument("--requests", type=int, default=200_000)
+    parser.add_argument("--max-entries", type=int, default=5000)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    workload = build_workload(args.users, args.requests, args.seed)
+    before = run(workload, lambda prefix, user, params: make_key(prefix, user.id, params), args.max_entries)
+    after = run(workload, scoped_key, args.max_entries)
+    for label, result in (("por usuario", before), ("CACHE_SCOPES", after)):
+        print(f"{label:>13}: hit_ratio={result['hit_ratio']:.3f} claves_distintas={result['distinct_keys']}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -1,10 +1,15 @@
+from datetime import datetime, timedelta, timezone
 from uuid import uuid4
 
 from app.models.alert import Alert
 from app.models.category import Category
-from app.models.enums import AlertStatus, AlertType
+from app.models.enums import AlertStatus, AlertType, OutboxStatus
+from app.models.notification_outbox import NotificationOutbox
 from app.models.product import Product
-from app.repositories import stock_repo
+from app.models.stock_threshold import StockThreshold
+from app.repositories import alert_repo, stock_repo
+from app.services import alert_dispatch_service
+from app.tasks import dispatch_notifications, scan_low_stock
 
 
 def _auth_header(token: str) -> dict[str, str]:
@@ -76,3 +81,267 @@ def test_alerts_for_user_role_only_include_low_and_out_of_stock(client, db):
     items = response.json()["items"]
     assert any(item["alert_type"] == AlertType.LOW_STOCK.value for item in items)
     assert all(item["alert_type"] in {AlertType.LOW_STOCK.value, AlertType.OUT_OF_STOCK.value} for item in items)
+
+
+def _low_stock_alerts(db) -> list[Alert]:
+    db.expire_all()
+    return db.query(Alert).filter(Alert.alert_type == AlertType.LOW_STOCK).all()
+
+
+def test_scan_low_stock_incremental_only_creates_new_alerts(db):
+    category = Category(name=f"Categoria-{uuid4().hex}")
+    db.add(category)
+    db.commit()
+    db.refresh(category)
+
+    product = Product(
+        sku=f"SKU-{uuid4().hex[:8]}",
+        name="Producto escaneo",
+        barcode=f"{uuid4().hex[:12]}",
+        category_id=category.id,
+        active=True,
+    )
+    db.add(product)
+    db.commit()
+    db.refresh(product)
+
+    low = stock_repo.create_stock(db, product_id=product.id, location="ALM-A", quantity=2)
+    ok = stock_repo.create_stock(db, product_id=product.id, location="ALM-B", quantity=10)
+    db.add(StockThreshold(product_id=product.id, location_id=None, min_quantity=5))
+    db.commit()
+
+    first = scan_low_stock()
+    assert first["created"] == 1
+    assert [alert.stock_id for alert in _low_stock_alerts(db)] == [low.id]
+
+    # Sin cambios: el anti-join evita duplicados
+    assert scan_low_stock()["created"] == 0
+
+    stock_repo.update_stock_quantity(db, ok, 1)
+    assert scan_low_stock()["created"] == 1
+    assert sorted(alert.stock_id for alert in _low_stock_alerts(db)) == sorted([low.id, ok.id])
+
+    assert scan_low_stock(mode="full")["created"] == 0
+
+
+def test_scan_low_stock_sql_and_python_strategies_match(db):
+    category = Category(name=f"Categoria-{uuid4().hex}")
+    db.add(category)
+    db.commit()
+    db.refresh(category)
+
+    product = Product(
+        sku=f"SKU-{uuid4().hex[:8]}",
+        name="Producto estrategias",
+        barcode=f"{uuid4().hex[:12]}",
+        category_id=category.id,
+        active=True,
+    )
+    db.add(product)
+    db.commit()
+    db.refresh(product)
+
+    # El umbral especifico de ubicacion prevalece sobre el global
+    override = stock_repo.create_stock(db, product_id=product.id, location="ALM-X", quantity=4)
+    low = stock_repo.create_stock(db, product_id=product.id, location="ALM-Y", quantity=4)
+    db.add(StockThreshold(product_id=product.id, location_id=None, min_quantity=5))
+    db.add(StockThreshold(product_id=product.id, location_id=override.location_id, min_quantity=3))
+    db.commit()
+
+    sql = scan_low_stock(mode="full", strategy="sql")
+    assert sql["strategy"] == "sql"
+    assert sql["created"] == 1
+    assert sql["elapsed_ms"] >= 0
+    alerts = _low_stock_alerts(db)
+    assert [(alert.stock_id, alert.quantity, alert.min_quantity) for alert in alerts] == [(low.id, 4, 5)]
+    assert alerts[0].alert_status == AlertStatus.PENDING
+
+    db.query(Alert).delete()
+    db.commit()
+    python = scan_low_stock(mode="full", strategy="python")
+    assert python["created"] == 1
+    # scanned son las filas de stock evaluadas; la estrategia SQL no las cuenta
+    assert sql["scanned"] is None
+    assert python["scanned"] >= 2
+    assert [alert.stock_id for alert in _low_stock_alerts(db)] == [low.id]
+
+
+def test_alert_notifications_go_through_outbox(db, monkeypatch):
+    published = []
+    emails = []
+    monkeypatch.setenv("NOTIFICATION_COALESCE_SECONDS", "0")
+    monkeypatch.setattr(alert_dispatch_service, "publish_alert", lambda alert: published.append(alert.id))
+    monkeypatch.setattr(
+        alert_dispatch_service,
+        "send_stock_alert_digest",
+        lambda items: emails.append([item["product_id"] for item in items]) or len(items),
+    )
+
+    category = Category(name=f"Categoria-{uuid4().hex}")
+    db.add(category)
+    db.commit()
+    db.refresh(category)
+
+    product = Product(
+        sku=f"SKU-{uuid4().hex[:8]}",
+        name="Producto outbox",
+        barcode=f"{uuid4().hex[:12]}",
+        category_id=category.id,
+        active=True,
+    )
+    db.add(product)
+    db.commit()
+    db.refresh(product)
+
+    stock = stock_repo.create_stock(db, product_id=product.id, location="ALM-OUT", quantity=1)
+    alert = alert_repo.create_alert(db, stock_id=stock.id, quantity=1, min_quantity=5)
+
+    # La creacion de la alerta no envia nada: solo deja la fila en el outbox
+    assert published == [] and emails == []
+    entry = db.query(NotificationOutbox).filter(NotificationOutbox.alert_id == alert.id).one()
+    assert entry.status == OutboxStatus.PENDING
+
+    result = dispatch_notifications()
+    assert result == {"claimed": 1, "sent": 1, "failed": 0}
+    assert published == [alert.id]
+    assert emails == [[product.id]]
+
+    db.expire_all()
+    assert db.get(NotificationOutbox, entry.id).status == OutboxStatus.SENT
+    assert db.get(Alert, alert.id).notification_sent is True
+    assert dispatch_notifications()["claimed"] == 0
+
+
+def test_failed_alert_email_keeps_outbox_entry_pending(db, monkeypatch):
+    monkeypatch.setenv("NOTIFICATION_COALESCE_SECONDS", "0")
+    # Sin backoff y de una en una: la entrada fallida no se vuelve a reclamar en la misma ejecucion
+    monkeypatch.setenv("NOTIFICATION_OUTBOX_BACKOFF_SECONDS", "0")
+    monkeypatch.setenv("NOTIFICATION_OUTBOX_BATCH_SIZE", "1")
+    monkeypatch.setattr(alert_dispatch_service, "publish_alert", lambda alert: None)
+    monkeypatch.setattr(alert_dispatch_service, "smtp_configured", lambda: True)
+    monkeypatch.setattr(alert_dispatch_service, "send_stock_alert_digest", lambda items: 0)
+
+    category = Category(name=f"Categoria-{uuid4().hex}")
+    db.add(category)
+    db.commit()
+    db.refresh(category)
+
+    product = Product(
+        sku=f"SKU-{uuid4().hex[:8]}",
+        name="Producto outbox fallido",
+        barcode=f"{uuid4().hex[:12]}",
+        category_id=category.id,
+        active=True,
+    )
+    db.add(product)
+    db.commit()
+    db.refresh(product)
+
+    stock = stock_repo.create_stock(db, product_id=product.id, location="ALM-FAIL", quantity=1)
+    alert = alert_repo.create_alert(db, stock_id=stock.id, quantity=1, min_quantity=5)
+
+    assert dispatch_notifications() == {"claimed": 1, "sent": 0, "failed": 1}
+
+    db.expire_all()
+    entry = db.query(NotificationOutbox).filter(NotificationOutbox.alert_id == alert.id).one()
+    assert entry.status == OutboxStatus.PENDING
+    assert entry.attempts == 1
+    assert entry.last_error
+    assert entry.next_attempt_at is not None
+    assert db.get(Alert, alert.id).notification_sent is False
+
+    db.delete(entry)
+    db.commit()
+
+
+def test_failed_push_batch_is_retried_without_resending_email(db, monkeypatch):
+    emails = []
+    pushes = []
+    published = []
+    monkeypatch.setenv("NOTIFICATION_COALESCE_SECONDS", "0")
+    monkeypatch.setattr(alert_dispatch_service, "publish_alert", lambda alert: published.append(alert.id))
+    monkeypatch.setattr(
+        alert_dispatch_service,
+        "send_stock_alert_digest",
+        lambda items: emails.append([item["product_id"] for item in items]) or len(items),
+    )
+    monkeypatch.setattr(
+        alert_dispatch_service.fcm_service,
+        "send_alert_pushes",
+        lambda db, alerts, stock_info=None: pushes.append(len(alerts)) or len(pushes) > 1,
+    )
+
+    category = Category(name=f"Categoria-{uuid4().hex}")
+    db.add(category)
+    db.commit()
+    db.refresh(category)
+
+    product = Product(
+        sku=f"SKU-{uuid4().hex[:8]}",
+        name="Producto push fallido",
+        barcode=f"{uuid4().hex[:12]}",
+        category_id=category.id,
+        active=True,
+    )
+    db.add(product)
+    db.commit()
+    db.refresh(product)
+
+    stock = stock_repo.create_stock(db, product_id=product.id, location="ALM-PUSH", quantity=1)
+    alert = alert_repo.create_alert(db, stock_id=stock.id, quantity=1, min_quantity=5)
+
+    # Primer intento: el email sale pero ningun push se entrega
+    assert dispatch_notifications() == {"claimed": 1, "sent": 0, "failed": 1}
+    db.expire_all()
+    entry = db.query(NotificationOutbox).filter(NotificationOutbox.alert_id == alert.id).one()
+    assert entry.status == OutboxStatus.PENDING
+    assert entry.attempts == 1
+    assert db.get(Alert, alert.id).notification_sent is True
+
+    # Hasta que vence el backoff no se reintenta
+    assert dispatch_notifications()["claimed"] == 0
+    entry.next_attempt_at = datetime.now(timezone.utc) - timedelta(seconds=1)
+    db.commit()
+
+    # El reintento solo repite el push: ni email ni WebSocket otra vez
+    assert dispatch_notifications() == {"claimed": 1, "sent": 1, "failed": 0}
+    assert emails == [[product.id]]
+    assert pushes == [1, 1]
+    assert published == [alert.id]
+    db.expire_all()
+    assert db.get(NotificationOutbox, entry.id).status == OutboxStatus.SENT
+
+
+def test_dispatch_coalesces_burst_into_one_digest(db, monkeypatch):
+    digests = []
+    monkeypatch.setattr(alert_dispatch_service, "publish_alert", lambda alert: None)
+    monkeypatch.setattr(alert_dispatch_service, "send_stock_alert_digest", lambda items: digests.append(items) or len(items))
+
+    category = Category(name=f"Categoria-{uuid4().hex}")
+    db.add(category)
+    db.commit()
+    db.refresh(category)
+
+    product = Product(
+        sku=f"SKU-{uuid4().hex[:8]}",
+        name="Producto rafaga",
+        barcode=f"{uuid4().hex[:12]}",
+        category_id=category.id,
+        active=True,
+    )
+    db.add(product)
+    db.commit()
+    db.refresh(product)
+
+    for index in range(3):
+        stock = stock_repo.create_stock(db, product_id=product.id, location=f"ALM-R{index}", quantity=index)
+        alert_repo.create_alert(db, stock_id=stock.id, quantity=index, min_quantity=5)
+
+    # Dentro de la ventana de agrupacion todavia no se envia nada
+    monkeypatch.setenv("NOTIFICATION_COALESCE_SECONDS", "3600")
+    assert dispatch_notifications()["claimed"] == 0
+
+    monkeypatch.setenv("NOTIFICATION_COALESCE_SECONDS", "0")
+    assert dispatch_notifications()["sent"] == 3
+    assert len(digests) == 1
+    assert sorted(item["location"] for item in digests[0]) == ["ALM-R0", "ALM-R1", "ALM-R2"]
@@ -0,0 +1,248 @@
+import threading
+import time
+
+from app.cache import redis_cache, serializer
+from app.core.observability import MetricsRegistry
+
+
+def test_local_cache_lru_ttl_and_byte_budget():
+    cache = redis_cache.LocalCache(max_entries=2, max_bytes=100, ttl_seconds=60)
+    cache.set("a", {"v": 1}, size=10, ttl_seconds=60)
+    cache.set("b", {"v": 2}, size=10, ttl_seconds=60)
+    assert cache.get("a") == {"v": 1}
+
+    # "b" es la menos usada: sale al superar el numero de entradas
+    cache.set("c", {"v": 3}, size=10, ttl_seconds=60)
+    assert cache.get("b") is None
+    assert cache.evictions == 1
+
+    # Presupuesto en bytes
+    cache.set("big", {"v": 4}, size=95, ttl_seconds=60)
+    assert cache.get("a") is None and cache.get("c") is None
+    assert cache.get("big") == {"v": 4}
+
+    cache.set("short", {"v": 5}, size=1, ttl_seconds=0.01)
+    time.sleep(0.02)
+    assert cache.get("short") is None
+
+
+def test_cache_helpers_use_local_tier_and_invalidate_by_prefix(monkeypatch):
+    monkeypatch.setenv("CACHE_L1_ENABLED", "1")
+    monkeypatch.setattr(redis_cache, "_local", None)
+    monkeypatch.setattr(redis_cache, "get_redis", lambda: None)
+
+    key = redis_cache.make_key("products:list", 1, {"limit": 10})
+    redis_cache.cache_set(key, {"items": [1, 2]}, ttl_seconds=60)
+    assert redis_cache.cache_get(key) == {"items": [1, 2]}
+
+    redis_cache.cache_invalidate_prefix("products:list")
+    assert redis_cache.cache_get(key) is None
+
+    stats = redis_cache.local_cache_stats()
+    assert stats["cache_l1_hits_total"] == 1
+    assert stats["cache_l1_misses_total"] == 1
+
+    # Un mensaje de invalidacion de otra replica tambien vacia L1
+    redis_cache.cache_set(key, {"items": [3]}, ttl_seconds=60)
+    redis_cache._handle_invalidation({"data": b"products:"})
+    assert redis_cache.cache_get(key) is None
+
+    registry = MetricsRegistry()
+    registry.register_counters(redis_cache.local_cache_stats)
+    assert "cache_l1_hits_total 1" in registry.render_prometheus()
+
+
+class _FakeRedis:
+    # Lo minimo de redis-py que usa redis_cache; el script Lua se emula en Python
+    def __init__(self):
+        self.data = {}
+        self.published = []
+
+    def get(self, key):
+        return self.data.get(key)
+
+    def setex(self, key, ttl, value):
+        self.data[key] = value.encode("utf-8") if isinstance(value, str) else value
+
+    def incr(self, key):
+        self.data[key] = str(int(self.data.get(key, b"0")) + 1).encode("utf-8")
+
+    def publish(self, channel, message):
+        self.published.append((channel, message))
+
+    def pipeline(self, transaction=True):
+        client = self
+
+        class _Pipe:
+            def __init__(self):
+                self.calls = []
+
+            def __getattr__(self, name):
+                return lambda *args: self.calls.append((name, args))
+
+            def execute(self):
+                for name, args in self.calls:
+                    getattr(client, name)(*args)
+
+        return _Pipe()
+
+    def lock(self, name, timeout=None, blocking=True):
+        client = self
+
+        class _Lock:
+            def acquire(self):
+                if name in client.data:
+                    return False
+                client.data[name] = b"1"
+                return True
+
+            def release(self):
+                client.data.pop(name, None)
+
+        return _Lock()
+
+    def register_script(self, source):
+        client = self
+
+        class _Script:
+            registered_client = client
+
+            def __call__(self, keys, args):
+                gen = client.get(keys[0]) or b"0"
+                return [gen, client.get(f"{args[0]}|g={gen.decode()}")]
+
+        return _Script()
+
+
+def test_invalidation_bumps_generation_instead_of_deleting_keys(monkeypatch):
+    fake = _FakeRedis()
+    monkeypatch.delenv("CACHE_L1_ENABLED", raising=False)
+    monkeypatch.setattr(redis_cache, "get_redis", lambda: fake)
+
+    key = redis_cache.make_key("stocks:list", 1, {"limit": 10})
+    assert redis_cache.cache_get(key) is None
+    redis_cache.cache_set(key, {"items": [1]}, ttl_seconds=60)
+    assert redis_cache.cache_get(key) == {"items": [1]}
+
+    redis_cache.cache_invalidate_prefix("stocks:list", "stocks:detail")
+    assert fake.data["cache:gen:stocks:list"] == b"1"
+    assert fake.data["cache:gen:stocks:detail"] == b"1"
+    assert ("cache:invalidate", "stocks:list") in fake.published
+    # La entrada vieja sigue en Redis (caduca por TTL) pero ya no es visible
+    assert f"{key}|g=0" in fake.data
+    assert redis_cache.cache_get(key) is None
+
+    # Una respuesta calculada antes de otra invalidacion se guarda bajo la generacion vieja
+    redis_cache.cache_invalidate_prefix("stocks:list")
+    redis_cache.cache_set(key, {"items": ["stale"]}, ttl_seconds=60)
+    assert redis_cache.cache_get(key) is None
+
+    redis_cache.cache_set(key, {"items": [2]}, ttl_seconds=60)
+    assert redis_cache.cache_get(key) == {"items": [2]}
+
+
+def test_scoped_key_shares_entries_according_to_policy(monkeypatch):
+    from types import SimpleNamespace
+
+    from app.models.enums import UserRole
+
+    alice = SimpleNamespace(id=1, role=UserRole.USER)
+    bob = SimpleNamespace(id=2, role=UserRole.ADMIN)
+
+    params = {"limit": 50, "offset": 0}
+    assert redis_cache.scoped_key("products:list", alice, params) == redis_cache.scoped_key("products:list", bob, params)
+    assert redis_cache.scoped_key("products:list", alice, params) == "products:list|limit=50|offset=0"
+
+    monkeypatch.setitem(redis_cache.CACHE_SCOPES, "reports:custom", redis_cache.CacheScope.USER)
+    assert redis_cache.scoped_key("reports:custom", alice, params) == "reports:custom|user=1|limit=50|offset=0"
+
+    # Sin politica: por usuario
+    assert redis_cache.scoped_key("me:profile", alice, {}) != redis_cache.scoped_key("me:profile", bob, {})
+
+
+def test_get_or_compute_runs_one_computation_per_key(monkeypatch):
+    monkeypatch.delenv("CACHE_L1_ENABLED", raising=False)
+    monkeypatch.setattr(redis_cache, "get_redis", lambda: None)
+    calls = []
+    start = threading.Barrier(8)
+
+    def slow_query():
+        calls.append(1)
+        time.sleep(0.2)
+        return {"items": [1]}
+
+    results = []
+
+    def request():
+        start.wait()
+        results.append(redis_cache.cache_get_or_compute("reports:turnover|limit=10", slow_query, ttl_seconds=60))
+
+    threads = [threading.Thread(target=request) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(calls) == 1
+    assert results == [{"items": [1]}] * 8
+
+
+def test_get_or_compute_serves_stale_while_another_process_refreshes(monkeypatch):
+    fake = _FakeRedis()
+    monkeypatch.delenv("CACHE_L1_ENABLED", raising=False)
+    monkeypatch.setattr(redis_cache, "get_redis", lambda: fake)
+    key = "reports:turnover|limit=10"
+
+    redis_cache.cache_get_or_compute(key, lambda: {"items": ["old"]}, ttl_seconds=60)
+    entry_key = f"{key}|g=0"
+    body, _, delta = serializer.decode_entry(fake.data[entry_key])
+    fake.data[entry_key] = serializer.encode_entry(body, time.time() - 1, delta)
+
+    # Otro proceso tiene el lock: se devuelve el valor caducado sin recalcular
+    fake.data[f"{redis_cache.LOCK_PREFIX}{key}"] = b"1"
+    assert redis_cache.cache_get_or_compute(key, lambda: {"items": ["new"]}, ttl_seconds=60) == {"items": ["old"]}
+    assert redis_cache.cache_get(key) is None
+
+    del fake.data[f"{redis_cache.LOCK_PREFIX}{key}"]
+    assert redis_cache.cache_get_or_compute(key, lambda: {"items": ["new"]}, ttl_seconds=60) == {"items": ["new"]}
+    assert f"{redis_cache.LOCK_PREFIX}{key}" not in fake.data
+
+
+def test_xfetch_refreshes_expensive_keys_before_expiry(monkeypatch):
+    now = time.time()
+    # Recalcular cuesta 10 s y quedan 5 s de vida: con random alto casi siempre se adelanta
+    entry = (b"1", now + 5, 10.0)
+    monkeypatch.setattr(redis_cache.random, "random", lambda: 0.9)
+    assert redis_cache._should_refresh(entry, now)
+    monkeypatch.setattr(redis_cache.random, "random", lambda: 0.0)
+    assert not redis_cache._should_refresh(entry, now)
+    assert not redis_cache._should_refresh((b"1", now + 5, 0.0), now)
+
+
+def test_serializer_compresses_large_bodies_and_rejects_unknown_versions(monkeypatch):
+    monkeypatch.setenv("CACHE_COMPRESS_MIN_BYTES", "1024")
+    small = serializer.dumps({"items": [1]})
+    large = serializer.dumps({"items": [{"sku": f"SKU-{i}", "quantity": i} for i in range(500)]})
+
+    encoded_small = serializer.encode_entry(small, 100.0, 0.5)
+    assert encoded_small[1] == 0
+    assert serializer.decode_entry(encoded_small) == (small, 100.0, 0.5)
+
+    encoded_large = serializer.encode_entry(large, 100.0, 0.5)
+    assert encoded_large[1] & serializer.FLAG_ZLIB
+    assert len(encoded_large) < len(large)
+    assert serializer.decode_entry(encoded_large) == (large, 100.0, 0.5)
+
+    assert serializer.decode_entry(bytes([serializer.FORMAT_VERSION + 1]) + encoded_small[1:]) is None
+
+
+def test_cached_response_serves_stored_bytes(monkeypatch):
+    fake = _FakeRedis()
+    monkeypatch.delenv("CACHE_L1_ENABLED", raising=False)
+    monkeypatch.setattr(redis_cache, "get_redis", lambda: fake)
+    key = "movements:list|limit=50"
+
+    first = redis_cache.cached_response(key, lambda: {"items": [], "total": 0}, ttl_seconds=60)
+    second = redis_cache.cached_response(key, lambda: {"items": ["no"], "total": 1}, ttl_seconds=60)
+    assert first.media_type == "application/json"
+    assert second.body == first.body == b'{"items":[],"total":0}'
@@ -1,12 +1,14 @@
+from datetime import datetime, timedelta, timezone
 from uuid import uuid4
 
 from app.models.category import Category
 from app.models.product import Product
 from app.models.movement import Movement
 from app.models.event import Event
-from app.models.enums import EventType
+from app.models.enums import EventStatus, EventType
 from app.repositories import stock_repo, event_repo, location_repo
-from app.tasks import process_event
+from app import tasks
+from app.tasks import process_event, process_events_batch, requeue_pending_events
 
 
 def _auth_header(token: str) -> dict[str, str]:
@@ -163,3 +165,345 @@ def test_process_event_creates_stock_and_movement(db):
     movement = db.query(Movement).filter(Movement.product_id == product.id).first()
     assert movement is not None
     assert movement.delta == 3
+
+
+def test_event_batch_reports_per_item_results(client, db, monkeypatch):
+    category = Category(name=f"Categoria-{uuid4().hex}")
+    db.add(category)
+    db.commit()
+    db.refresh(category)
+
+    product = Product(
+        sku=f"SKU-{uuid4().hex[:8]}",
+        name="Sensor de CO2",
+        barcode=f"{uuid4().hex[:12]}",
+        category_id=category.id,
+        active=True,
+    )
+    db.add(product)
+    db.commit()
+    db.refresh(product)
+
+    token = _register_user(client)
+    headers = _auth_header(token)
+
+    enqueued: list[int] = []
+
+    from app.api.routes import events as events_routes
+    monkeypatch.setattr(events_routes, "enqueue_events", lambda ids: enqueued.extend(ids))
+
+    key = uuid4().hex
+    item = {
+        "event_type": "SENSOR_IN",
+        "product_id": product.id,
+        "delta": 2,
+        "source": "sensor_simulado",
+        "location": "Laboratorio",
+        "idempotency_key": key,
+    }
+    response = client.post(
+        "/events/batch",
+        json={
+            "items": [
+                item,
+                {**item, "idempotency_key": uuid4().hex, "location": "Almacen"},
+                {**item},
+                {**item, "idempotency_key": uuid4().hex, "product_id": product.id + 999},
+            ]
+        },
+        headers=headers,
+    )
+    assert response.status_code == 200
+    body = response.json()
+    assert body["created"] == 2
+    assert body["duplicates"] == 1
+    assert body["errors"] == 1
+    assert [result["status"] for result in body["items"]] == ["CREATED", "CREATED", "DUPLICATE", "ERROR"]
+    assert sorted(enqueued) == sorted(result["event"]["id"] for result in body["items"][:2])
+
+    retry = client.post("/events/batch", json={"items": [item]}, headers=headers)
+    assert retry.status_code == 200
+    assert retry.json()["items"][0]["status"] == "DUPLICATE"
+    assert retry.json()["items"][0]["event"]["id"] == body["items"][0]["event"]["id"]
+    assert location_repo.get_by_code(db, "Almacen") is not None
+
+    blank = client.post(
+        "/events/batch",
+        json={"items": [{**item, "idempotency_key": uuid4().hex, "location": "   "}]},
+        headers=headers,
+    )
+    assert blank.status_code == 422
+
+    padded = client.post(
+        "/events/batch",
+        json={"items": [{**item, "idempotency_key": uuid4().hex, "location": "  Laboratorio  "}]},
+        headers=headers,
+    )
+    assert padded.status_code == 200
+    assert padded.json()["items"][0]["status"] == "CREATED"
+
+
+def test_process_events_batch_applies_net_delta_per_stock(db):
+    category = Category(name=f"Categoria-{uuid4().hex}")
+    db.add(category)
+    db.commit()
+    db.refresh(category)
+
+    product = Product(
+        sku=f"SKU-{uuid4().hex[:8]}",
+        name="Sensor de CO2",
+        barcode=f"{uuid4().hex[:12]}",
+        category_id=category.id,
+        active=True,
+    )
+    db.add(product)
+    db.commit()
+    db.refresh(product)
+
+    lab = location_repo.get_or_create(db, "Laboratorio")
+    almacen = location_repo.get_or_create(db, "Almacen")
+
+    def _event(event_type: EventType, delta: int, location_id: int) -> Event:
+        return event_repo.create_event(
+            db,
+            event_type=event_type,
+            product_id=product.id,
+            delta=delta,
+            source="sensor_simulado",
+            location_id=location_id,
+            processed=False,
+            idempotency_key=uuid4().hex,
+        )
+
+    _event(EventType.SENSOR_IN, 5, lab.id)
+    _event(EventType.SENSOR_OUT, 3, lab.id)
+    rejected = _event(EventType.SENSOR_OUT, 10, lab.id)
+    _event(EventType.SENSOR_IN, 2, almacen.id)
+    # El drenado solo toma eventos con mas de event_batch_linger_seconds
+    db.query(Event).update({Event.created_at: datetime.now(timezone.utc) - timedelta(minutes=5)})
+    db.commit()
+
+    result = process_events_batch()
+    assert result["claimed"] == 4
+    assert result["processed"] == 3
+    assert result["errors"] == 1
+
+    db.expire_all()
+    assert stock_repo.get_by_product_and_location(db, product.id, "Laboratorio").quantity == 2
+    assert stock_repo.get_by_product_and_location(db, product.id, "Almacen").quantity == 2
+    assert db.query(Movement).filter(Movement.product_id == product.id).count() == 3
+
+    failed = db.get(Event, rejected.id)
+    assert failed.event_status.value == "ERROR"
+    assert failed.retry_count == 1
+    assert failed.last_error == "Stock insuficiente para aplicar SENSOR_OUT"
+    assert db.query(Event).filter(Event.event_status == EventStatus.PENDING).count() == 0
+
+
+def test_requeue_pending_events_claims_with_lease(db, monkeypatch):
+    category = Category(name=f"Categoria-{uuid4().hex}")
+    db.add(category)
+    db.commit()
+    db.refresh(category)
+
+    product = Product(
+        sku=f"SKU-{uuid4().hex[:8]}",
+        name="Sensor de CO2",
+        barcode=f"{uuid4().hex[:12]}",
+        category_id=category.id,
+        active=True,
+    )
+    db.add(product)
+    db.commit()
+    db.refresh(product)
+
+    location = location_repo.get_or_create(db, "Laboratorio")
+    events = [
+        event_repo.create_event(
+            db,
+            event_type=EventType.SENSOR_IN,
+            product_id=product.id,
+            delta=1,
+            source="sensor_simulado",
+            location_id=location.id,
+            processed=False,
+            idempotency_key=uuid4().hex,
+        )
+        for _ in range(3)
+    ]
+    old = datetime.now(timezone.utc) - timedelta(hours=1)
+    for event in events:
+        event.created_at = old
+    # Un evento con lease vigente no debe despacharse otra vez
+    events[2].lease_owner = "otro-dispatcher"
+    events[2].lease_expires_at = datetime.now(timezone.utc) + timedelta(hours=1)
+    db.commit()
+
+    dispatched: list[list[int]] = []
+    monkeypatch.setattr(tasks.process_events_batch, "delay", lambda ids: dispatched.append(ids))
+
+    first = requeue_pending_events()
+    assert first["requeued"] == 2
+    assert first["rescheduled"] is False
+    assert sorted(sum(dispatched, [])) == sorted([events[0].id, events[1].id])
+
+    db.expire_all()
+    leased = db.get(Event, events[0].id)
+    assert leased.lease_owner.startswith("dispatcher-")
+    assert leased.lease_expires_at is not None
+
+    second = requeue_pending_events()
+    assert second["requeued"] == 0
+
+    # Al procesar el lote despachado se libera el lease
+    result = process_events_batch(dispatched[0])
+    assert result["processed"] == len(dispatched[0])
+    db.expire_all()
+    released = db.get(Event, events[0].id)
+    assert released.event_status == EventStatus.PROCESSED
+    assert released.lease_owner is None
+    assert released.lease_expires_at is None
+    assert db.get(Event, events[2].id).lease_owner == "otro-dispatcher"
+
+
+def test_requeue_pending_events_bounds_backlog_count(db, monkeypatch):
+    product = _sensor_product(db)
+    location = location_repo.get_or_create(db, "Laboratorio")
+    for _ in range(5):
+        _pending_event(db, product, location.id, age=timedelta(hours=1))
+
+    monkeypatch.setenv("EVENT_DISPATCH_MAX_ROUNDS", "1")
+    monkeypatch.setenv("EVENT_DISPATCH_MAX_BATCH", "2")
+    monkeypatch.setenv("EVENT_DISPATCH_MIN_BATCH", "1")
+    monkeypatch.setattr(tasks.process_events_batch, "delay", lambda ids: None)
+    monkeypatch.setattr(tasks.requeue_pending_events, "apply_async", lambda **kwargs: None)
+
+    result = requeue_pending_events()
+    assert result["backlog"] == 3
+    assert result["requeued"] == 2
+    assert result["rescheduled"] is True
+
+
+def _sensor_product(db) -> Product:
+    category = Category(name=f"Categoria-{uuid4().hex}")
+    db.add(category)
+    db.commit()
+    db.refresh(category)
+
+    product = Product(
+        sku=f"SKU-{uuid4().hex[:8]}",
+        name="Sensor de CO2",
+        barcode=f"{uuid4().hex[:12]}",
+        category_id=category.id,
+        active=True,
+    )
+    db.add(product)
+    db.commit()
+    db.refresh(product)
+    return product
+
+
+def _pending_event(db, product: Product, location_id: int, *, age: timedelta | None = None) -> Event:
+    event = event_repo.create_event(
+        db,
+        event_type=EventType.SENSOR_IN,
+        product_id=product.id,
+        delta=1,
+        source="sensor_simulado",
+        location_id=location_id,
+        processed=False,
+        idempotency_key=uuid4().hex,
+    )
+    if age is not None:
+        event.created_at = datetime.now(timezone.utc) - age
+        db.commit()
+    return event
+
+
+def test_process_events_batch_drain_skips_young_and_leased_events(db):
+    product = _sensor_product(db)
+    location = location_repo.get_or_create(db, "Laboratorio")
+
+    ready = _pending_event(db, product, location.id, age=timedelta(minutes=5))
+    young = _pending_event(db, product, location.id)
+    leased = _pending_event(db, product, location.id, age=timedelta(minutes=5))
+    leased.lease_owner = "dispatcher-otro"
+    leased.lease_expires_at = datetime.now(timezone.utc) + timedelta(minutes=5)
+    db.commit()
+
+    result = process_events_batch()
+    assert result["claimed"] == 1
+    assert result["processed"] == 1
+
+    db.expire_all()
+    assert db.get(Event, ready.id).event_status == EventStatus.PROCESSED
+    assert db.get(Event, young.id).event_status == EventStatus.PENDING
+    assert db.get(Event, leased.id).event_status == EventStatus.PENDING
+
+
+def test_process_events_batch_counts_retry_only_for_the_failing_event(db, monkeypatch):
+    product = _sensor_product(db)
+    lab = location_repo.get_or_create(db, "Laboratorio")
+    almacen = location_repo.get_or_create(db, "Almacen")
+    ok = _pending_event(db, product, lab.id, age=timedelta(minutes=5))
+    failing = _pending_event(db, product, almacen.id, age=timedelta(minutes=5))
+
+    def _broken_batch(_db, _events):
+        raise RuntimeError("could not serialize access")
+
+    upsert_stock = stock_repo.upsert_stock
+
+    def _flaky_upsert(session, *, product_id, location_id, delta=0):
+        if location_id == almacen.id:
+            raise RuntimeError("lock timeout")
+        return upsert_stock(session, product_id=product_id, location_id=location_id, delta=delta)
+
+    requeued: list[list[int]] = []
+    monkeypatch.setattr(tasks, "_apply_event_batch", _broken_batch)
+    monkeypatch.setattr(stock_repo, "upsert_stock", _flaky_upsert)
+    monkeypatch.setattr(tasks.process_events_batch, "delay", lambda ids: requeued.append(ids))
+
+    result = process_events_batch([ok.id, failing.id])
+    assert result == {"claimed": 2, "processed": 1, "errors": 0, "retried": 1}
+    assert requeued == [[failing.id]]
+
+    db.expire_all()
+    applied = db.get(Event, ok.id)
+    assert applied.event_status == EventStatus.PROCESSED
+    assert applied.retry_count == 0
+    retried = db.get(Event, failing.id)
+    assert retried.event_status == EventStatus.PENDING
+    assert retried.retry_count == 1
+    assert stock_repo.get_by_product_and_location(db, product.id, "Laboratorio").quantity == 1
+    assert db.query(Movement).filter(Movement.product_id == product.id).count() == 1
+
+
+def test_list_events_pages_with_cursor(client, db):
+    product = _sensor_product(db)
+    location = location_repo.get_or_create(db, "Laboratorio")
+    created = [_pending_event(db, product, location.id) for _ in range(3)]
+    headers = _auth_header(_register_user(client))
+
+    first = client.get("/events/", params={"limit": 2, "order_dir": "asc"}, headers=headers)
+    assert first.status_code == 200
+    page = first.json()
+    assert [item["id"] for item in page["items"]] == [created[0].id, created[1].id]
+    assert page["items"][0]["event_status"] == "PENDING"
+    assert page["total"] == 3
+    assert page["has_more"] is True
+
+    second = client.get(
+        "/events/",
+        params={"limit": 2, "order_dir": "asc", "cursor": page["next_cursor"]},
+        headers=headers,
+    )
+    assert second.status_code == 200
+    assert [item["id"] for item in second.json()["items"]] == [created[2].id]
+
+    flipped = client.get(
+        "/events/",
+        params={"limit": 2, "order_dir": "desc", "cursor": page["next_cursor"]},
+        headers=headers,
+    )
+    assert flipped.status_code == 400
+    assert flipped.json()["detail"] == "cursor generado con otro order_dir"
@@ -1,3 +1,4 @@
+from types import SimpleNamespace
 from uuid import uuid4
 
 from app.core.security import hash_password
@@ -5,6 +6,7 @@ from app.models.category import Category
 from app.models.enums import UserRole
 from app.models.import_batch import ImportBatch
 from app.models.import_error import ImportError
+from app.models.import_review import ImportReview
 from app.models.location import Location
 from app.models.product import Product
 from app.models.user import User
@@ -285,3 +287,402 @@ def test_import_events_csv_forbidden_for_user_role(client, db):
     response = _post_csv(client, token, "/imports/events/csv", csv_text)
     assert response.status_code == 403
     assert response.json()["detail"] == "Insufficient permissions"
+
+
+def test_import_events_csv_large_file_runs_as_async_job(client, db, monkeypatch, tmp_path):
+    from app.api.routes import imports as imports_routes
+    from app.services import import_service
+
+    token = _login_with_role(client, db, UserRole.MANAGER)
+    category, location = _seed_category_and_location(db)
+    monkeypatch.setenv("IMPORT_ASYNC_MIN_BYTES", "1")
+    monkeypatch.setenv("IMPORT_STORAGE_DIR", str(tmp_path))
+    monkeypatch.setenv("IMPORT_CHUNK_ROWS", "2")
+    queued = []
+    monkeypatch.setattr(imports_routes.import_csv_batch, "delay", lambda batch_id: queued.append(batch_id))
+
+    sku = f"SKU-{uuid4().hex[:8]}"
+    barcode = f"BC-{uuid4().hex[:10]}"
+    csv_text = (
+        "type,sku,barcode,name,category_id,location_id,quantity\n"
+        f"IN,{sku},{barcode},Sensor Async,{category.id},{location.id},5\n"
+        f"IN,{sku},{barcode},Sensor Async,{category.id},{location.id},2\n"
+        f"OUT,{sku},{barcode},Sensor Async,{category.id},{location.id},abc\n"
+        f"OUT,{sku},{barcode},Sensor Async,{category.id},{location.id},3\n"
+        f"BAD,{sku},{barcode},Sensor Async,{category.id},{location.id},1\n"
+    )
+    response = _post_csv(client, token, "/imports/events/csv", csv_text)
+    assert response.status_code == 202
+    body = response.json()
+    assert body["status"] == "PENDING" and body["progress"] == 0.0
+    assert queued == [body["batch_id"]]
+    # Nada aplicado hasta que corre el worker
+    assert product_repo.get_by_sku(db, sku) is None
+
+    result = import_service.run_batch(db, body["batch_id"])
+    assert result["status"] == "COMPLETED"
+    assert list(tmp_path.iterdir()) == []
+
+    status_response = client.get(f"/imports/batches/{body['batch_id']}", headers=_auth_header(token))
+    assert status_response.status_code == 200
+    job = status_response.json()
+    assert job["status"] == "COMPLETED" and job["progress"] == 1.0
+    assert (job["total_rows"], job["processed_rows"], job["ok_rows"], job["error_rows"]) == (5, 5, 3, 2)
+
+    errors = client.get(f"/imports/batches/{body['batch_id']}/errors", headers=_auth_header(token)).json()
+    assert [e["row_number"] for e in errors["items"]] == [4, 6]
+
+    product = product_repo.get_by_sku(db, sku)
+    stock = stock_repo.get_by_product_and_location(db, product.id, location.code)
+    assert stock.quantity == 4
+
+    # Una reentrega de la tarea no vuelve a aplicar filas
+    assert import_service.run_batch(db, body["batch_id"]) == {"batch_id": body["batch_id"], "skipped": True}
+    missing = client.get("/imports/batches/999999", headers=_auth_header(token))
+    assert missing.status_code == 404
+
+
+def test_import_csv_bulk_chunk_keeps_row_level_results(client, db):
+    from app.models.alert import Alert
+    from app.models.enums import AlertType
+    from app.models.movement import Movement
+
+    token = _login_with_role(client, db, UserRole.MANAGER)
+    category, location = _seed_category_and_location(db)
+    other = Location(code=f"LOC-{uuid4().hex[:8]}")
+    db.add(other)
+    db.commit()
+
+    sku, other_sku = f"SKU-{uuid4().hex[:8]}", f"SKU-{uuid4().hex[:8]}"
+    barcode, other_barcode = f"BC-{uuid4().hex[:10]}", f"BC-{uuid4().hex[:10]}"
+    csv_text = (
+        "type,sku,barcode,name,category_id,location_id,quantity\n"
+        f"IN,{sku},{barcode},Bulk Alpha {sku},{category.id},{location.id},60\n"
+        f"OUT,{sku},{barcode},Bulk Alpha {sku},{category.id},{location.id},100\n"
+        f"OUT,{sku},{barcode},Bulk Alpha {sku},{category.id},{location.id},10\n"
+        f"IN,{other_sku},{barcode},Bulk Zeta {other_sku},{category.id},{location.id},1\n"
+        f"OUT,{other_sku},{other_barcode},Bulk Zeta {other_sku},{category.id},{other.id},1\n"
+        f"IN,{sku},{barcode},Bulk Alpha {sku},{category.id},999999,1\n"
+    )
+    response = _post_csv(client, token, "/imports/events/csv", csv_text, fuzzy_threshold=0.99)
+    assert response.status_code == 201
+    body = response.json()
+    assert (body["ok_rows"], body["error_rows"], body["review_rows"]) == (2, 3, 1)
+    assert [(e["row_number"], e["message"]) for e in body["errors"]] == [
+        (3, "Stock insuficiente para la salida"),
+        (6, "Stock insuficiente para la salida"),
+        (7, "location_id no existe"),
+    ]
+    assert body["reviews"][0]["row_number"] == 5 and body["reviews"][0]["reason"] == "sku_barcode_mismatch"
+
+    product = product_repo.get_by_sku(db, sku)
+    assert stock_repo.get_by_product_and_location(db, product.id, location.code).quantity == 50
+    assert db.query(Movement).filter(Movement.product_id == product.id).count() == 2
+    # El producto nuevo que solo tenia una salida fallida se crea, pero sin fila de stock
+    created = product_repo.get_by_sku(db, other_sku)
+    assert created is not None and stock_repo.get_by_product_and_location(db, created.id, other.code) is None
+
+    transfer = _post_csv(
+        client,
+        token,
+        "/imports/transfers/csv",
+        "sku,barcode,name,category_id,from_location_id,to_location_id,quantity\n"
+        f"{sku},{barcode},Bulk Alpha {sku},{category.id},{location.id},{other.id},50\n"
+        f"{sku},{barcode},Bulk Alpha {sku},{category.id},{location.id},{other.id},1\n",
+    )
+    assert transfer.status_code == 201
+    assert (transfer.json()["ok_rows"], transfer.json()["error_rows"]) == (1, 1)
+    assert transfer.json()["errors"][0]["message"] == "Stock insuficiente en la ubicacion origen"
+    source = stock_repo.get_by_product_and_location(db, product.id, location.code)
+    target = stock_repo.get_by_product_and_location(db, product.id, other.code)
+    assert (source.quantity, target.quantity) == (0, 50)
+    alert_types = {a.alert_type for a in db.query(Alert).filter(Alert.stock_id.in_([source.id, target.id]))}
+    assert {AlertType.OUT_OF_STOCK, AlertType.LARGE_MOVEMENT, AlertType.TRANSFER_COMPLETE} <= alert_types
+
+
+def test_product_matcher_scores_only_trigram_shortlist(db, monkeypatch):
+    from difflib import SequenceMatcher
+
+    from app.services import product_match_service
+
+    category, _ = _seed_category_and_location(db)
+    tag = uuid4().hex[:6]
+    db.add_all(
+        [
+            Product(sku=f"SKU-{uuid4().hex[:8]}", name=f"Valvula {tag} {i}", barcode=f"BC-{uuid4().hex[:10]}", category_id=category.id)
+            for i in range(30)
+        ]
+        + [Product(sku=f"SKU-{uuid4().hex[:8]}", name=f"Sensor humedad {tag}", barcode=f"BC-{uuid4().hex[:10]}", category_id=category.id)]
+    )
+    db.commit()
+    monkeypatch.setenv("IMPORT_FUZZY_CANDIDATES", "5")
+
+    matcher = product_match_service.ProductMatcher(db)
+    assert len(matcher._local_index().shortlist(f"Sensor humedad {tag}", 5)) == 5
+    target = f"Sensor de humedad {tag}"
+    matches = matcher.similar(target, threshold=0.8)
+    assert [c.name for _, c in matches] == [f"Sensor humedad {tag}"]
+    assert matches[0][0] == SequenceMatcher(a=target.lower(), b=f"sensor humedad {tag}").ratio()
+
+    # Un producto pendiente de alta en el mismo lote tambien cuenta como duplicado
+    matcher.add(Product(sku="PENDIENTE", name=f"Caudalimetro {tag}", barcode="PENDIENTE", category_id=category.id))
+    assert [c.sku for _, c in matcher.similar(f"Caudalimetros {tag}", threshold=0.8)] == ["PENDIENTE"]
+
+
+def test_product_matcher_low_threshold_lowers_trigram_cutoff(db, monkeypatch):
+    from app.repositories import product_repo as repo
+    from app.services import product_match_service
+
+    category, _ = _seed_category_and_location(db)
+    tag = uuid4().hex[:6]
+    db.add(Product(sku=f"SKU-{uuid4().hex[:8]}", name=f"Bomba {tag}", barcode=f"BC-{uuid4().hex[:10]}", category_id=category.id))
+    db.commit()
+
+    # Por debajo del 0.3 de pg_trgm el candidato sigue llegando al SequenceMatcher
+    matches = product_match_service.ProductMatcher(db).similar(f"Bombas sumergibles {tag}", threshold=0.2)
+    assert [c.name for _, c in matches] == [f"Bomba {tag}"]
+
+    class _Recorder:
+        def __init__(self):
+            self.statements = []
+
+        def execute(self, statement, params=None):
+            self.statements.append((str(statement), params))
+            return SimpleNamespace(all=lambda: [])
+
+    session = _Recorder()
+    repo.similar_by_name(session, "Bomba", limit=5, min_similarity=0.2)
+    assert "set_config('pg_trgm.similarity_threshold'" in session.statements[0][0]
+    assert session.statements[0][1] == {"threshold": "0.2"}
+    assert len(session.statements) == 2
+
+    session = _Recorder()
+    repo.similar_by_name(session, "Bomba", limit=5, min_similarity=0.9)
+    assert len(session.statements) == 1 and "set_config" not in session.statements[0][0]
+
+
+def test_import_events_csv_response_keeps_only_error_sample(client, db, monkeypatch):
+    token = _login_with_role(client, db, UserRole.MANAGER)
+    category, location = _seed_category_and_location(db)
+    monkeypatch.setenv("IMPORT_RESPONSE_SAMPLE", "2")
+    monkeypatch.setenv("IMPORT_CHUNK_ROWS", "3")
+
+    rows = "".join(
+        f"BAD,SKU-{uuid4().hex[:8]},BC-{uuid4().hex[:10]},Fila {i},{category.id},{location.id},1\r\n" for i in range(7)
+    )
+    response = _post_csv(client, token, "/imports/events/csv", "﻿type,sku,barcode,name,category_id,location_id,quantity\r\n" + rows)
+    assert response.status_code == 201
+    body = response.json()
+    assert body["total_rows"] == 7 and body["error_rows"] == 7
+    assert [e["row_number"] for e in body["errors"]] == [2, 3]
+
+    # Todas las filas quedan guardadas aunque la respuesta solo lleve la muestra
+    errors = client.get(f"/imports/batches/{body['batch_id']}/errors", headers=_auth_header(token)).json()
+    assert errors["total"] == 7
+
+
+def test_import_csv_partitioned_batch_matches_sequential_result(client, db, monkeypatch, tmp_path):
+    from app.api.routes import imports as imports_routes
+    from app.services import import_service
+
+    token = _login_with_role(client, db, UserRole.MANAGER)
+    category, location = _seed_category_and_location(db)
+    monkeypatch.setenv("IMPORT_ASYNC_MIN_BYTES", "1")
+    monkeypatch.setenv("IMPORT_STORAGE_DIR", str(tmp_path))
+    monkeypatch.setenv("IMPORT_CHUNK_ROWS", "2")
+    monkeypatch.setattr(imports_routes.import_csv_batch, "delay", lambda batch_id: None)
+
+    skus = [f"SKU-{uuid4().hex[:8]}" for _ in range(4)]
+    barcodes = [f"BC-{uuid4().hex[:10]}" for _ in range(4)]
+    lines = ["type,sku,barcode,name,category_id,location_id,quantity"]
+    for i, (sku, barcode) in enumerate(zip(skus, barcodes)):
+        lines += [
+            f"IN,{sku},{barcode},Particion {i} {sku},{category.id},{location.id},5",
+            f"OUT,{sku},{barcode},Particion {i} {sku},{category.id},{location.id},2",
+            f"OUT,{sku},{barcode},Particion {i} {sku},{category.id},{location.id},9",
+        ]
+    # Mismo barcode que la primera fila con otro sku: debe caer en su particion y salir como review
+    lines.append(f"IN,SKU-{uuid4().hex[:8]},{barcodes[0]},Otro,{category.id},{location.id},1")
+    response = _post_csv(client, token, "/imports/events/csv", "\n".join(lines) + "\n")
+    batch_id = response.json()["batch_id"]
+
+    indexes = import_service.split_batch(db, batch_id, 3)
+    assert indexes and len(list(tmp_path.glob(f"batch-{batch_id}-p*.csv"))) == len(indexes)
+    results = [import_service.run_partition(db, batch_id, index) for index in indexes]
+    summary = import_service.finish_partitions(db, batch_id, results)
+    assert summary["status"] == "COMPLETED"
+    assert (summary["total_rows"], summary["ok_rows"], summary["error_rows"], summary["review_rows"]) == (13, 8, 4, 1)
+    assert list(tmp_path.iterdir()) == []
+
+    errors = client.get(f"/imports/batches/{batch_id}/errors", headers=_auth_header(token)).json()
+    assert sorted(e["row_number"] for e in errors["items"]) == [4, 7, 10, 13]
+    assert all("_row_number" not in e["payload"] for e in errors["items"])
+    for sku in skus:
+        product = product_repo.get_by_sku(db, sku)
+        assert stock_repo.get_by_product_and_location(db, product.id, location.code).quantity == 3
+
+
+def test_import_csv_partitions_keep_similar_new_products_together(client, db, monkeypatch, tmp_path):
+    from app.api.routes import imports as imports_routes
+    from app.services import import_service
+
+    token = _login_with_role(client, db, UserRole.MANAGER)
+    category, location = _seed_category_and_location(db)
+    monkeypatch.setenv("IMPORT_ASYNC_MIN_BYTES", "1")
+    monkeypatch.setenv("IMPORT_STORAGE_DIR", str(tmp_path))
+    monkeypatch.setattr(imports_routes.import_csv_batch, "delay", lambda batch_id: None)
+
+    name = f"Sensor Particion {uuid4().hex[:6]}"
+    csv_text = (
+        "type,sku,barcode,name,category_id,location_id,quantity\n"
+        f"IN,SKU-{uuid4().hex[:8]},BC-{uuid4().hex[:10]},{name},{category.id},{location.id},2\n"
+        f"IN,SKU-{uuid4().hex[:8]},BC-{uuid4().hex[:10]},{name}s,{category.id},{location.id},3\n"
+    )
+    batch_id = _post_csv(client, token, "/imports/events/csv", csv_text).json()["batch_id"]
+
+    # Sin sku ni barcode comunes, pero el segundo es un posible duplicado del primero: misma particion
+    indexes = import_service.split_batch(db, batch_id, 8)
+    assert len(indexes) == 1
+    results = [import_service.run_partition(db, batch_id, index) for index in indexes]
+    summary = import_service.finish_partitions(db, batch_id, results)
+    assert (summary["ok_rows"], summary["review_rows"]) == (1, 1)
+
+    reviews = db.query(ImportReview).filter(ImportReview.batch_id == batch_id).all()
+    assert [(r.row_number, r.reason) for r in reviews] == [(3, "possible_duplicate")]
+
+
+def test_import_csv_duplicate_upload_is_rejected_unless_forced(client, db):
+    token = _login_with_role(client, db, UserRole.MANAGER)
+    category, location = _seed_category_and_location(db)
+    csv_text = (
+        "type,sku,barcode,name,category_id,location_id,quantity\n"
+        f"IN,SKU-{uuid4().hex[:8]},BC-{uuid4().hex[:10]},Sensor Hash,{category.id},{location.id},3\n"
+    )
+
+    assert _post_csv(client, token, "/imports/events/csv", csv_text, dry_run="true").status_code == 201
+    first = _post_csv(client, token, "/imports/events/csv", csv_text)
+    assert first.status_code == 201 and first.json()["ok_rows"] == 1
+
+    again = _post_csv(client, token, "/imports/events/csv", csv_text)
+    assert again.status_code == 409
+    assert again.json()["detail"] == f"Fichero ya importado en el lote {first.json()['batch_id']}"
+
+    forced = _post_csv(client, token, "/imports/events/csv", csv_text, force="true")
+    assert forced.status_code == 201 and forced.json()["batch_id"] != first.json()["batch_id"]
+
+
+def test_import_csv_concurrent_duplicate_upload_gets_409(client, db, monkeypatch):
+    from app.services import import_service
+
+    token = _login_with_role(client, db, UserRole.MANAGER)
+    category, location = _seed_category_and_location(db)
+    csv_text = (
+        "type,sku,barcode,name,category_id,location_id,quantity\n"
+        f"IN,SKU-{uuid4().hex[:8]},BC-{uuid4().hex[:10]},Sensor Carrera,{category.id},{location.id},3\n"
+    )
+    first = _post_csv(client, token, "/imports/events/csv", csv_text)
+    assert first.status_code == 201
+
+    # La otra peticion no ve el lote en find_by_hash (carrera): lo rechaza el indice unico
+    real_find_by_hash = import_service.find_by_hash
+    calls = []
+
+    def stale_find_by_hash(db, kind, content_hash):
+        calls.append(content_hash)
+        return None if len(calls) == 1 else real_find_by_hash(db, kind, content_hash)
+
+    monkeypatch.setattr(import_service, "find_by_hash", stale_find_by_hash)
+    racing = _post_csv(client, token, "/imports/events/csv", csv_text)
+    assert racing.status_code == 409
+    assert racing.json()["detail"] == f"Fichero ya en proceso en el lote {first.json()['batch_id']}"
+    assert db.query(ImportBatch).filter(ImportBatch.id > first.json()["batch_id"]).count() == 0
+
+
+def test_import_csv_sync_crash_marks_batch_failed_and_reupload_resumes(client, db, monkeypatch, tmp_path):
+    from app.api.routes import imports as imports_routes
+    from app.models.enums import ImportStatus
+    from app.services import import_service
+
+    token = _login_with_role(client, db, UserRole.MANAGER)
+    category, location = _seed_category_and_location(db)
+    monkeypatch.setenv("IMPORT_STORAGE_DIR", str(tmp_path))
+    monkeypatch.setattr(imports_routes.import_csv_batch, "delay", lambda batch_id: None)
+    csv_text = (
+        "type,sku,barcode,name,category_id,location_id,quantity\n"
+        f"IN,SKU-{uuid4().hex[:8]},BC-{uuid4().hex[:10]},Sensor Caida,{category.id},{location.id},3\n"
+    )
+
+    def crash(db, batch, outcome):
+        raise RuntimeError("boom")
+
+    monkeypatch.setattr(import_service, "finish_batch", crash)
+    try:
+        _post_csv(client, token, "/imports/events/csv", csv_text)
+    except RuntimeError:
+        pass
+    monkeypatch.undo()
+
+    batch = db.query(ImportBatch).order_by(ImportBatch.id.desc()).first()
+    db.refresh(batch)
+    assert batch.status == ImportStatus.FAILED and batch.error_message == "boom"
+
+    monkeypatch.setenv("IMPORT_STORAGE_DIR", str(tmp_path))
+    monkeypatch.setattr(imports_routes.import_csv_batch, "delay", lambda batch_id: None)
+    resumed = _post_csv(client, token, "/imports/events/csv", csv_text)
+    assert resumed.status_code == 202 and resumed.json()["batch_id"] == batch.id
+
+
+def test_import_csv_batch_resumes_from_checkpoint_after_worker_crash(client, db, monkeypatch, tmp_path):
+    from datetime import datetime, timedelta, timezone
+
+    from app.api.routes import imports as imports_routes
+    from app.models.movement import Movement
+    from app.services import import_service
+
+    class WorkerLost(BaseException):
+        pass
+
+    token = _login_with_role(client, db, UserRole.MANAGER)
+    category, location = _seed_category_and_location(db)
+    monkeypatch.setenv("IMPORT_ASYNC_MIN_BYTES", "1")
+    monkeypatch.setenv("IMPORT_STORAGE_DIR", str(tmp_path))
+    monkeypatch.setenv("IMPORT_CHUNK_ROWS", "2")
+    monkeypatch.setattr(imports_routes.import_csv_batch, "delay", lambda batch_id: None)
+
+    sku, barcode = f"SKU-{uuid4().hex[:8]}", f"BC-{uuid4().hex[:10]}"
+    csv_text = "type,sku,barcode,name,category_id,location_id,quantity\n" + "".join(
+        f"IN,{sku},{barcode},Sensor Resume,{category.id},{location.id},{i}\n" for i in range(1, 6)
+    )
+    batch_id = _post_csv(client, token, "/imports/events/csv", csv_text).json()["batch_id"]
+
+    # El worker muere justo despues de confirmar el primer bloque
+    calls = []
+
+    def crash(payload):
+        calls.append(payload)
+        if len(calls) == 2:
+            raise WorkerLost()
+
+    monkeypatch.setattr(import_service, "publish_import_progress", crash)
+    try:
+        import_service.run_batch(db, batch_id)
+    except WorkerLost:
+        db.rollback()
+    monkeypatch.setattr(import_service, "publish_import_progress", lambda payload: None)
+
+    batch = db.get(ImportBatch, batch_id)
+    db.refresh(batch)
+    assert (batch.status.value, batch.processed_rows, batch.ok_rows) == ("PROCESSING", 2, 2)
+    busy = _post_csv(client, token, "/imports/events/csv", csv_text)
+    assert busy.status_code == 409 and "en proceso" in busy.json()["detail"]
+
+    assert import_service.requeue_stale(db) == []
+    batch.heartbeat_at = datetime.now(timezone.utc) - timedelta(hours=1)
+    db.commit()
+    assert import_service.requeue_stale(db) == [batch_id]
+
+    result = import_service.run_batch(db, batch_id)
+    assert (result["status"], result["total_rows"], result["ok_rows"]) == ("COMPLETED", 5, 5)
+    product = product_repo.get_by_sku(db, sku)
+    assert stock_repo.get_by_product_and_location(db, product.id, location.code).quantity == 15
+    assert db.query(Movement).filter(Movement.product_id == product.id).count() == 5
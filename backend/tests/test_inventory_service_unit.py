@@ -1,13 +1,16 @@
 from uuid import uuid4
 
 import pytest
+from sqlalchemy import event
+from sqlalchemy.exc import IntegrityError
 
 from app.core.security import hash_password
 from app.models.category import Category
 from app.models.enums import ActionType, Entity, MovementType, Source, UserRole
 from app.models.movement import Movement
+from app.models.stock import Stock
 from app.models.user import User
-from app.repositories import stock_repo
+from app.repositories import location_repo, stock_repo
 from app.services import inventory_service
 
 
@@ -110,3 +113,78 @@ def test_transfer_stock_rejects_same_origin_and_destination(db):
             to_location="lab-c",
             source=Source.SCAN,
         )
+
+
+def test_movement_commits_once_with_movement_and_audit_log(db):
+    user = _create_user(db)
+    product = _create_product(db)
+    stock_repo.create_stock(db, product_id=product.id, location="LAB-D", quantity=10)
+
+    commits = []
+    listener = lambda session: commits.append(session)
+    event.listen(db, "after_commit", listener)
+    try:
+        stock, movement = inventory_service.decrease_stock(
+            db,
+            product_id=product.id,
+            quantity=4,
+            user_id=user.id,
+            location="LAB-D",
+            source=Source.MANUAL,
+        )
+    finally:
+        event.remove(db, "after_commit", listener)
+
+    assert len(commits) == 1
+    assert stock.quantity == 6
+    assert movement.delta == -4
+
+    from app.models.audit_log import AuditLog
+
+    logs = db.query(AuditLog).filter(AuditLog.user_id == user.id).all()
+    assert [log.details for log in logs] == [f"movement_id={movement.id} product_id={product.id} delta=-4 type=OUT"]
+
+
+def test_transfer_with_insufficient_origin_writes_nothing(db):
+    user = _create_user(db)
+    product = _create_product(db)
+    # Destino con id de ubicacion menor que el origen
+    destination = stock_repo.create_stock(db, product_id=product.id, location="LAB-E1", quantity=0)
+    origin = stock_repo.create_stock(db, product_id=product.id, location="LAB-E2", quantity=1)
+
+    with pytest.raises(inventory_service.InventoryError, match="Stock insuficiente"):
+        inventory_service.transfer_stock(
+            db,
+            product_id=product.id,
+            quantity=5,
+            user_id=user.id,
+            from_location="LAB-E2",
+            to_location="LAB-E1",
+            source=Source.MANUAL,
+        )
+    db.rollback()
+
+    db.refresh(destination)
+    db.refresh(origin)
+    assert (origin.quantity, destination.quantity) == (1, 0)
+    assert db.query(Movement).filter(Movement.product_id == product.id).all() == []
+
+
+def test_stock_upsert_reuses_single_row_per_product_and_location(db):
+    product = _create_product(db)
+    location = location_repo.get_or_create(db, "LAB-F")
+
+    first = stock_repo.upsert_stock(db, product_id=product.id, location_id=location.id, delta=3)
+    second = stock_repo.upsert_stock(db, product_id=product.id, location_id=location.id, delta=4)
+    stock_repo.ensure_stocks(db, [(product.id, location.id)])
+    db.commit()
+
+    assert first.id == second.id
+    assert second.quantity == 7
+    assert db.query(Stock).filter(Stock.product_id == product.id).count() == 1
+
+    # El indice unico impide duplicados aunque se salte el upsert
+    db.add(Stock(product_id=product.id, location_id=location.id, quantity=1))
+    with pytest.raises(IntegrityError):
+        db.commit()
+    db.rollback()
@@ -0,0 +1,160 @@
+from types import SimpleNamespace
+from uuid import uuid4
+
+from app.core.security import hash_password
+from app.models.enums import AlertType, UserRole
+from app.models.user import User
+from app.services import fcm_service, notification_service
+
+
+class _FakeSMTP:
+    instances = []
+
+    def __init__(self, host, port, timeout=None):
+        self.sent = []
+        _FakeSMTP.instances.append(self)
+
+    def starttls(self):
+        pass
+
+    def login(self, user, password):
+        pass
+
+    def send_message(self, msg):
+        self.sent.append(msg["Subject"])
+
+    def quit(self):
+        pass
+
+
+def _batch_response(delivered: int, errors: list) -> SimpleNamespace:
+    # Misma forma que messaging.BatchResponse: primero los entregados y despues los fallidos
+    responses = [SimpleNamespace(success=True, exception=None)] * delivered
+    responses += [SimpleNamespace(success=False, exception=error) for error in errors]
+    return SimpleNamespace(success_count=delivered, responses=responses)
+
+
+def _alert_item(index: int) -> dict:
+    return {
+        "alert_type": AlertType.LOW_STOCK,
+        "product_id": index,
+        "product_name": f"Producto {index}",
+        "location": "ALM-1",
+        "quantity": 1,
+        "min_quantity": 5,
+    }
+
+
+def test_digest_reuses_pooled_smtp_connection(monkeypatch):
+    monkeypatch.setenv("SMTP_HOST", "smtp.test")
+    monkeypatch.setenv("SMTP_FROM", "from@example.com")
+    monkeypatch.setenv("SMTP_TO", "to@example.com")
+    monkeypatch.setattr(notification_service.smtplib, "SMTP", _FakeSMTP)
+    monkeypatch.setattr(notification_service, "_smtp_conn", None)
+    _FakeSMTP.instances = []
+
+    assert notification_service.send_stock_alert_digest([_alert_item(i) for i in range(10)]) == 10
+    assert notification_service.send_stock_alert_digest([_alert_item(i) for i in range(3)]) == 3
+
+    # Un email por resumen y una sola conexion para ambos
+    assert len(_FakeSMTP.instances) == 1
+    assert len(_FakeSMTP.instances[0].sent) == 2
+    assert _FakeSMTP.instances[0].sent[0].startswith("Resumen de alertas de stock: 10 alertas")
+
+
+def test_digest_reports_only_chunks_sent_before_a_failure(monkeypatch):
+    class _FlakySMTP(_FakeSMTP):
+        def send_message(self, msg):
+            if len(self.sent) == 1:
+                raise OSError("conexion perdida")
+            super().send_message(msg)
+
+    monkeypatch.setenv("SMTP_HOST", "smtp.test")
+    monkeypatch.setenv("SMTP_FROM", "from@example.com")
+    monkeypatch.setenv("SMTP_TO", "to@example.com")
+    monkeypatch.setenv("NOTIFICATION_DIGEST_MAX_ITEMS", "2")
+    monkeypatch.setattr(notification_service.smtplib, "SMTP", _FlakySMTP)
+    monkeypatch.setattr(notification_service, "_smtp_conn", None)
+
+    # Sale el primer email (2 items) y falla el segundo: el llamador solo reintenta los 3 restantes
+    assert notification_service.send_stock_alert_digest([_alert_item(i) for i in range(5)]) == 2
+
+
+def test_alert_pushes_use_send_each_chunks(monkeypatch):
+    batches = []
+    monkeypatch.setattr(fcm_service, "_init_firebase", lambda: True)
+    monkeypatch.setattr(
+        fcm_service.messaging,
+        "send_each",
+        lambda messages: batches.append(len(messages)) or _batch_response(len(messages), []),
+    )
+    monkeypatch.setattr(fcm_service, "_tokens_for_roles", lambda db, roles: [f"token-{i}" for i in range(1200)])
+
+    alert = SimpleNamespace(alert_type=AlertType.IMPORT_ISSUES, stock_id=None, quantity=3, min_quantity=0)
+    assert fcm_service.send_alert_pushes(None, [alert]) is True
+    assert batches == [500, 500, 200]
+
+    # Por encima del umbral se envia un unico push resumen por token
+    batches.clear()
+    monkeypatch.setenv("FCM_DIGEST_THRESHOLD", "2")
+    fcm_service.send_alert_pushes(None, [alert] * 10)
+    assert batches == [500, 500, 200]
+
+    # Si no se entrega ningun mensaje por un error transitorio el lote cuenta como fallido
+    unavailable = fcm_service.exceptions.UnavailableError("FCM no disponible")
+    monkeypatch.setattr(
+        fcm_service.messaging, "send_each", lambda messages: _batch_response(0, [unavailable] * len(messages))
+    )
+    assert fcm_service.send_alert_pushes(None, [alert]) is False
+
+
+def test_stale_tokens_are_pruned_and_not_retried(monkeypatch):
+    pruned = []
+    monkeypatch.setattr(fcm_service, "_init_firebase", lambda: True)
+    monkeypatch.setattr(fcm_service, "_tokens_for_roles", lambda db, roles: ["caducado", "invalido"])
+    monkeypatch.setattr(
+        fcm_service.fcm_token_repo,
+        "delete_tokens",
+        lambda db, tokens, commit=True: pruned.append((sorted(tokens), commit)),
+    )
+    errors = [
+        fcm_service.messaging.UnregisteredError("token no registrado"),
+        fcm_service.exceptions.InvalidArgumentError("token invalido"),
+    ]
+    monkeypatch.setattr(fcm_service.messaging, "send_each", lambda messages: _batch_response(0, errors))
+
+    alert = SimpleNamespace(alert_type=AlertType.IMPORT_ISSUES, stock_id=None, quantity=3, min_quantity=0)
+    # Ningun push entregado, pero ninguno se arregla reintentando: el lote no se reintenta
+    assert fcm_service.send_alert_pushes(object(), [alert]) is True
+    assert pruned == [(["caducado", "invalido"], False)]
+
+
+def test_token_list_is_cached(monkeypatch):
+    calls = []
+    monkeypatch.setattr(
+        fcm_service.fcm_token_repo,
+        "list_tokens_for_roles",
+        lambda db, roles: calls.append(roles) or ["token"],
+    )
+    fcm_service.invalidate_token_cache()
+    roles = fcm_service._alert_roles(AlertType.LOW_STOCK)
+    assert fcm_service._tokens_for_roles(None, roles) == ["token"]
+    assert fcm_service._tokens_for_roles(None, roles) == ["token"]
+    assert len(calls) == 1
+    fcm_service.invalidate_token_cache()
+
+
+def test_registering_token_clears_token_cache(client, db):
+    email = f"push_{uuid4().hex}@example.com"
+    db.add(User(email=email, username=f"push_{uuid4().hex[:8]}", password_hash=hash_password("Password123!"), role=UserRole.USER))
+    db.commit()
+    token = client.post("/auth/login", data={"username": email, "password": "Password123!"}).json()["access_token"]
+
+    fcm_service._token_cache[frozenset({UserRole.USER})] = (0.0, ["antiguo"])
+    response = client.post(
+        "/users/fcm-token",
+        json={"token": f"token-{uuid4().hex}", "device_id": None, "platform": "android"},
+        headers={"Authorization": f"Bearer {token}"},
+    )
+    assert response.status_code == 200
+    assert fcm_service._token_cache == {}
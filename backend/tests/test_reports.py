@@ -0,0 +1,148 @@
+from datetime import date, datetime, time, timezone
+from uuid import uuid4
+
+from app.models.category import Category
+from app.models.enums import MovementType, Source
+from app.models.movement import Movement
+from app.models.movement_daily_agg import MovementDailyAgg
+from app.models.product import Product
+from app.models.stock import Stock
+from app.models.stock_snapshot import StockSnapshot
+from app.repositories import location_repo, movement_agg_repo, report_repo, stock_snapshot_repo
+from app.services import movement_rollup_service, stock_snapshot_service
+
+
+def _seed(db):
+    category = Category(name=f"Categoria-{uuid4().hex}")
+    db.add(category)
+    db.commit()
+    products = []
+    for i in range(2):
+        product = Product(sku=f"SKU-{uuid4().hex[:8]}", name=f"Producto {i}", category_id=category.id, active=True)
+        db.add(product)
+        products.append(product)
+    db.commit()
+    location = location_repo.get_or_create(db, "ALM-REP")
+
+    rows = [
+        (products[0], MovementType.IN, 50, datetime(2026, 1, 5, 9, 0)),
+        (products[0], MovementType.OUT, 7, datetime(2026, 1, 5, 18, 30)),
+        (products[1], MovementType.OUT, 3, datetime(2026, 1, 6, 11, 0)),
+        (products[0], MovementType.OUT, 4, datetime(2026, 1, 7, 15, 0)),
+        (products[1], MovementType.IN, 9, datetime(2026, 1, 8, 10, 0)),
+        # Dia aun abierto respecto a now: siempre sale de movements
+        (products[0], MovementType.OUT, 2, datetime(2026, 1, 10, 8, 0)),
+    ]
+    for product, movement_type, quantity, created_at in rows:
+        db.add(
+            Movement(
+                product_id=product.id,
+                quantity=quantity,
+                delta=quantity if movement_type == MovementType.IN else -quantity,
+                location_id=location.id,
+                movement_type=movement_type,
+                movement_source=Source.MANUAL,
+                created_at=created_at,
+            )
+        )
+    # Stock actual coherente con los movimientos
+    db.add(Stock(product_id=products[0].id, location_id=location.id, quantity=37))
+    db.add(Stock(product_id=products[1].id, location_id=location.id, quantity=6))
+    db.commit()
+    return products
+
+
+def _reports(db, **kwargs):
+    top, top_total = report_repo.list_top_consumed(db, **kwargs)
+    turnover, turnover_total, _ = report_repo.list_turnover(db, **kwargs)
+    return (
+        sorted((r.product_id, r.total_out) for r in top),
+        top_total,
+        sorted((r.product_id, r.outs, r.stock_initial) for r in turnover),
+        turnover_total,
+    )
+
+
+def test_reports_match_raw_movements_after_rollup(db):
+    _seed(db)
+    ranges = [
+        {},
+        {"date_from": datetime(2026, 1, 5), "date_to": datetime(2026, 1, 10, 23, 59, 59, 999999)},
+        # Extremos parciales: 5 a las 12:00 y 7 hasta las 16:00
+        {"date_from": datetime(2026, 1, 5, 12, 0), "date_to": datetime(2026, 1, 7, 16, 0), "location": "ALM-REP"},
+        {"date_from": datetime(2026, 1, 6), "date_to": datetime(2026, 1, 6, 23, 59, 59, 999999)},
+    ]
+    before = [_reports(db, **r) for r in ranges]
+
+    now = datetime(2026, 1, 10, 12, 0, tzinfo=timezone.utc)
+    result = movement_rollup_service.backfill(db, now=now)
+    assert result == {"from": "2026-01-05", "to": "2026-01-10", "days": 5}
+    assert movement_agg_repo.rolled_until(db).isoformat() == "2026-01-10"
+    assert db.query(MovementDailyAgg).count() == 5
+
+    assert [_reports(db, **r) for r in ranges] == before
+
+    # Los dias completos ya no se leen de movements
+    deleted = db.query(Movement).filter(Movement.created_at < datetime(2026, 1, 7)).filter(
+        Movement.created_at >= datetime(2026, 1, 6)
+    ).delete()
+    db.commit()
+    assert deleted == 1
+    assert _reports(db, **ranges[3]) == before[3]
+
+    # Sin dias nuevos cerrados la tarea incremental no rehace nada
+    assert movement_rollup_service.rollup_pending(db, now=now)["days"] == 0
+
+
+def test_stock_snapshots_match_live_balances(db):
+    products = _seed(db)
+    now = datetime(2026, 1, 10, 12, 0, tzinfo=timezone.utc)
+    day_end = time.max
+    turnover_range = {"date_from": datetime(2026, 1, 6), "date_to": datetime.combine(date(2026, 1, 8), day_end)}
+
+    def _on(day):
+        rows, _, _ = report_repo.list_stock_on_date(db, day=day, location="ALM-REP")
+        return {r.product_id: r.quantity for r in rows}
+
+    def _turnover():
+        rows, _, _ = report_repo.list_turnover(db, **turnover_range)
+        return {r.product_id: (r.stock_initial, r.stock_final, r.outs) for r in rows}
+
+    live = [_on(date(2026, 1, d)) for d in (5, 7, 9)]
+    live_turnover = _turnover()
+    assert live[0] == {products[0].id: 43, products[1].id: 0}
+    assert live_turnover[products[0].id] == (43, 39, 4)
+
+    movement_rollup_service.backfill(db, now=now)
+
+    # Los dias sin snapshot se calculan juntos y cuadran con live_balances dia a dia (rollup incluido)
+    days = [date(2026, 1, d) for d in range(4, 11)]
+    for product_id in (None, products[0].id):
+        expected = {
+            day: sum(
+                quantity
+                for row_product, _, quantity in db.execute(stock_snapshot_repo.live_balances(db, day)).all()
+                if product_id is None or row_product == product_id
+            )
+            for day in days
+        }
+        assert stock_snapshot_repo.live_totals(db, days, product_id=product_id) == expected
+
+    result = stock_snapshot_service.backfill(db, now=now)
+    assert result == {"from": "2026-01-05", "to": "2026-01-10", "days": 5}
+    assert db.query(StockSnapshot).count() == 10
+    assert [_on(date(2026, 1, d)) for d in (5, 7, 9)] == live
+    assert _turnover() == live_turnover
+
+    # Con snapshots la apertura y el cierre ya no dependen del stock actual
+    db.query(Stock).filter(Stock.product_id == products[0].id).update({"quantity": 1000})
+    db.commit()
+    assert _turnover()[products[0].id] == (43, 39, 4)
+
+    points, _ = report_repo.list_stock_trend(
+        db, date_from=date(2026, 1, 4), date_to=date(2026, 1, 12), product_id=products[0].id, now=now
+    )
+    # El 4 es anterior al primer snapshot; el 10 (hoy) se calcula desde el stock actual
+    assert [(d.day, q) for d, q in points] == [(5, 43), (6, 43), (7, 39), (8, 39), (9, 39), (10, 1000)]
+
+    assert stock_snapshot_service.snapshot_pending(db, now=now)["days"] == 0
@@ -1,8 +1,13 @@
+import csv
+import io
+import json
+from datetime import datetime, timedelta
 from uuid import uuid4
 
 from app.core.security import hash_password
 from app.models.category import Category
-from app.models.enums import UserRole
+from app.models.enums import MovementType, Source, UserRole
+from app.models.movement import Movement
 from app.models.product import Product
 from app.models.user import User
 
@@ -77,3 +82,125 @@ def test_stock_and_movement_in(client, db):
     )
     assert movement_response.status_code == 201
     assert movement_response.json()["stock"]["quantity"] == 15
+
+
+def test_movements_cursor_pagination_walks_every_row_once(client, db):
+    category = Category(name=f"Categoria-{uuid4().hex}")
+    db.add(category)
+    db.commit()
+    product = Product(
+        sku=f"SKU-{uuid4().hex[:8]}",
+        name="Producto paginado",
+        barcode=f"{uuid4().hex[:12]}",
+        category_id=category.id,
+        active=True,
+    )
+    db.add(product)
+    db.commit()
+
+    # Varias filas comparten created_at: el id desempata; otras llevan microsegundos
+    base = datetime(2026, 1, 1, 10, 0, 0)
+    stamps = [base, base, base, base + timedelta(microseconds=500), base + timedelta(seconds=1), None, None]
+    for stamp in stamps:
+        movement = Movement(
+            product_id=product.id,
+            quantity=1,
+            delta=1,
+            movement_type=MovementType.IN,
+            movement_source=Source.MANUAL,
+        )
+        if stamp is not None:
+            movement.created_at = stamp
+        db.add(movement)
+    db.commit()
+
+    headers = _auth_header(_login_manager(client, db))
+    expected = [m["id"] for m in client.get("/movements/", params={"limit": 100}, headers=headers).json()["items"]]
+    assert len(expected) == len(stamps)
+
+    seen = []
+    response = client.get("/movements/", params={"limit": 3}, headers=headers).json()
+    seen.extend(m["id"] for m in response["items"])
+    while response["next_cursor"]:
+        response = client.get(
+            "/movements/", params={"limit": 3, "cursor": response["next_cursor"]}, headers=headers
+        ).json()
+        seen.extend(m["id"] for m in response["items"])
+    assert seen == expected
+
+    bad = client.get("/movements/", params={"cursor": "no-es-un-cursor"}, headers=headers)
+    assert bad.status_code == 400
+    mixed = client.get("/movements/", params={"cursor": "x", "offset": 3}, headers=headers)
+    assert mixed.status_code == 400
+
+
+def test_movements_with_total_modes(client, db, monkeypatch):
+    category = Category(name=f"Categoria-{uuid4().hex}")
+    db.add(category)
+    db.commit()
+    product = Product(sku=f"SKU-{uuid4().hex[:8]}", name="Producto total", category_id=category.id, active=True)
+    db.add(product)
+    db.commit()
+    for _ in range(5):
+        db.add(
+            Movement(
+                product_id=product.id,
+                quantity=1,
+                delta=1,
+                movement_type=MovementType.IN,
+                movement_source=Source.MANUAL,
+            )
+        )
+    db.commit()
+    headers = _auth_header(_login_manager(client, db))
+
+    exact = client.get("/movements/", params={"limit": 2}, headers=headers).json()
+    assert exact["total"] == 5 and exact["total_estimated"] is False and exact["has_more"] is True
+
+    none = client.get("/movements/", params={"limit": 2, "offset": 4, "with_total": "none"}, headers=headers).json()
+    assert none["total"] is None and none["has_more"] is False and len(none["items"]) == 1
+
+    # En SQLite no hay plan de PostgreSQL: cuenta con tope
+    monkeypatch.setenv("LIST_COUNT_CAP", "3")
+    estimated = client.get("/movements/", params={"limit": 2, "with_total": "estimated"}, headers=headers).json()
+    assert estimated["total"] == 3 and estimated["total_estimated"] is True and estimated["has_more"] is True
+
+
+def test_movements_export_streams_every_filtered_row(client, db, monkeypatch):
+    category = Category(name=f"Categoria-{uuid4().hex}")
+    db.add(category)
+    db.commit()
+    product = Product(sku=f"SKU-{uuid4().hex[:8]}", name="Producto export", category_id=category.id, active=True)
+    db.add(product)
+    db.commit()
+    for i in range(7):
+        movement_type = MovementType.IN if i % 2 == 0 else MovementType.OUT
+        db.add(
+            Movement(
+                product_id=product.id,
+                quantity=i + 1,
+                delta=i + 1 if movement_type == MovementType.IN else -(i + 1),
+                movement_type=movement_type,
+                movement_source=Source.MANUAL,
+            )
+        )
+    db.commit()
+    headers = _auth_header(_login_manager(client, db))
+    # Lotes pequenos: el fichero se escribe en varios trozos
+    monkeypatch.setenv("EXPORT_BATCH_ROWS", "2")
+
+    response = client.get("/movements/export", params={"movement_type": "IN", "order_dir": "asc"}, headers=headers)
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/csv")
+    assert 'filename="movements.csv"' in response.headers["content-disposition"]
+    rows = list(csv.DictReader(io.StringIO(response.text)))
+    assert [int(r["quantity"]) for r in rows] == [1, 3, 5, 7]
+    assert {r["movement_type"] for r in rows} == {"IN"}
+
+    response = client.get("/movements/export", params={"format": "ndjson"}, headers=headers)
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert len(lines) == 7 and lines[0]["quantity"] == 7 and lines[1]["movement_type"] == "OUT"
+
+    bad = client.get("/movements/export", params={"order_dir": "up"}, headers=headers)
+    assert bad.status_code == 400